@@ -1,21 +1,50 @@
 """
 Модуль алгоритмов обработки изображений
+
+Подмодули загружаются лениво: `import algorithms` не тянет OpenCV
+и никогда не импортирует PyQt5, поэтому пакет можно использовать
+в CLI и рабочих процессах без графической оболочки.
 """
 
-from .canny import CannyEdgeDetector
-from .utils import (
-    resize_image,
-    convert_to_grayscale,
-    apply_morphology,
-    find_largest_contour,
-    create_mask_from_contours
-)
-
-__all__ = [
-    'CannyEdgeDetector',
-    'resize_image',
-    'convert_to_grayscale',
-    'apply_morphology',
-    'find_largest_contour',
-    'create_mask_from_contours'
-]
\ No newline at end of file
+import importlib
+
+_EXPORTS = {
+    'CannyEdgeDetector': '.canny',
+    'DetectionResult': '.detection',
+    'resize_image': '.utils',
+    'convert_to_grayscale': '.utils',
+    'apply_morphology': '.utils',
+    'find_largest_contour': '.utils',
+    'create_mask_from_contours': '.utils',
+    'create_region_mask': '.utils',
+    'IncrementalEdgeDetector': '.incremental',
+    'refine_mask_grabcut': '.refine',
+    'detect_edges_adaptive': '.adaptive',
+    'soft_alpha': '.matte',
+    'detect_stream': '.stream',
+    'RegionOverride': '.overrides',
+    'ObjectSelection': '.selection',
+    'EdgeStrengthMap': '.strength',
+    'evaluate_mask': '.evaluation',
+    'ArchiveSink': '.archive',
+    'ArchiveReader': '.archive',
+    'mask_to_polygons': '.vector',
+    'save_polygons': '.vector',
+    'ResultCache': '.cache',
+    'set_thread_budget': '.threads',
+    'lazy_import': '.lazy',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,187 @@
+"""
+Обнаружение на рабочем разрешении с уточнением маски у границы
+
+Пороги Canny, размытие и ядра морфологии подобраны под изображения
+порядка нескольких мегапикселей. Большие снимки уменьшаются до рабочего
+разрешения, обрабатываются там, а маска возвращается к полному размеру:
+внутренность и фон переносятся простым увеличением, а в узкой полосе
+вдоль контура пиксели переназначаются объекту или фону по цвету
+полноразмерного изображения.
+
+Полным размером обрабатываются только уменьшение (вдвое за шаг) и
+увеличение маски; полоса, средние цвета объекта и фона и тайлы
+считаются на рабочем разрешении, а полноразмерные пиксели читаются
+только внутри полосы (см. benchmarks/adaptive_resolution.py).
+"""
+
+import math
+
+import cv2
+import numpy as np
+
+from .band import boundary_band_tiles, class_means
+
+# Рабочее разрешение по умолчанию, пикселей
+DEFAULT_WORKING_PIXELS = 2_000_000
+
+# Полуширина полосы уточнения в пикселях рабочего разрешения: замыкание
+# контуров смещает границу маски наружу примерно на толщину линии Canny
+BAND_WIDTH = 2
+
+# Размер тайла полосы в пикселях рабочего разрешения
+BAND_TILE = 32
+
+
+def working_scale(shape, working_pixels=DEFAULT_WORKING_PIXELS):
+    """Коэффициент уменьшения до рабочего разрешения (не больше 1)"""
+    h, w = shape[:2]
+    return min(1.0, math.sqrt(working_pixels / float(h * w)))
+
+
+def upsample_mask(image, small_mask, small_image=None):
+    """
+    Увеличивает маску до размера image с уточнением в полосе у границы
+
+    После увеличения положение границы известно с точностью до
+    BAND_WIDTH пикселей рабочего разрешения; в этой полосе пиксели
+    переназначаются по цвету полноразмерного изображения: пиксель
+    относится к объекту, если его цвет ближе к среднему цвету надежного
+    объекта в окрестности, чем к среднему цвету фона. Средние цвета
+    считаются на рабочем разрешении.
+
+    Параметры:
+    - image: полноразмерное изображение (RGB)
+    - small_mask: маска на рабочем разрешении (0/255)
+    - small_image: изображение на рабочем разрешении, по которому получена
+      small_mask (None - уменьшить image)
+
+    Возвращает:
+    - mask: полноразмерная маска (0/255)
+    """
+    h, w = image.shape[:2]
+    sh, sw = small_mask.shape[:2]
+    mask = cv2.resize(small_mask, (w, h), interpolation=cv2.INTER_LINEAR)
+    cv2.threshold(mask, 127, 255, cv2.THRESH_BINARY, dst=mask)
+
+    small_band, tiles = boundary_band_tiles(small_mask, BAND_WIDTH, BAND_TILE)
+    if not tiles:
+        return mask
+    if small_image is None:
+        small_image = cv2.resize(image, (sw, sh), interpolation=cv2.INTER_AREA)
+    radius = 2 * BAND_WIDTH
+
+    # Средние цвета объекта и фона считаются по тайлам на рабочем разрешении.
+    # Цвет c ближе к среднему объекта, чем к среднему фона, если
+    # c * (fg - bg) >= (|fg|^2 - |bg|^2) / 2, поэтому для каждого пикселя
+    # полосы запоминаются направление fg - bg и порог
+    points, directions, offsets = [], [], []
+    for x0, y0, x1, y1 in tiles:
+        ex0, ey0 = max(0, x0 - radius), max(0, y0 - radius)
+        ex1, ey1 = min(sw, x1 + radius), min(sh, y1 + radius)
+        pixels = small_image[ey0:ey1, ex0:ex1].astype(np.float32)
+        uncertain = small_band[ey0:ey1, ex0:ex1] > 0
+        mean_fg, mean_bg, known = class_means(pixels, small_mask[ey0:ey1, ex0:ex1] > 0, uncertain, radius)
+
+        inner = (slice(y0 - ey0, y1 - ey0), slice(x0 - ex0, x1 - ex0))
+        ys, xs = np.nonzero(uncertain[inner] & known[inner])
+        ys, xs = ys + (y0 - ey0), xs + (x0 - ex0)
+        fg, bg = mean_fg[ys, xs], mean_bg[ys, xs]
+        points.append(np.stack([ys + ey0, xs + ex0], axis=1))
+        directions.append(fg - bg)
+        offsets.append(0.5 * (np.einsum('ij,ij->i', fg, fg) - np.einsum('ij,ij->i', bg, bg)))
+
+    points = np.concatenate(points)
+    if not len(points):
+        return mask
+    directions = np.concatenate(directions)
+    offsets = np.concatenate(offsets)
+
+    # Каждый пиксель рабочего разрешения покрывает блок пикселей полного
+    # размера (как при INTER_NEAREST); блоки разворачиваются до наибольшего
+    # размера, лишние позиции отбрасываются
+    row_start = np.searchsorted(np.arange(h) * sh // h, np.arange(sh + 1))
+    col_start = np.searchsorted(np.arange(w) * sw // w, np.arange(sw + 1))
+    block_h = int(np.diff(row_start).max())
+    block_w = int(np.diff(col_start).max())
+    oy, ox = np.divmod(np.arange(block_h * block_w), block_w)
+
+    sy, sx = points[:, 0], points[:, 1]
+    rows = row_start[sy][:, None] + oy
+    cols = col_start[sx][:, None] + ox
+    valid = (rows < row_start[sy + 1][:, None]) & (cols < col_start[sx + 1][:, None])
+    parent = np.nonzero(valid)[0]
+    flat = rows[valid] * w + cols[valid]
+
+    colors = image.reshape(-1, image.shape[2])[flat].astype(np.float32)
+    score = np.einsum('ij,ij->i', colors, directions[parent]) - offsets[parent]
+    mask.reshape(-1)[flat] = np.where(score >= 0, 255, 0)
+
+    return mask
+
+
+def upsample_edges(small_edges, shape):
+    """Переносит бинарную карту границ на полный размер (для визуализации)"""
+    h, w = shape[:2]
+    return cv2.resize(small_edges, (w, h), interpolation=cv2.INTER_NEAREST)
+
+
+def downscale(image, scale):
+    """
+    Уменьшает изображение до рабочего разрешения
+
+    Сначала изображение уменьшается вдвое (INTER_AREA с коэффициентом 2
+    в OpenCV идет быстрым путем), пока до рабочего размера остается не
+    меньше двух раз, затем остаток - INTER_LINEAR: при уменьшении менее
+    чем вдвое он не теряет пикселей и в разы быстрее INTER_AREA
+    с дробным коэффициентом.
+    """
+    h, w = image.shape[:2]
+    size = (max(1, int(w * scale)), max(1, int(h * scale)))
+    while image.shape[1] >= 2 * size[0] and image.shape[0] >= 2 * size[1]:
+        image = cv2.resize(image, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+    if (image.shape[1], image.shape[0]) == size:
+        return image
+    return cv2.resize(image, size, interpolation=cv2.INTER_LINEAR)
+
+
+def scale_points(points, sx, sy):
+    """Переводит точки в координаты рабочего разрешения"""
+    return [(int(x * sx), int(y * sy)) for x, y in points]
+
+
+def detect_edges_adaptive(detector, image, region_mask=None, keep_lines=None,
+                          working_pixels=DEFAULT_WORKING_PIXELS):
+    """
+    Обнаружение границ на рабочем разрешении
+
+    Изображения не больше working_pixels обрабатываются как обычно.
+
+    Параметры:
+    - detector: CannyEdgeDetector
+    - image: входное изображение (RGB)
+    - region_mask: маска области полного размера (или None)
+    - keep_lines: линии keep в координатах полного изображения
+    - working_pixels: число пикселей рабочего разрешения
+
+    Возвращает:
+    - edges: бинарная карта границ полного размера
+    - mask: полноразмерная бинарная маска объекта
+    """
+    scale = working_scale(image.shape, working_pixels)
+    if scale >= 1.0:
+        return detector.edges_and_mask(image, 0, 0, region_mask, keep_lines)
+
+    small = downscale(image, scale)
+    sh, sw = small.shape[:2]
+    sx, sy = sw / image.shape[1], sh / image.shape[0]
+
+    small_region = None
+    if region_mask is not None:
+        small_region = cv2.resize(region_mask, (sw, sh), interpolation=cv2.INTER_NEAREST)
+
+    small_lines = None
+    if keep_lines:
+        small_lines = [scale_points(line, sx, sy) for line in keep_lines]
+
+    small_edges, small_mask = detector.edges_and_mask(small, 0, 0, small_region, small_lines)
+    return upsample_edges(small_edges, image.shape), upsample_mask(image, small_mask, small)
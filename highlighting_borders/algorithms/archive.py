@@ -0,0 +1,347 @@
+"""
+Архив результатов: маски, контуры и метаданные в шардах с индексом
+
+Для миллионов небольших масок отдельный файл на маску стоит дороже
+самого обнаружения (метаданные файловой системы, открытие и кодирование
+каждого файла). Архив дописывает записи подряд в файлы-шарды
+shard-NNNNNN.bin, а индекс (SQLite) хранит для каждого идентификатора
+изображения шард, смещение и длины частей записи - чтение по
+идентификатору не требует просмотра шардов.
+
+Каждый шард пишет ровно один писатель (ArchiveWriter); ArchiveSink
+выдает каждому потоку своего писателя, поэтому потоки пишут параллельно
+без блокировок на файлах. Строки индекса фиксируются пачками и только
+после сброса данных шарда на диск: после сбоя индекс может отстать от
+шардов, но никогда не указывает на недописанные данные.
+
+Запись: [маска][контуры, JSON][метаданные, JSON]. Маска кодируется
+в PNG или в RLE (длины серий 0/1 по строкам изображения, uint32,
+первая серия - нули).
+"""
+
+import json
+import os
+import sqlite3
+import threading
+
+import cv2
+import numpy as np
+
+from .vector import mask_to_polygons, polygons_to_json
+
+INDEX_FILE = 'index.sqlite3'
+DEFAULT_SHARD_BYTES = 256 * 1024 * 1024
+ENCODINGS = ('png', 'rle')
+
+# Строк индекса в одной транзакции
+_COMMIT_EVERY = 512
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS shards (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    id TEXT PRIMARY KEY,
+    shard INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    mask_size INTEGER NOT NULL,
+    contours_size INTEGER NOT NULL,
+    meta_size INTEGER NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    encoding TEXT NOT NULL
+);
+"""
+
+
+def encode_rle(mask):
+    """Длины серий маски (uint32): чередуются фон и объект, первая серия - фон"""
+    flat = mask.ravel() > 0
+    changes = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    bounds = np.concatenate(([0], changes, [flat.size]))
+    runs = np.diff(bounds)
+    if flat.size and flat[0]:
+        runs = np.concatenate(([0], runs))
+    return runs.astype('<u4').tobytes()
+
+
+def decode_rle(data, width, height):
+    """Маска uint8 0/255 из длин серий encode_rle"""
+    runs = np.frombuffer(data, dtype='<u4')
+    values = np.zeros(runs.size, dtype=np.uint8)
+    values[1::2] = 255
+    return np.repeat(values, runs).reshape(height, width)
+
+
+def encode_mask(mask, encoding):
+    if encoding == 'rle':
+        return encode_rle(mask)
+    ok, data = cv2.imencode('.png', mask, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+    if not ok:
+        raise ValueError("не удалось закодировать маску в PNG")
+    return data.tobytes()
+
+
+def decode_mask(data, encoding, width, height):
+    if encoding == 'rle':
+        return decode_rle(data, width, height)
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+
+
+def _connect(path):
+    # Писатель закрывается из потока, который ждал завершения рабочих
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+class ArchiveWriter:
+    """
+    Единственный писатель своих шардов
+
+    Не потокобезопасен: каждый поток использует собственный экземпляр
+    (см. ArchiveSink). Когда шард превышает shard_bytes, начинается новый.
+    """
+
+    def __init__(self, directory, shard_bytes=DEFAULT_SHARD_BYTES, encoding='png'):
+        """
+        Параметры:
+        - directory: каталог архива (создается при необходимости)
+        - shard_bytes: примерный предельный размер шарда
+        - encoding: кодирование масок, 'png' или 'rle'
+        """
+        if encoding not in ENCODINGS:
+            raise ValueError(f"неизвестное кодирование маски: {encoding}")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.shard_bytes = shard_bytes
+        self.encoding = encoding
+        self.conn = _connect(os.path.join(directory, INDEX_FILE))
+        self.file = None
+        self.shard_id = None
+        self.pending = []
+
+    def _open_shard(self):
+        # Номер шарда выдает индекс, поэтому имена не пересекаются между писателями и запусками
+        cursor = self.conn.execute("INSERT INTO shards (name) VALUES ('')")
+        self.shard_id = cursor.lastrowid
+        name = f"shard-{self.shard_id:06d}.bin"
+        self.conn.execute("UPDATE shards SET name = ? WHERE id = ?", (name, self.shard_id))
+        self.file = open(os.path.join(self.directory, name), 'ab')
+
+    def add(self, image_id, mask, polygons=None, metadata=None):
+        """
+        Дописывает запись изображения
+
+        Параметры:
+        - image_id: идентификатор (строка); повторная запись заменяет прежнюю в индексе
+        - mask: бинарная маска uint8 0/255
+        - polygons: результат vector.mask_to_polygons или None
+        - metadata: словарь, сериализуемый в JSON
+        """
+        if self.file is None or self.file.tell() >= self.shard_bytes:
+            self._roll()
+
+        height, width = mask.shape[:2]
+        mask_data = encode_mask(mask, self.encoding)
+        contours_data = polygons_to_json(polygons, width, height).encode() if polygons is not None else b''
+        meta_data = json.dumps(metadata, ensure_ascii=False, separators=(',', ':')).encode() if metadata else b''
+
+        offset = self.file.tell()
+        self.file.write(mask_data)
+        self.file.write(contours_data)
+        self.file.write(meta_data)
+        self.pending.append((
+            image_id, self.shard_id, offset, len(mask_data), len(contours_data), len(meta_data),
+            width, height, self.encoding
+        ))
+        if len(self.pending) >= _COMMIT_EVERY:
+            self.flush()
+
+    def flush(self):
+        """Сбрасывает данные шарда на диск и фиксирует накопленные строки индекса"""
+        if self.file is None or not self.pending:
+            return
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", self.pending)
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.pending = []
+
+    def _roll(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+        self._open_shard()
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+        self.conn.close()
+
+
+class ArchiveSink:
+    """
+    Потокобезопасный приемник результатов: свой ArchiveWriter на каждый поток
+    """
+
+    def __init__(self, directory, shard_bytes=DEFAULT_SHARD_BYTES, encoding='png', tolerance=1.0,
+                 contours=True):
+        """
+        Параметры:
+        - directory, shard_bytes, encoding: как у ArchiveWriter
+        - tolerance: допуск упрощения контуров в пикселях
+        - contours: сохранять ли контуры (полигоны с отверстиями)
+        """
+        self.directory = directory
+        self.shard_bytes = shard_bytes
+        self.encoding = encoding
+        self.tolerance = tolerance
+        self.contours = contours
+        self._local = threading.local()
+        self._writers = []
+        self._lock = threading.Lock()
+
+    def _writer(self):
+        writer = getattr(self._local, 'writer', None)
+        if writer is None:
+            with self._lock:
+                writer = ArchiveWriter(self.directory, self.shard_bytes, self.encoding)
+                self._writers.append(writer)
+            self._local.writer = writer
+        return writer
+
+    def write(self, image_id, mask, metadata=None):
+        """Сохраняет маску, ее контуры и метаданные изображения"""
+        polygons = mask_to_polygons(mask, self.tolerance) if self.contours else None
+        self._writer().add(image_id, mask, polygons, metadata)
+
+    def close(self):
+        """Закрывает всех писателей (после завершения потоков, которые в них писали)"""
+        with self._lock:
+            for writer in self._writers:
+                writer.close()
+            self._writers = []
+
+
+class ArchiveRecord:
+    """Запись архива; маска и контуры декодируются при обращении"""
+
+    def __init__(self, image_id, width, height, encoding, mask_data, contours_data, meta_data):
+        self.id = image_id
+        self.width = width
+        self.height = height
+        self.encoding = encoding
+        self._mask_data = mask_data
+        self._contours_data = contours_data
+        self.metadata = json.loads(meta_data) if meta_data else {}
+
+    @property
+    def mask(self):
+        """Маска uint8 0/255"""
+        return decode_mask(self._mask_data, self.encoding, self.width, self.height)
+
+    @property
+    def polygons(self):
+        """Полигоны в формате mask_to_polygons или None, если контуры не сохранялись"""
+        if not self._contours_data:
+            return None
+        data = json.loads(self._contours_data)
+        return [
+            [list(zip(ring[0::2], ring[1::2])) for ring in rings]
+            for rings in data['polygons']
+        ]
+
+
+class ArchiveReader:
+    """
+    Чтение архива по идентификатору изображения или целиком
+
+    Файлы шардов открываются по требованию и остаются открытыми;
+    каждый поток использует собственные дескрипторы.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        index_path = os.path.join(directory, INDEX_FILE)
+        if not os.path.exists(index_path):
+            raise FileNotFoundError(f"нет индекса архива: {index_path}")
+        self.index_path = index_path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+            self._local.files = {}
+            self._local.names = dict(conn.execute("SELECT id, name FROM shards"))
+        return conn
+
+    def _file(self, shard):
+        files = self._local.files
+        handle = files.get(shard)
+        if handle is None:
+            if shard not in self._local.names:
+                self._local.names = dict(self._conn().execute("SELECT id, name FROM shards"))
+            handle = open(os.path.join(self.directory, self._local.names[shard]), 'rb')
+            files[shard] = handle
+        return handle
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def __contains__(self, image_id):
+        return self._conn().execute("SELECT 1 FROM entries WHERE id = ?", (image_id,)).fetchone() is not None
+
+    def ids(self):
+        """Идентификаторы всех изображений"""
+        return [row[0] for row in self._conn().execute("SELECT id FROM entries ORDER BY id")]
+
+    def _record(self, row):
+        image_id, shard, offset, mask_size, contours_size, meta_size, width, height, encoding = row
+        handle = self._file(shard)
+        handle.seek(offset)
+        data = handle.read(mask_size + contours_size + meta_size)
+        return ArchiveRecord(
+            image_id, width, height, encoding,
+            data[:mask_size], data[mask_size:mask_size + contours_size], data[mask_size + contours_size:]
+        )
+
+    def get(self, image_id):
+        """
+        Запись изображения
+
+        Возвращает:
+        - ArchiveRecord; KeyError, если изображения нет в архиве
+        """
+        row = self._conn().execute("SELECT * FROM entries WHERE id = ?", (image_id,)).fetchone()
+        if row is None:
+            raise KeyError(image_id)
+        return self._record(row)
+
+    __getitem__ = get
+
+    def __iter__(self):
+        """Все записи в порядке расположения в шардах (последовательное чтение)"""
+        rows = self._conn().execute("SELECT * FROM entries ORDER BY shard, offset").fetchall()
+        for row in rows:
+            yield self._record(row)
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            for handle in self._local.files.values():
+                handle.close()
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,274 @@
+"""
+Обработка только в узкой полосе вдоль границы маски
+
+Полоса разбивается на небольшие тайлы, и вычисления выполняются лишь
+в тайлах, содержащих пиксели полосы, поэтому стоимость растет с длиной
+контура, а не с площадью изображения. Тайлы находятся по точкам
+контуров маски, и сама полоса строится морфологией только в них.
+"""
+
+import cv2
+import numpy as np
+
+
+def contour_tiles(contours, shape, halo, tile_size=64):
+    """
+    Перечисляет тайлы, в которые попадает окрестность радиуса halo точек контуров
+
+    Стоимость пропорциональна числу точек контуров, а не площади изображения.
+
+    Параметры:
+    - contours: контуры (все точки, CHAIN_APPROX_NONE)
+    - shape: размер изображения (height, width)
+    - halo: радиус окрестности точек в пикселях
+    - tile_size: размер тайла
+
+    Возвращает:
+    - список прямоугольников (x0, y0, x1, y1)
+    """
+    if not contours:
+        return []
+    h, w = shape[:2]
+    rows = (h + tile_size - 1) // tile_size
+    cols = (w + tile_size - 1) // tile_size
+
+    points = np.concatenate([c.reshape(-1, 2) for c in contours])
+    x, y = points[:, 0], points[:, 1]
+    tx0 = np.clip(x - halo, 0, w - 1) // tile_size
+    tx1 = np.clip(x + halo, 0, w - 1) // tile_size
+    ty0 = np.clip(y - halo, 0, h - 1) // tile_size
+    ty1 = np.clip(y + halo, 0, h - 1) // tile_size
+
+    # Окрестность точки захватывает не больше span тайлов по каждой оси
+    occupied = np.zeros((rows, cols), dtype=bool)
+    span = 2 * halo // tile_size + 2
+    for dy in range(span):
+        for dx in range(span):
+            occupied[np.minimum(ty0 + dy, ty1), np.minimum(tx0 + dx, tx1)] = True
+
+    return [
+        (tx * tile_size, ty * tile_size, min(w, (tx + 1) * tile_size), min(h, (ty + 1) * tile_size))
+        for ty, tx in zip(*np.nonzero(occupied))
+    ]
+
+
+def boundary_band_tiles(mask, band_width, tile_size=64):
+    """
+    Строит полосу шириной band_width пикселей по обе стороны от границы маски
+
+    Морфология выполняется только в тайлах у контуров маски, так что
+    работа (кроме одного прохода findContours) пропорциональна длине
+    границы, а не площади изображения.
+
+    Параметры:
+    - mask: бинарная маска (0/255)
+    - band_width: полуширина полосы в пикселях
+    - tile_size: размер тайла
+
+    Возвращает:
+    - band: бинарная маска полосы (0/255)
+    - tiles: тайлы (x0, y0, x1, y1), в которых есть пиксели полосы
+    """
+    h, w = mask.shape[:2]
+    band = np.zeros((h, w), dtype=np.uint8)
+    contours, _ = cv2.findContours(mask, cv2.RETR_LIST, cv2.CHAIN_APPROX_NONE)
+
+    size = 2 * band_width + 1
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (size, size))
+    tiles = []
+    for x0, y0, x1, y1 in contour_tiles(contours, (h, w), band_width + 1, tile_size):
+        # Тайл с запасом на радиус ядра, чтобы края тайла считались точно
+        ex0, ey0 = max(0, x0 - band_width), max(0, y0 - band_width)
+        ex1, ey1 = min(w, x1 + band_width), min(h, y1 + band_width)
+        crop = mask[ey0:ey1, ex0:ex1]
+        ring = cv2.subtract(cv2.dilate(crop, kernel), cv2.erode(crop, kernel))
+        ring = ring[y0 - ey0:y1 - ey0, x0 - ex0:x1 - ex0]
+        if cv2.countNonZero(ring):
+            band[y0:y1, x0:x1] = ring
+            tiles.append((x0, y0, x1, y1))
+    return band, tiles
+
+
+def boundary_band(mask, band_width):
+    """
+    Строит полосу шириной band_width пикселей по обе стороны от границы маски
+
+    Параметры:
+    - mask: бинарная маска (0/255)
+    - band_width: полуширина полосы в пикселях
+
+    Возвращает:
+    - band: бинарная маска полосы (0/255)
+    """
+    return boundary_band_tiles(mask, band_width)[0]
+
+
+def band_tiles(band, tile_size=64):
+    """
+    Перечисляет тайлы, в которых есть пиксели полосы
+
+    Просматривается только ограничивающий прямоугольник полосы; если тайлы
+    уже известны (boundary_band_tiles), лучше передать их напрямую.
+
+    Возвращает:
+    - список прямоугольников (x0, y0, x1, y1)
+    """
+    h, w = band.shape[:2]
+    bx, by, bw, bh = cv2.boundingRect(band)
+    if not bw or not bh:
+        return []
+
+    # Окно выравнивается по сетке тайлов; максимум по тайлам без копии окна
+    x0, y0 = bx // tile_size * tile_size, by // tile_size * tile_size
+    window = band[y0:by + bh, x0:bx + bw]
+    rows = np.arange(0, window.shape[0], tile_size)
+    cols = np.arange(0, window.shape[1], tile_size)
+    occupied = np.maximum.reduceat(np.maximum.reduceat(window, rows, axis=0), cols, axis=1) > 0
+
+    return [
+        (x0 + tx * tile_size, y0 + ty * tile_size,
+         min(w, x0 + (tx + 1) * tile_size), min(h, y0 + (ty + 1) * tile_size))
+        for ty, tx in zip(*np.nonzero(occupied))
+    ]
+
+
+def guided_filter(guide, src, radius, eps):
+    """
+    Guided filter (He et al.) с одноканальным направляющим изображением
+
+    Параметры:
+    - guide: направляющее изображение float32 в диапазоне [0, 1]
+    - src: фильтруемое изображение float32
+    - radius: радиус окна
+    - eps: регуляризация (чем больше, тем сильнее сглаживание)
+
+    Возвращает:
+    - q: отфильтрованное изображение float32
+    """
+    size = (2 * radius + 1, 2 * radius + 1)
+
+    def box(x):
+        return cv2.boxFilter(x, cv2.CV_32F, size, borderType=cv2.BORDER_REFLECT)
+
+    mean_i = box(guide)
+    mean_p = box(src)
+    cov_ip = box(guide * src) - mean_i * mean_p
+    var_i = box(guide * guide) - mean_i * mean_i
+
+    a = cov_ip / (var_i + eps)
+    b = mean_p - a * mean_i
+    return box(a) * guide + box(b)
+
+
+def guided_filter_band(image, src, band, radius=4, eps=1e-3, tile_size=64, tiles=None):
+    """
+    Применяет guided filter к src только в тайлах, покрывающих полосу
+
+    Направляющее изображение (оттенки серого) строится лишь для этих тайлов.
+
+    Параметры:
+    - image: исходное изображение (RGB или оттенки серого)
+    - src: фильтруемая карта (uint8 0..255 или float32 0..1) полного размера
+    - band: бинарная маска полосы
+    - radius, eps: параметры guided filter
+    - tile_size: размер тайла
+    - tiles: готовые тайлы полосы (из boundary_band_tiles)
+
+    Возвращает:
+    - генератор (x0, y0, x1, y1, q, band_tile), где q - float32 результат
+      в диапазоне примерно [0, 1] для тайла, band_tile - полоса в тайле
+    """
+    h, w = band.shape[:2]
+    halo = 2 * radius
+    scale = 1.0 / 255 if src.dtype == np.uint8 else 1.0
+    if tiles is None:
+        tiles = band_tiles(band, tile_size)
+
+    for x0, y0, x1, y1 in tiles:
+        # Тайл с запасом на два прохода box-фильтра
+        ex0, ey0 = max(0, x0 - halo), max(0, y0 - halo)
+        ex1, ey1 = min(w, x1 + halo), min(h, y1 + halo)
+
+        crop = image[ey0:ey1, ex0:ex1]
+        if crop.ndim == 3:
+            crop = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+        guide = crop.astype(np.float32) / 255
+        p = src[ey0:ey1, ex0:ex1].astype(np.float32) * scale
+
+        q = guided_filter(guide, p, radius, eps)
+        q = q[y0 - ey0:y1 - ey0, x0 - ex0:x1 - ex0]
+        yield x0, y0, x1, y1, q, band[y0:y1, x0:x1]
+
+
+def class_means(pixels, inside, uncertain, radius):
+    """
+    Средние цвета надежного объекта и надежного фона в окне вокруг каждого пикселя
+
+    Параметры:
+    - pixels: цвета float32 (H, W, C)
+    - inside: пиксели маски (bool)
+    - uncertain: пиксели полосы (bool) - не считаются надежными
+    - radius: радиус окна
+
+    Возвращает:
+    - mean_fg, mean_bg: средние цвета (H, W, C)
+    - known: в окне есть оба класса (bool)
+    """
+    size = (2 * radius + 1, 2 * radius + 1)
+
+    def box(x):
+        return cv2.boxFilter(x, cv2.CV_32F, size, normalize=False, borderType=cv2.BORDER_CONSTANT)
+
+    fg = (inside & ~uncertain).astype(np.float32)
+    bg = (~inside & ~uncertain).astype(np.float32)
+    count_fg = box(fg)
+    count_bg = box(bg)
+    mean_fg = box(pixels * fg[:, :, None]).reshape(pixels.shape) / np.maximum(count_fg, 1)[:, :, None]
+    mean_bg = box(pixels * bg[:, :, None]).reshape(pixels.shape) / np.maximum(count_bg, 1)[:, :, None]
+    return mean_fg, mean_bg, (count_fg > 0) & (count_bg > 0)
+
+
+def classify_band(image, mask, band, radius, tile_size=64, tiles=None):
+    """
+    Переназначает пиксели полосы объекту или фону по цвету
+
+    Для каждого пикселя полосы берутся средние цвета надежного объекта
+    и надежного фона (маска вне полосы) в окне радиуса radius; пиксель
+    относится к тому классу, к среднему цвету которого он ближе. Граница
+    маски при этом прилипает к границе на изображении.
+
+    Параметры:
+    - image: изображение (RGB)
+    - mask: бинарная маска (0/255)
+    - band: полоса неопределенности (0/255)
+    - radius: радиус окна; должен быть больше полуширины полосы
+    - tile_size: размер тайла
+    - tiles: готовые тайлы полосы (из boundary_band_tiles)
+
+    Возвращает:
+    - mask: уточненная маска (новый массив)
+    """
+    h, w = mask.shape[:2]
+    result = mask.copy()
+    if tiles is None:
+        tiles = band_tiles(band, tile_size)
+
+    for x0, y0, x1, y1 in tiles:
+        ex0, ey0 = max(0, x0 - radius), max(0, y0 - radius)
+        ex1, ey1 = min(w, x1 + radius), min(h, y1 + radius)
+
+        pixels = image[ey0:ey1, ex0:ex1].astype(np.float32)
+        if pixels.ndim == 2:
+            pixels = pixels[:, :, None]
+        uncertain = band[ey0:ey1, ex0:ex1] > 0
+        mean_fg, mean_bg, known = class_means(pixels, mask[ey0:ey1, ex0:ex1] > 0, uncertain, radius)
+        dist_fg = ((pixels - mean_fg) ** 2).sum(axis=2)
+        dist_bg = ((pixels - mean_bg) ** 2).sum(axis=2)
+
+        # Переназначаем только пиксели полосы, у которых в окне есть оба класса
+        inner = (slice(y0 - ey0, y1 - ey0), slice(x0 - ex0, x1 - ex0))
+        known = uncertain[inner] & known[inner]
+        tile = result[y0:y1, x0:x1]
+        tile[known] = np.where(dist_fg[inner][known] <= dist_bg[inner][known], 255, 0)
+
+    return result
@@ -0,0 +1,209 @@
+"""
+Постоянный кеш результатов на диске с адресацией по содержимому
+
+Ключ - хеш байтов изображения вместе со всеми параметрами детектора
+и аннотациями. Запись - сжатый .npz с маской и (необязательно)
+промежуточными стадиями. Объем ограничен, вытесняются давно
+использованные записи. Запись выполняется атомарно через временный
+файл и os.replace, вытеснение - под файловой блокировкой, поэтому
+кешем могут одновременно пользоваться несколько рабочих процессов.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Меняется при изменении алгоритма, чтобы не читать устаревшие результаты
+CACHE_VERSION = 1
+
+DEFAULT_MAX_BYTES = 1024 ** 3
+
+
+def default_cache_dir():
+    """Каталог кеша по умолчанию (переопределяется HIGHLIGHTING_BORDERS_CACHE)"""
+    path = os.environ.get('HIGHLIGHTING_BORDERS_CACHE')
+    if path:
+        return path
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'highlighting_borders')
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """Хеш содержимого файла (без декодирования изображения)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def array_digest(array):
+    """Хеш массива вместе с его размером и типом"""
+    digest = hashlib.sha256()
+    digest.update(f"{array.shape}{array.dtype}".encode())
+    digest.update(np.ascontiguousarray(array).data)
+    return digest.hexdigest()
+
+
+def _json_default(value):
+    # Точки аннотаций могут быть кортежами или числами NumPy
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return list(value)
+
+
+def make_key(image_digest, params, annotations=None):
+    """
+    Ключ записи кеша
+
+    Параметры:
+    - image_digest: хеш исходного изображения (file_digest или array_digest)
+    - params: словарь параметров детектора
+    - annotations: словарь аннотаций (области, линии keep и т.п.), должен сериализоваться в JSON
+    """
+    payload = json.dumps(
+        {'v': CACHE_VERSION, 'image': image_digest, 'params': params, 'annotations': annotations},
+        sort_keys=True, separators=(',', ':'), default=_json_default
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Кеш масок и промежуточных стадий на диске с ограничением объема (LRU)
+    """
+
+    # Доля лимита, после записи которой выполняется проверка объема
+    EVICT_CHECK_FRACTION = 0.05
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Параметры:
+        - directory: каталог кеша (по умолчанию default_cache_dir())
+        - max_bytes: максимальный объем записей в байтах
+        """
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self._written_since_check = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.npz')
+
+    def get(self, key):
+        """
+        Возвращает сохраненные массивы (словарь с ключом 'mask' и стадиями) или None
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                result = {name: data[name] for name in data.files}
+            # Отмечаем использование для LRU
+            os.utime(path)
+        except (OSError, ValueError, zipfile.BadZipFile, EOFError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return result
+
+    def put(self, key, mask, **stages):
+        """
+        Сохраняет маску и промежуточные стадии (например, edges=...)
+        """
+        path = self._path(key)
+        shard = os.path.dirname(path)
+        os.makedirs(shard, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=shard, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez_compressed(f, mask=mask, **stages)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self.writes += 1
+        self._written_since_check += os.path.getsize(path)
+        if self._written_since_check >= self.max_bytes * self.EVICT_CHECK_FRACTION:
+            self.evict()
+
+    def _entries(self):
+        """Список (время использования, размер, путь) всех записей"""
+        entries = []
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.name.endswith('.npz'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        """Удаляет давно использованные записи, пока объем превышает лимит"""
+        self._written_since_check = 0
+        lock_path = os.path.join(self.directory, '.lock')
+
+        with open(lock_path, 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                entries = self._entries()
+                total = sum(size for _, size, _ in entries)
+                for _, size, path in sorted(entries):
+                    if total <= self.max_bytes:
+                        break
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def clear(self):
+        """Удаляет все записи"""
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        """
+        Статистика кеша
+
+        Возвращает:
+        - словарь: hits, misses, writes, hit_rate (для этого экземпляра),
+          entries, bytes (для всего каталога)
+        """
+        entries = self._entries()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'writes': self.writes,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+        }
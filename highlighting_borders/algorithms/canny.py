@@ -1,8 +1,32 @@
 import cv2
 import numpy as np
 
+from .cache import array_digest, make_key
+from .detection import DetectionResult, draw_edges
+from .overrides import apply_overrides
+from .strength import EdgeStrengthMap
+
 
 class CannyEdgeDetector:
+    """
+    Детектор границ Canny с неизменяемыми параметрами
+
+    Параметры задаются при создании и не меняются, а вызовы не хранят
+    состояния в объекте, поэтому один экземпляр можно использовать из
+    нескольких потоков одновременно. Тяжелые шаги выполняются в OpenCV,
+    который отпускает GIL, так что потоки работают параллельно; число
+    внутренних потоков OpenCV задается политикой из algorithms.threads.
+    Для других параметров создается новый объект (см. replace).
+    """
+
+    __slots__ = ('_threshold1', '_threshold2', '_blur_size')
+
+    # Радиус влияния морфологии close_edges: dilate x2 + erode x1 + close x2 ядром 3x3
+    MORPH_HALO = 7
+
+    # Радиус влияния линии keep: толщина 5 px и расширение ядром 7x7
+    KEEP_LINE_HALO = 6
+
     def __init__(self, threshold1=50, threshold2=150, blur_size=5):
         """
         Инициализация детектора границ Canny
@@ -12,11 +36,49 @@ class CannyEdgeDetector:
         - threshold2: верхний порог для гистерезиса
         - blur_size: размер ядра для Gaussian blur
         """
-        self.threshold1 = threshold1
-        self.threshold2 = threshold2
-        self.blur_size = blur_size if blur_size % 2 == 1 else blur_size + 1
+        self._threshold1 = threshold1
+        self._threshold2 = threshold2
+        self._blur_size = blur_size if blur_size % 2 == 1 else blur_size + 1
+
+    @property
+    def threshold1(self):
+        return self._threshold1
+
+    @property
+    def threshold2(self):
+        return self._threshold2
+
+    @property
+    def blur_size(self):
+        return self._blur_size
 
-    def detect_edges(self, image, keep_points=None, offset_x=0, offset_y=0, region_mask=None, keep_lines=None):
+    def replace(self, **changes):
+        """Новый детектор с измененными параметрами (threshold1, threshold2, blur_size)"""
+        params = dict(self.params(), **changes)
+        return CannyEdgeDetector(params['threshold1'], params['threshold2'], params['blur_size'])
+
+    def params(self):
+        """Параметры детектора в виде словаря (для ключей кеша и отчетов)"""
+        return {
+            'threshold1': self.threshold1,
+            'threshold2': self.threshold2,
+            'blur_size': self.blur_size,
+        }
+
+    def __eq__(self, other):
+        if not isinstance(other, CannyEdgeDetector):
+            return NotImplemented
+        return self.params() == other.params()
+
+    def __hash__(self):
+        return hash((self.threshold1, self.threshold2, self.blur_size))
+
+    def __repr__(self):
+        return (f"CannyEdgeDetector(threshold1={self.threshold1}, "
+                f"threshold2={self.threshold2}, blur_size={self.blur_size})")
+
+    def detect_edges(self, image, keep_points=None, offset_x=0, offset_y=0, region_mask=None, keep_lines=None,
+                     cache=None, overrides=None):
         """
         Обнаружение границ на изображении
 
@@ -26,19 +88,91 @@ class CannyEdgeDetector:
         - offset_x, offset_y: смещение относительно исходного изображения
         - region_mask: маска области для обработки (255 - обрабатывать, 0 - игнорировать)
         - keep_lines: список отдельных линий [[line1_points], [line2_points], ...]
+        - cache: ResultCache - если задан, результат берется из кеша или сохраняется в него
+        - overrides: список RegionOverride - области со своими параметрами детектора
 
         Возвращает:
         - image_with_edges: изображение с нарисованными границами
         - mask: бинарная маска объекта (заполненная область внутри контура)
         """
-        # 1. Преобразование в оттенки серого
-        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        result = self.detect(image, offset_x, offset_y, region_mask, keep_lines, cache, overrides)
 
-        # 2. Применение Gaussian blur для уменьшения шума
-        blurred = cv2.GaussianBlur(gray, (self.blur_size, self.blur_size), 0)
+        # 9. Создание изображения с границами (для визуализации)
+        return result.overlay, result.mask
 
-        # 3. Применение алгоритма Canny
-        edges = cv2.Canny(blurred, self.threshold1, self.threshold2)
+    def detect(self, image, offset_x=0, offset_y=0, region_mask=None, keep_lines=None, cache=None,
+               overrides=None):
+        """
+        Обнаружение границ с ленивым результатом
+
+        Выполняются шаги 1-6 (до замкнутой карты границ); контуры, маска
+        и изображение с границами считаются при первом обращении к ним.
+
+        Параметры те же, что у detect_edges.
+
+        Возвращает:
+        - DetectionResult
+        """
+        key = None
+        if cache is not None:
+            annotations = {
+                'offset': [offset_x, offset_y],
+                'region_mask': array_digest(region_mask) if region_mask is not None else None,
+                'keep_lines': keep_lines or [],
+                'overrides': [o.key() for o in overrides or []],
+            }
+            key = make_key(array_digest(image), self.params(), annotations)
+            cached = cache.get(key)
+            if cached is not None:
+                return DetectionResult(image, edges=cached['edges'], mask=cached['mask'])
+
+        edges = self.annotated_edges(image, offset_x, offset_y, region_mask, keep_lines, overrides)
+
+        # 6. Морфологические операции для замыкания контуров
+        edges = self.close_edges(edges)
+
+        # 7-8. Контуры и маска - по требованию
+        shape = edges.shape
+        result = DetectionResult(
+            image, edges=edges,
+            select=lambda contours: self.select_contours(contours, shape, keep_lines, offset_x, offset_y)
+        )
+
+        if cache is not None:
+            cache.put(key, result.mask, edges=edges)
+
+        return result
+
+    def edges_and_mask(self, image, offset_x=0, offset_y=0, region_mask=None, keep_lines=None, overrides=None):
+        """
+        Шаги 1-8 обнаружения: бинарная карта границ и маска объекта
+
+        Параметры те же, что у detect_edges.
+
+        Возвращает:
+        - edges: бинарная карта замкнутых границ
+        - mask: бинарная маска объекта
+        """
+        edges = self.annotated_edges(image, offset_x, offset_y, region_mask, keep_lines, overrides)
+        return self.fill_edges(edges, keep_lines, offset_x, offset_y)
+
+    def annotated_edges(self, image, offset_x=0, offset_y=0, region_mask=None, keep_lines=None, overrides=None):
+        """
+        Шаги 1-5 обнаружения: границы Canny с учетом области, линий keep и областей с параметрами
+
+        Параметры те же, что у detect_edges.
+
+        Возвращает:
+        - edges: бинарная карта границ (еще не замкнутых)
+        """
+        # 1-3. Оттенки серого, Gaussian blur и алгоритм Canny
+        if overrides:
+            # Области со своими параметрами считаются на обрезках общего gray
+            gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+            edges = self.canny_edges(image, self.blurred_gray(image, gray))
+            apply_overrides(edges, gray, overrides)
+        else:
+            edges = self.canny_edges(image)
 
         # 4. Применяем маску области если она есть
         if region_mask is not None:
@@ -46,85 +180,203 @@ class CannyEdgeDetector:
 
         # 5. Если есть линии keep, усиливаем границы вдоль них
         if keep_lines and len(keep_lines) > 0:
-            enhance_mask = np.zeros_like(edges)
-
-            # Обрабатываем каждую линию отдельно
-            for line in keep_lines:
-                if len(line) < 2:
-                    continue
+            enhance_mask = self.build_enhance_mask(edges.shape, keep_lines, offset_x, offset_y)
 
-                # Конвертируем точки линии
-                line_points = []
-                for point in line:
-                    x, y = int(point[0] - offset_x), int(point[1] - offset_y)
-                    if 0 <= x < edges.shape[1] and 0 <= y < edges.shape[0]:
-                        line_points.append((x, y))
+            # Объединяем с исходными границами
+            edges = cv2.bitwise_or(edges, enhance_mask)
 
-                for i in range(len(line_points) - 1):
-                    cv2.line(enhance_mask, line_points[i], line_points[i + 1], 255, 5)
+        return edges
 
-            # Расширяем область усиления
-            kernel_enhance = np.ones((7, 7), np.uint8)
-            enhance_mask = cv2.dilate(enhance_mask, kernel_enhance, iterations=1)
+    def fill_edges(self, edges, keep_lines=None, offset_x=0, offset_y=0):
+        """
+        Шаги 6-8 обнаружения: замыкание границ, выбор контуров и маска
 
-            # Объединяем с исходными границами
-            edges = cv2.bitwise_or(edges, enhance_mask)
+        Параметры:
+        - edges: бинарная карта границ (Canny с учетом аннотаций)
+        - keep_lines, offset_x, offset_y: как у detect_edges
 
+        Возвращает:
+        - edges: бинарная карта замкнутых границ
+        - mask: бинарная маска объекта
+        """
         # 6. Морфологические операции для замыкания контуров
-        kernel = np.ones((3, 3), np.uint8)
-        edges = cv2.dilate(edges, kernel, iterations=2)
-        edges = cv2.erode(edges, kernel, iterations=1)
-        edges = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, kernel, iterations=2)
+        edges = self.close_edges(edges)
 
         # 7. Находим контуры
         contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
         # 8. Создаем маску - заполняем контуры
-        mask = np.zeros(image.shape[:2], dtype=np.uint8)
-
-        if contours:
-            # Если есть линии, находим контуры которые пересекают ЛЮБУЮ из линий
-            if keep_lines and len(keep_lines) > 0:
-                selected_contours = []
-
-                for contour in contours:
-                    if cv2.contourArea(contour) < 100:
-                        continue
-
-                    # Проверяем, пересекает ли контур хотя бы одну линию
-                    contour_selected = False
-                    for line in keep_lines:
-                        for point in line:
-                            x, y = int(point[0] - offset_x), int(point[1] - offset_y)
-                            if 0 <= x < edges.shape[1] and 0 <= y < edges.shape[0]:
-                                dist = cv2.pointPolygonTest(contour, (x, y), True)
-                                if dist >= -10:
-                                    contour_selected = True
-                                    break
-                        if contour_selected:
-                            break
+        mask = np.zeros(edges.shape[:2], dtype=np.uint8)
+        selected_contours = self.select_contours(contours, edges.shape, keep_lines, offset_x, offset_y)
+        if selected_contours:
+            cv2.drawContours(mask, selected_contours, -1, 255, -1)
+
+        return edges, mask
+
+    @staticmethod
+    def draw_edges(image, edges):
+        """Рисует границы зеленым на копии изображения"""
+        return draw_edges(image, edges)
+
+    def blurred_gray(self, image, gray=None):
+        """
+        Размытое изображение в оттенках серого - вход для Canny
+
+        Зависит только от blur_size, поэтому может переиспользоваться
+        при изменении порогов. Если gray уже посчитан, он не пересчитывается.
+        """
+        # 1. Преобразование в оттенки серого
+        if gray is None:
+            gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+
+        # 2. Применение Gaussian blur для уменьшения шума
+        return cv2.GaussianBlur(gray, (self.blur_size, self.blur_size), 0)
+
+    def strength_map(self, image, blurred=None, previous=None):
+        """
+        Карта силы границ для размытия и верхнего порога детектора
+
+        С ней canny_edges для любого threshold1 <= threshold2 сводится
+        к одному сравнению (см. algorithms.strength).
+
+        Параметры:
+        - image: входное изображение (RGB)
+        - blurred: готовый результат blurred_gray(image), если он уже посчитан
+        - previous: прежняя карта; при том же размытии ее градиент переиспользуется
+
+        Возвращает:
+        - EdgeStrengthMap
+        """
+        if blurred is None:
+            blurred = self.blurred_gray(image)
+        ridges = None
+        if previous is not None and previous.blur_size == self.blur_size:
+            ridges = previous.ridges
+        return EdgeStrengthMap(blurred, self.blur_size, self.threshold2, ridges)
+
+    def canny_edges(self, image, blurred=None, strength=None):
+        """
+        Карта границ Canny без учета аннотаций
+
+        Параметры:
+        - image: входное изображение (RGB)
+        - blurred: готовый результат blurred_gray(image), если он уже посчитан
+        - strength: EdgeStrengthMap; если она подходит к параметрам,
+          границы берутся из нее без запуска Canny (результат тот же)
+
+        Возвращает:
+        - edges: бинарное изображение границ
+        """
+        if strength is not None and strength.supports(self):
+            return strength.edges(self.threshold1)
+
+        if blurred is None:
+            blurred = self.blurred_gray(image)
+
+        # 3. Применение алгоритма Canny
+        edges = cv2.Canny(blurred, self.threshold1, self.threshold2)
+
+        return edges
+
+    @staticmethod
+    def line_points(line, shape, offset_x=0, offset_y=0):
+        """
+        Переводит точки линии в координаты изображения, отбрасывая точки вне его
+        """
+        points = []
+        for point in line:
+            x, y = int(point[0] - offset_x), int(point[1] - offset_y)
+            if 0 <= x < shape[1] and 0 <= y < shape[0]:
+                points.append((x, y))
+        return points
+
+    def build_enhance_mask(self, shape, keep_lines, offset_x=0, offset_y=0):
+        """
+        Строит маску усиления границ вдоль линий keep
+
+        Параметры:
+        - shape: размер маски границ (height, width)
+        - keep_lines: список отдельных линий
+        - offset_x, offset_y: смещение относительно исходного изображения
+
+        Возвращает:
+        - enhance_mask: бинарная маска усиления
+        """
+        enhance_mask = np.zeros(shape[:2], dtype=np.uint8)
+
+        # Обрабатываем каждую линию отдельно
+        for line in keep_lines:
+            if len(line) < 2:
+                continue
+
+            line_points = self.line_points(line, shape, offset_x, offset_y)
+            for i in range(len(line_points) - 1):
+                cv2.line(enhance_mask, line_points[i], line_points[i + 1], 255, 5)
+
+        # Расширяем область усиления
+        kernel_enhance = np.ones((7, 7), np.uint8)
+        return cv2.dilate(enhance_mask, kernel_enhance, iterations=1)
 
+    def close_edges(self, edges):
+        """
+        Морфологические операции для замыкания контуров
+
+        Параметры:
+        - edges: бинарное изображение границ
+
+        Возвращает:
+        - edges: границы после dilate/erode/close
+        """
+        kernel = np.ones((3, 3), np.uint8)
+        edges = cv2.dilate(edges, kernel, iterations=2)
+        edges = cv2.erode(edges, kernel, iterations=1)
+        return cv2.morphologyEx(edges, cv2.MORPH_CLOSE, kernel, iterations=2)
+
+    def select_contours(self, contours, shape, keep_lines=None, offset_x=0, offset_y=0):
+        """
+        Выбирает контуры, которые войдут в маску объекта
+
+        Если есть линии keep - берутся контуры, пересекающие ЛЮБУЮ из линий,
+        иначе (или если таких нет) - самый большой контур.
+
+        Параметры:
+        - contours: список контуров
+        - shape: размер изображения (height, width)
+        - keep_lines: список отдельных линий
+        - offset_x, offset_y: смещение относительно исходного изображения
+
+        Возвращает:
+        - selected_contours: список выбранных контуров
+        """
+        if not contours:
+            return []
+
+        if keep_lines and len(keep_lines) > 0:
+            selected_contours = []
+
+            for contour in contours:
+                if cv2.contourArea(contour) < 100:
+                    continue
+
+                # Проверяем, пересекает ли контур хотя бы одну линию
+                contour_selected = False
+                for line in keep_lines:
+                    for x, y in self.line_points(line, shape, offset_x, offset_y):
+                        dist = cv2.pointPolygonTest(contour, (x, y), True)
+                        if dist >= -10:
+                            contour_selected = True
+                            break
                     if contour_selected:
-                        selected_contours.append(contour)
-
-                if selected_contours:
-                    # Заполняем ВСЕ выбранные контуры
-                    cv2.drawContours(mask, selected_contours, -1, 255, -1)
-                else:
-                    # Если не нашли подходящие контуры, берем самый большой
-                    if contours:
-                        largest_contour = max(contours, key=cv2.contourArea)
-                        cv2.drawContours(mask, [largest_contour], -1, 255, -1)
-            else:
-                # Если нет линий, берем самый большой контур
-                largest_contour = max(contours, key=cv2.contourArea)
-                cv2.drawContours(mask, [largest_contour], -1, 255, -1)
+                        break
 
-        # 9. Создание изображения с границами (для визуализации)
-        result = image.copy()
-        result[edges > 0] = [0, 255, 0]
+                if contour_selected:
+                    selected_contours.append(contour)
+
+            if selected_contours:
+                return selected_contours
 
-        return result, mask
+        # Если нет линий или подходящих контуров, берем самый большой
+        return [max(contours, key=cv2.contourArea)]
 
     def find_contours(self, edges):
         """
@@ -0,0 +1,117 @@
+"""
+Результат обнаружения с ленивыми производными
+
+Карта границ, контуры, маска, ограничивающий прямоугольник, изображение
+с границами и RGBA без фона считаются при первом обращении и
+запоминаются: каждое производное считается не больше одного раза
+и не считается вовсе, если его никто не читает. Пакетной обработке
+нужна только маска, предпросмотру в GUI - контуры и рамка, и ни тем,
+ни другим не нужно изображение с зелеными границами.
+
+Результат принадлежит одному вызывающему: ленивые поля заполняются
+без блокировок.
+"""
+
+import cv2
+import numpy as np
+
+EDGE_COLOR = (0, 255, 0)
+
+
+def draw_edges(image, edges):
+    """Рисует границы зеленым на копии изображения"""
+    result = image.copy()
+    result[edges > 0] = EDGE_COLOR
+    return result
+
+
+class DetectionResult:
+    """
+    Результат обнаружения для одного изображения
+
+    Задается любым из готовых представлений (карта границ, контуры, маска),
+    остальные выводятся из них по требованию:
+    - contours: из маски (внешние контуры) или из карты границ (все внешние
+      контуры, отобранные функцией select)
+    - mask: заливка контуров
+    - edges: контуры толщиной 1 px, если карта границ не задана
+    """
+
+    def __init__(self, image, edges=None, contours=None, mask=None, select=None):
+        """
+        Параметры:
+        - image: исходное изображение (RGB)
+        - edges: бинарная карта замкнутых границ
+        - contours: контуры объекта (выбранные, а не все найденные)
+        - mask: бинарная маска объекта
+        - select: функция contours -> выбранные контуры, для контуров из карты границ
+        """
+        if edges is None and contours is None and mask is None:
+            raise ValueError("нужна карта границ, контуры или маска")
+        self.image = image
+        self.shape = image.shape[:2]
+        self._edges = edges
+        self._contours = contours
+        self._mask = mask
+        self._select = select
+        self._bbox = None
+        self._overlay = None
+        self._rgba = None
+
+    @property
+    def edges(self):
+        """Бинарная карта замкнутых границ"""
+        if self._edges is None:
+            edges = np.zeros(self.shape, dtype=np.uint8)
+            cv2.drawContours(edges, self.contours, -1, 255, 1)
+            self._edges = edges
+        return self._edges
+
+    @property
+    def contours(self):
+        """Контуры объекта (внешние)"""
+        if self._contours is None:
+            source = self._mask if self._mask is not None else self._edges
+            contours, _ = cv2.findContours(source, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            if self._mask is None and self._select is not None:
+                contours = self._select(contours)
+            self._contours = list(contours)
+        return self._contours
+
+    @property
+    def mask(self):
+        """Бинарная маска объекта (0/255)"""
+        if self._mask is None:
+            mask = np.zeros(self.shape, dtype=np.uint8)
+            if self.contours:
+                cv2.drawContours(mask, self.contours, -1, 255, -1)
+            self._mask = mask
+        return self._mask
+
+    @property
+    def bbox(self):
+        """Ограничивающий прямоугольник объекта (x, y, w, h); (0, 0, 0, 0) для пустой маски"""
+        if self._bbox is None:
+            if self._mask is not None:
+                self._bbox = cv2.boundingRect(self._mask)
+            elif self.contours:
+                self._bbox = cv2.boundingRect(np.concatenate(self.contours))
+            else:
+                self._bbox = (0, 0, 0, 0)
+        return self._bbox
+
+    @property
+    def overlay(self):
+        """Изображение с границами, нарисованными зеленым"""
+        if self._overlay is None:
+            self._overlay = draw_edges(self.image, self.edges)
+        return self._overlay
+
+    @property
+    def rgba(self):
+        """Изображение без фона: RGBA, альфа-канал - маска"""
+        if self._rgba is None:
+            rgba = cv2.cvtColor(self.image, cv2.COLOR_RGB2RGBA)
+            rgba[:, :, 3] = self.mask
+            self._rgba = rgba
+        return self._rgba
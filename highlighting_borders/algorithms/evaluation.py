@@ -0,0 +1,219 @@
+"""
+Оценка качества масок по эталонной разметке
+
+Метрики: IoU, F-мера по границе (граница маски считается найденной,
+если до границы эталона не дальше tolerance пикселей) и относительная
+ошибка площади. Эталон упаковывается по биту на пиксель один раз,
+IoU и площади считаются побитовыми операциями с подсчетом единиц,
+граничные метрики - только в пределах общего прямоугольника маски
+и эталона.
+
+Для набора пресетов одного изображения общие стадии считаются один раз:
+оттенки серого - на изображение, размытие - на каждый blur_size, карта
+силы границ - на пару (blur_size, threshold2), у которой столько нижних
+порогов, что построение карты окупается (STRENGTH_MAP_MIN_PRESETS);
+для остальных пресетов Canny считается по общему размытию.
+"""
+
+import cv2
+import numpy as np
+
+BOUNDARY_TOLERANCE = 2
+
+# Минимум нижних порогов на пару (blur_size, threshold2), с которого
+# строится карта силы границ. Построение стоит 120-300 мс, поиск
+# экономит 3.5-12.5 мс на пороге относительно cv2.Canny: по
+# benchmarks/threshold_lookup.py (lego.png, farm.png, 1.png) карта
+# окупается после 24-36 порогов
+STRENGTH_MAP_MIN_PRESETS = 32
+
+METRICS = ('iou', 'boundary_f', 'area_error')
+
+# Подсчет единиц: np.bitwise_count есть начиная с NumPy 2.0
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount(bits):
+    """Число единичных битов в массиве uint8"""
+    if hasattr(np, 'bitwise_count'):
+        return int(np.bitwise_count(bits).sum(dtype=np.int64))
+    return int(_POPCOUNT_TABLE[bits].sum(dtype=np.int64))
+
+
+def pack_mask(mask):
+    """Маска (любое ненулевое значение - объект) по биту на пиксель"""
+    return np.packbits(mask > 0, axis=None)
+
+
+def inner_boundary(mask):
+    """Пиксели объекта, у которых есть сосед фона (8-связность)"""
+    return cv2.subtract(mask, cv2.erode(mask, np.ones((3, 3), np.uint8)))
+
+
+def _tolerance_kernel(tolerance):
+    size = 2 * tolerance + 1
+    return cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (size, size))
+
+
+class GroundTruth:
+    """
+    Эталонная маска, подготовленная для сравнения со многими масками
+
+    Атрибуты:
+    - mask: эталон uint8 0/255
+    - bits: эталон по биту на пиксель
+    - area: площадь эталона в пикселях
+    - bbox: ограничивающий прямоугольник (x, y, w, h)
+    """
+
+    def __init__(self, mask, tolerance=BOUNDARY_TOLERANCE):
+        """
+        Параметры:
+        - mask: эталонная маска (любое ненулевое значение - объект)
+        - tolerance: допуск F-меры по границе в пикселях
+        """
+        self.mask = np.where(mask > 0, 255, 0).astype(np.uint8)
+        self.bits = pack_mask(self.mask)
+        self.area = popcount(self.bits)
+        self.bbox = cv2.boundingRect(self.mask)
+        self.tolerance = tolerance
+        self.kernel = _tolerance_kernel(tolerance)
+        self._boundary = None
+        self._near_boundary = None
+
+    @property
+    def shape(self):
+        return self.mask.shape
+
+    def boundary(self):
+        """Граница эталона и ее окрестность радиуса tolerance (считаются один раз)"""
+        if self._boundary is None:
+            self._boundary = inner_boundary(self.mask)
+            self._near_boundary = cv2.dilate(self._boundary, self.kernel)
+        return self._boundary, self._near_boundary
+
+
+def _union_window(a, b, margin, shape):
+    """Объединение прямоугольников (x, y, w, h) с запасом: срезы (y0, y1, x0, x1)"""
+    boxes = [box for box in (a, b) if box[2] and box[3]]
+    if not boxes:
+        return None
+    h, w = shape[:2]
+    x0 = max(0, min(box[0] for box in boxes) - margin)
+    y0 = max(0, min(box[1] for box in boxes) - margin)
+    x1 = min(w, max(box[0] + box[2] for box in boxes) + margin)
+    y1 = min(h, max(box[1] + box[3] for box in boxes) + margin)
+    return y0, y1, x0, x1
+
+
+def boundary_f(mask, truth):
+    """
+    F-мера по границе с допуском truth.tolerance
+
+    Возвращает:
+    - (precision, recall, f); для двух пустых масок - (1, 1, 1)
+    """
+    window = _union_window(cv2.boundingRect(mask), truth.bbox, truth.tolerance + 1, mask.shape)
+    if window is None:
+        return 1.0, 1.0, 1.0
+    y0, y1, x0, x1 = window
+
+    truth_boundary, truth_near = truth.boundary()
+    truth_boundary = truth_boundary[y0:y1, x0:x1]
+    truth_near = truth_near[y0:y1, x0:x1]
+    boundary = inner_boundary(mask[y0:y1, x0:x1])
+    near = cv2.dilate(boundary, truth.kernel)
+
+    found = cv2.countNonZero(boundary)
+    expected = cv2.countNonZero(truth_boundary)
+    precision = cv2.countNonZero(cv2.bitwise_and(boundary, truth_near)) / found if found else 0.0
+    recall = cv2.countNonZero(cv2.bitwise_and(truth_boundary, near)) / expected if expected else 0.0
+    f = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return precision, recall, f
+
+
+def evaluate_mask(mask, truth):
+    """
+    Метрики маски относительно эталона
+
+    Параметры:
+    - mask: маска uint8 0/255 того же размера, что и эталон
+    - truth: GroundTruth
+
+    Возвращает:
+    - словарь: iou, boundary_f, boundary_precision, boundary_recall,
+      area_error (|S - S_эталона| / S_эталона), empty (маска пуста)
+    """
+    if mask.shape[:2] != truth.shape[:2]:
+        raise ValueError(f"размер маски {mask.shape[:2]} не совпадает с эталоном {truth.shape[:2]}")
+
+    bits = pack_mask(mask)
+    area = popcount(bits)
+    intersection = popcount(np.bitwise_and(bits, truth.bits))
+    union = area + truth.area - intersection
+
+    precision, recall, f = boundary_f(mask, truth)
+    if truth.area:
+        area_error = abs(area - truth.area) / truth.area
+    else:
+        area_error = float(area > 0)
+
+    return {
+        'iou': intersection / union if union else 1.0,
+        'boundary_f': f,
+        'boundary_precision': precision,
+        'boundary_recall': recall,
+        'area_error': area_error,
+        'empty': area == 0,
+    }
+
+
+def evaluate_presets(image, truth, detectors):
+    """
+    Запускает все детекторы на одном изображении и оценивает их маски
+
+    Общие стадии переиспользуются: размытие для детекторов с одинаковым
+    blur_size, карта силы границ (и градиент после подавления
+    немаксимумов) - для групп с одинаковыми blur_size и threshold2,
+    в которых не меньше STRENGTH_MAP_MIN_PRESETS нижних порогов.
+
+    Параметры:
+    - image: изображение (RGB)
+    - truth: GroundTruth того же размера
+    - detectors: список CannyEdgeDetector
+
+    Возвращает:
+    - список словарей evaluate_mask в порядке detectors
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    results = [None] * len(detectors)
+
+    by_blur = {}
+    for index, detector in enumerate(detectors):
+        by_blur.setdefault(detector.blur_size, []).append(index)
+
+    for indices in by_blur.values():
+        blurred = detectors[indices[0]].blurred_gray(image, gray)
+
+        by_threshold2 = {}
+        for index in indices:
+            by_threshold2.setdefault(detectors[index].threshold2, []).append(index)
+
+        strength = None
+        for group in by_threshold2.values():
+            # Карта окупается только при большом числе нижних порогов,
+            # иначе cv2.Canny по общему размытию быстрее
+            lookups = [i for i in group if detectors[i].threshold1 <= detectors[i].threshold2]
+            if len(lookups) >= STRENGTH_MAP_MIN_PRESETS:
+                strength = detectors[lookups[0]].strength_map(image, blurred, previous=strength)
+                group_strength = strength
+            else:
+                group_strength = None
+
+            for index in group:
+                detector = detectors[index]
+                edges = detector.canny_edges(image, blurred, group_strength)
+                _, mask = detector.fill_edges(edges)
+                results[index] = evaluate_mask(mask, truth)
+
+    return results
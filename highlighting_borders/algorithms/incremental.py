@@ -0,0 +1,465 @@
+"""
+Инкрементальный пересчет маски при изменении аннотаций
+
+Карта Canny от аннотаций не зависит и считается один раз на набор
+параметров. Маска областей и маска усиления вдоль линий keep хранятся
+как отдельные слои и обновляются только в грязном прямоугольнике,
+морфология пересчитывается по затронутым тайлам (с запасом MORPH_HALO),
+а контуры - только там, где изменились границы. Области со своими
+параметрами пересчитываются на обрезках общего изображения в оттенках
+серого, и их изменение тоже затрагивает лишь их прямоугольники.
+При движении только нижнего порога Canny заменяется поиском по карте
+силы границ (algorithms.strength).
+"""
+
+import cv2
+import numpy as np
+
+from .canny import CannyEdgeDetector
+from .overrides import apply_overrides
+
+
+def _union(a, b):
+    """Объединение прямоугольников (x0, y0, x1, y1), None - пустой"""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
+
+
+def _expand(rect, margin, shape):
+    """Расширяет прямоугольник на margin пикселей с обрезкой по изображению"""
+    x0, y0, x1, y1 = rect
+    h, w = shape[:2]
+    return max(0, x0 - margin), max(0, y0 - margin), min(w, x1 + margin), min(h, y1 + margin)
+
+
+def _intersects(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def _points_bbox(points, margin=0):
+    """Ограничивающий прямоугольник набора точек (x0, y0, x1, y1)"""
+    if not points:
+        return None
+    xs = [int(p[0]) for p in points]
+    ys = [int(p[1]) for p in points]
+    return min(xs) - margin, min(ys) - margin, max(xs) + 1 + margin, max(ys) + 1 + margin
+
+
+def _rect_bbox(rect):
+    if rect is None:
+        return None
+    x, y, w, h = rect
+    return x, y, x + w + 1, y + h + 1
+
+
+def _changed_suffix(old, new):
+    """Возвращает элементы old и new после их общего префикса"""
+    common = 0
+    for a, b in zip(old, new):
+        if a != b:
+            break
+        common += 1
+    return old[common:], new[common:]
+
+
+def _contour_key(contour):
+    # cv2.findContours возвращает внешние контуры в порядке,
+    # обратном растровому порядку их первой точки
+    return int(contour[0, 0, 1]), int(contour[0, 0, 0])
+
+
+class IncrementalEdgeDetector:
+    """
+    Детектор, пересчитывающий только области, затронутые изменением аннотаций
+
+    Результат update() совпадает с CannyEdgeDetector.detect_edges
+    для тех же параметров и аннотаций.
+    """
+
+    TILE_SIZE = 256
+
+    def __init__(self, image, detector, low_memory=False, blurred=None):
+        """
+        Параметры:
+        - image: входное изображение (RGB)
+        - detector: CannyEdgeDetector с текущими параметрами
+        - low_memory: не хранить полноразмерную визуализацию границ
+          (update() вернет None вместо нее, границы доступны в self.edges)
+          и размытое изображение между вызовами
+        - blurred: готовый detector.blurred_gray(image), если он уже посчитан
+        """
+        self.image = image
+        self.low_memory = low_memory
+        self.blurred = blurred
+        self.detector = None
+        self.shape = image.shape[:2]
+
+        self.rect = None
+        self.freeform_polygons = []
+        self.region_mode = "include"
+        self.keep_lines = []
+        self.overrides = []
+
+        # Слои полного размера (слои аннотаций создаются при первом использовании)
+        self.canny = None
+        self.base_canny = None
+        self.strength = None
+        self.gray = None
+        self.region_layer = None
+        self.enhance_mask = None
+        self.edges = None
+        self.overlay = None
+        self.contours = []
+        self.selected = []
+
+        self._full = True
+        self._dirty = []
+        self._build_strength = False
+
+        self.set_detector(detector)
+
+    def set_detector(self, detector):
+        """Меняет параметры детектора; при их изменении нужен полный пересчет"""
+        if detector == self.detector:
+            return
+        if self.detector is not None and self.detector.blur_size != detector.blur_size:
+            self.blurred = None
+            self.strength = None
+        # Если меняется только нижний порог (движение слайдера), строится карта
+        # силы границ, и следующие изменения threshold1 обходятся без Canny
+        self._build_strength = (
+            not self.low_memory
+            and self.detector is not None
+            and self.detector.replace(threshold1=detector.threshold1) == detector
+            and detector.threshold1 <= detector.threshold2
+        )
+        self.detector = detector
+        self.canny = None
+        self._full = True
+
+    def set_regions(self, rect, freeform_polygons, region_mode):
+        """
+        Обновляет области обработки и помечает изменившуюся часть как грязную
+
+        Параметры:
+        - rect: прямоугольник (x, y, w, h) или None
+        - freeform_polygons: список полигонов
+        - region_mode: "include" или "exclude"
+        """
+        polygons = [list(map(tuple, p)) for p in freeform_polygons]
+        had_regions = self._has_regions()
+
+        dirty = None
+        if rect != self.rect:
+            dirty = _union(_rect_bbox(self.rect), _rect_bbox(rect))
+        old_tail, new_tail = _changed_suffix(self.freeform_polygons, polygons)
+        for polygon in old_tail + new_tail:
+            if len(polygon) > 2:
+                dirty = _union(dirty, _points_bbox(polygon))
+
+        self.rect = rect
+        self.freeform_polygons = polygons
+
+        if region_mode != self.region_mode:
+            self.region_mode = region_mode
+            self._full = True
+        elif had_regions != self._has_regions() and region_mode == "include":
+            # Появление/исчезновение первой области в режиме include
+            # меняет обработку всего изображения
+            self._full = True
+
+        if dirty is not None:
+            dirty = _expand(dirty, 1, self.shape)
+            self._render_regions(dirty)
+            self._mark_dirty(dirty)
+
+    def set_overrides(self, overrides):
+        """
+        Обновляет области со своими параметрами детектора
+
+        Параметры:
+        - overrides: список RegionOverride
+        """
+        overrides = list(overrides)
+        old_tail, new_tail = _changed_suffix(self.overrides, overrides)
+        self.overrides = overrides
+        if self.canny is None:
+            return
+
+        dirty = None
+        for override in old_tail + new_tail:
+            dirty = _union(dirty, override.bbox(self.shape))
+        if dirty is None:
+            return
+
+        # Основная карта Canny сохраняется при появлении первой области,
+        # чтобы восстанавливать ее под удаленными областями
+        if self.base_canny is None:
+            self.base_canny = self.canny.copy()
+
+        x0, y0, x1, y1 = dirty
+        self.canny[y0:y1, x0:x1] = self.base_canny[y0:y1, x0:x1]
+        apply_overrides(self.canny, self._gray(), self.overrides, dirty)
+        if not self.overrides:
+            self.base_canny = None
+        self._mark_dirty(dirty)
+
+    def set_keep_lines(self, keep_lines):
+        """Обновляет линии keep и помечает изменившуюся часть как грязную"""
+        lines = [list(map(tuple, line)) for line in keep_lines]
+        old_tail, new_tail = _changed_suffix(self.keep_lines, lines)
+        self.keep_lines = lines
+
+        dirty = None
+        for line in old_tail + new_tail:
+            if len(line) >= 2:
+                dirty = _union(dirty, _points_bbox(line, CannyEdgeDetector.KEEP_LINE_HALO))
+
+        if dirty is not None:
+            dirty = _expand(dirty, 0, self.shape)
+            self._render_enhance(dirty)
+            self._mark_dirty(dirty)
+
+    def update(self):
+        """
+        Пересчитывает результат с учетом накопленных изменений
+
+        Возвращает:
+        - image_with_edges: изображение с нарисованными границами
+          (None в режиме low_memory)
+        - mask: бинарная маска объекта
+        """
+        if self.canny is None:
+            # Размытие зависит только от blur_size и переживает смену порогов
+            blurred = self.blurred
+            if blurred is None:
+                blurred = self.detector.blurred_gray(self.image, self.gray)
+            if self._build_strength and (self.strength is None or not self.strength.supports(self.detector)):
+                self.strength = self.detector.strength_map(self.image, blurred, previous=self.strength)
+            self.canny = self.detector.canny_edges(self.image, blurred, self.strength)
+            self.blurred = None if self.low_memory else blurred
+
+            self.base_canny = None
+            if self.overrides:
+                self.base_canny = self.canny.copy()
+                apply_overrides(self.canny, self._gray(), self.overrides)
+
+        if self._full or self.edges is None:
+            self._recompute_all()
+        else:
+            for rect in self._dirty_tiles():
+                self._recompute_tile(rect)
+            for rect in self._dirty:
+                self._update_contours(_expand(rect, CannyEdgeDetector.MORPH_HALO, self.shape))
+
+        self._full = False
+        self._dirty = []
+
+        # Выбранные контуры остаются доступны, чтобы не искать их заново по маске
+        mask = np.zeros(self.shape, dtype=np.uint8)
+        self.selected = self.detector.select_contours(self.contours, self.shape, self.keep_lines)
+        if self.selected:
+            cv2.drawContours(mask, self.selected, -1, 255, -1)
+
+        return self.overlay, mask
+
+    def nbytes(self):
+        """Память, занятая слоями детектора (без исходного изображения)"""
+        layers = (self.blurred, self.canny, self.base_canny, self.strength, self.gray, self.region_layer,
+                  self.enhance_mask, self.edges, self.overlay)
+        return sum(layer.nbytes for layer in layers if layer is not None)
+
+    def _gray(self):
+        """Изображение в оттенках серого - общее для всех областей со своими параметрами"""
+        if self.gray is None:
+            self.gray = cv2.cvtColor(self.image, cv2.COLOR_RGB2GRAY)
+        return self.gray
+
+    def _has_regions(self):
+        return bool(self.rect) or any(len(p) > 2 for p in self.freeform_polygons)
+
+    def _mark_dirty(self, rect):
+        if not self._full:
+            self._dirty.append(rect)
+
+    def _render_regions(self, rect):
+        """Перерисовывает слой областей внутри прямоугольника"""
+        if self.region_layer is None:
+            self.region_layer = np.zeros(self.shape, dtype=np.uint8)
+
+        x0, y0, x1, y1 = rect
+        crop = self.region_layer[y0:y1, x0:x1]
+        crop[:] = 0
+
+        if self.rect:
+            x, y, w, h = self.rect
+            cv2.rectangle(crop, (x - x0, y - y0), (x + w - x0, y + h - y0), 255, -1)
+
+        # Как и для линий, полигон заливается на собственном холсте,
+        # чтобы отсечение не меняло растеризацию
+        for polygon in self.freeform_polygons:
+            if len(polygon) < 3:
+                continue
+            bbox = _expand(_points_bbox(polygon), 1, self.shape)
+            if not _intersects(bbox, rect):
+                continue
+            bx0, by0, bx1, by1 = bbox
+            canvas = np.zeros((by1 - by0, bx1 - bx0), dtype=np.uint8)
+            pts = np.array(polygon, dtype=np.int32)
+            cv2.fillPoly(canvas, [pts], 255, offset=(-bx0, -by0))
+            self._paste_max(crop, rect, canvas, bbox)
+
+    def _render_enhance(self, rect):
+        """Перерисовывает слой усиления вдоль линий keep внутри прямоугольника"""
+        halo = CannyEdgeDetector.KEEP_LINE_HALO
+        x0, y0, x1, y1 = window = _expand(rect, halo, self.shape)
+        enhance = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+
+        for line in self.keep_lines:
+            if len(line) < 2:
+                continue
+            points = self.detector.line_points(line, self.shape)
+            for p1, p2 in zip(points, points[1:]):
+                self._draw_segment(enhance, window, p1, p2)
+
+        # Расширяем в окне с запасом, чтобы дилатация у краев была точной
+        enhance = cv2.dilate(enhance, np.ones((7, 7), np.uint8), iterations=1)
+
+        if self.enhance_mask is None:
+            self.enhance_mask = np.zeros(self.shape, dtype=np.uint8)
+
+        rx0, ry0, rx1, ry1 = rect
+        self.enhance_mask[ry0:ry1, rx0:rx1] = enhance[ry0 - y0:ry1 - y0, rx0 - x0:rx1 - x0]
+
+    def _draw_segment(self, target, window, p1, p2):
+        """
+        Рисует отрезок толщиной 5 px в окне target
+
+        Толстые линии OpenCV при отсечении краем холста растеризуются
+        иначе, чем без отсечения, поэтому отрезок рисуется на собственном
+        холсте (отсекаемом только краями изображения, как при полном расчете)
+        и затем переносится в окно.
+        """
+        bbox = _expand(_points_bbox([p1, p2]), 4, self.shape)
+        if not _intersects(bbox, window):
+            return
+
+        bx0, by0, bx1, by1 = bbox
+        canvas = np.zeros((by1 - by0, bx1 - bx0), dtype=np.uint8)
+        cv2.line(canvas, (p1[0] - bx0, p1[1] - by0), (p2[0] - bx0, p2[1] - by0), 255, 5)
+
+        self._paste_max(target, window, canvas, bbox)
+
+    @staticmethod
+    def _paste_max(target, window, canvas, bbox):
+        """Объединяет (максимумом) холст с окном target по пересечению прямоугольников"""
+        x0, y0, x1, y1 = window
+        bx0, by0, bx1, by1 = bbox
+        ix0, iy0 = max(x0, bx0), max(y0, by0)
+        ix1, iy1 = min(x1, bx1), min(y1, by1)
+        if ix0 >= ix1 or iy0 >= iy1:
+            return
+        dst = target[iy0 - y0:iy1 - y0, ix0 - x0:ix1 - x0]
+        np.maximum(dst, canvas[iy0 - by0:iy1 - by0, ix0 - bx0:ix1 - bx0], out=dst)
+
+    def _input_edges(self, rect):
+        """Границы Canny с учетом областей и линий keep внутри прямоугольника"""
+        x0, y0, x1, y1 = rect
+        edges = self.canny[y0:y1, x0:x1]
+
+        if self._has_regions():
+            region = self.region_layer[y0:y1, x0:x1]
+            if self.region_mode == "exclude":
+                region = cv2.bitwise_not(region)
+            edges = cv2.bitwise_and(edges, region)
+
+        if self.keep_lines and self.enhance_mask is not None:
+            edges = cv2.bitwise_or(edges, self.enhance_mask[y0:y1, x0:x1])
+
+        return edges
+
+    def _recompute_all(self):
+        h, w = self.shape
+        if self.keep_lines:
+            self._render_enhance((0, 0, w, h))
+        if self._has_regions():
+            self._render_regions((0, 0, w, h))
+
+        self.edges = self.detector.close_edges(self._input_edges((0, 0, w, h)))
+        contours, _ = cv2.findContours(self.edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        self.contours = list(contours)
+
+        if not self.low_memory:
+            self.overlay = self.image.copy()
+            self.overlay[self.edges > 0] = [0, 255, 0]
+
+    def _dirty_tiles(self):
+        """Прямоугольники тайлов, затронутых грязными областями с учетом морфологии"""
+        tile = self.TILE_SIZE
+        h, w = self.shape
+        tiles = set()
+        for rect in self._dirty:
+            x0, y0, x1, y1 = _expand(rect, CannyEdgeDetector.MORPH_HALO, self.shape)
+            for ty in range(y0 // tile, (y1 - 1) // tile + 1):
+                for tx in range(x0 // tile, (x1 - 1) // tile + 1):
+                    tiles.add((tx, ty))
+
+        return [
+            (tx * tile, ty * tile, min(w, (tx + 1) * tile), min(h, (ty + 1) * tile))
+            for tx, ty in sorted(tiles)
+        ]
+
+    def _recompute_tile(self, rect):
+        """Пересчитывает морфологию и визуализацию внутри тайла"""
+        halo = CannyEdgeDetector.MORPH_HALO
+        x0, y0, x1, y1 = _expand(rect, halo, self.shape)
+        closed = self.detector.close_edges(self._input_edges((x0, y0, x1, y1)))
+
+        rx0, ry0, rx1, ry1 = rect
+        tile_edges = closed[ry0 - y0:ry1 - y0, rx0 - x0:rx1 - x0]
+        self.edges[ry0:ry1, rx0:rx1] = tile_edges
+
+        if self.low_memory:
+            return
+
+        overlay = self.overlay[ry0:ry1, rx0:rx1]
+        overlay[:] = self.image[ry0:ry1, rx0:rx1]
+        overlay[tile_edges > 0] = [0, 255, 0]
+
+    def _update_contours(self, rect):
+        """
+        Перестраивает внешние контуры, которые могли измениться внутри rect
+
+        Область расширяется, пока в нее не войдут все старые контуры,
+        касающиеся ее границы, - после этого поиск контуров на обрезке
+        дает тот же результат, что и на всем изображении.
+        """
+        area = rect
+        absorbed = [False] * len(self.contours)
+        boxes = [None] * len(self.contours)
+
+        changed = True
+        while changed:
+            changed = False
+            probe = _expand(area, 1, self.shape)
+            for i, contour in enumerate(self.contours):
+                if absorbed[i]:
+                    continue
+                if boxes[i] is None:
+                    x, y, w, h = cv2.boundingRect(contour)
+                    boxes[i] = (x, y, x + w, y + h)
+                if _intersects(boxes[i], probe):
+                    absorbed[i] = True
+                    area = _union(area, boxes[i])
+                    changed = True
+
+        x0, y0, x1, y1 = area
+        crop = np.ascontiguousarray(self.edges[y0:y1, x0:x1])
+        found, _ = cv2.findContours(crop, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE,
+                                    offset=(x0, y0))
+
+        kept = [c for c, gone in zip(self.contours, absorbed) if not gone]
+        self.contours = sorted(kept + list(found), key=_contour_key, reverse=True)
@@ -0,0 +1,213 @@
+"""
+Постоянная очередь заданий на SQLite
+
+Задание - файл изображения с его размером и временем изменения.
+Повторная постановка того же файла без изменений ничего не делает,
+измененный файл снова становится ожидающим. Очередь переживает
+перезапуск: выполненные задания не повторяются, а прерванные
+(running) при открытии возвращаются в ожидание.
+"""
+
+import sqlite3
+import threading
+import time
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    output TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, enqueued_at);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at);
+"""
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class Job:
+    """Взятое в работу задание"""
+
+    def __init__(self, path, mtime_ns, size, attempts):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.attempts = attempts
+
+    def __repr__(self):
+        return f"Job({self.path!r}, attempts={self.attempts})"
+
+
+class JobQueue:
+    """
+    Очередь заданий в файле SQLite
+
+    Каждый поток работает через собственное соединение, поэтому
+    очередью могут одновременно пользоваться сканер и рабочие потоки
+    (и несколько процессов: база открывается в режиме WAL).
+    """
+
+    def __init__(self, path, max_attempts=3):
+        """
+        Параметры:
+        - path: файл базы данных
+        - max_attempts: после стольких неудач задание остается в состоянии failed
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        # Задания, прерванные остановкой процесса, выполняются заново
+        with conn:
+            conn.execute("UPDATE jobs SET status = ?, started_at = NULL WHERE status = ?", (PENDING, RUNNING))
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Закрывает соединение текущего потока"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def enqueue(self, path, mtime_ns, size):
+        """
+        Ставит файл в очередь, если он новый или изменился
+
+        Возвращает:
+        - True, если задание добавлено или обновлено
+        """
+        cursor = self._conn().execute(
+            """
+            INSERT INTO jobs (path, mtime_ns, size, status, enqueued_at) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (path) DO UPDATE SET
+                mtime_ns = excluded.mtime_ns, size = excluded.size, status = excluded.status,
+                attempts = 0, enqueued_at = excluded.enqueued_at,
+                started_at = NULL, finished_at = NULL, output = NULL, error = NULL
+            WHERE jobs.mtime_ns != excluded.mtime_ns OR jobs.size != excluded.size
+            """,
+            (path, mtime_ns, size, PENDING, time.time())
+        )
+        return cursor.rowcount > 0
+
+    def known(self):
+        """Словарь путь -> (mtime_ns, size) всех заданий (для сканера после перезапуска)"""
+        rows = self._conn().execute("SELECT path, mtime_ns, size FROM jobs")
+        return {path: (mtime_ns, size) for path, mtime_ns, size in rows}
+
+    def claim(self):
+        """
+        Берет в работу самое старое ожидающее задание
+
+        Возвращает:
+        - Job или None, если очередь пуста
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT path, mtime_ns, size, attempts FROM jobs WHERE status = ? "
+                "ORDER BY enqueued_at LIMIT 1",
+                (PENDING,)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1 WHERE path = ?",
+                    (RUNNING, time.time(), row[0])
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        if row is None:
+            return None
+        path, mtime_ns, size, attempts = row
+        return Job(path, mtime_ns, size, attempts + 1)
+
+    def finish(self, job, output=None):
+        """Отмечает задание выполненным (если файл не изменился за время работы)"""
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, output = ?, error = NULL "
+            "WHERE path = ? AND mtime_ns = ? AND status = ?",
+            (DONE, time.time(), output, job.path, job.mtime_ns, RUNNING)
+        )
+
+    def fail(self, job, error):
+        """Отмечает неудачу; задание повторяется, пока не исчерпаны попытки"""
+        status = FAILED if job.attempts >= self.max_attempts else PENDING
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, error = ? "
+            "WHERE path = ? AND mtime_ns = ? AND status = ?",
+            (status, time.time(), str(error), job.path, job.mtime_ns, RUNNING)
+        )
+
+    def stats(self, window=300.0):
+        """
+        Статистика очереди
+
+        Параметры:
+        - window: интервал в секундах для пропускной способности и задержек
+
+        Возвращает:
+        - словарь: counts (по состояниям), depth (ожидающие), throughput
+          (заданий в минуту за window), latency (среднее, p50, p95, max
+          от постановки до завершения, с), service (среднее время обработки, с)
+        """
+        conn = self._conn()
+        counts = {status: 0 for status in (PENDING, RUNNING, DONE, FAILED)}
+        for status, count in conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+            counts[status] = count
+
+        since = time.time() - window
+        rows = conn.execute(
+            "SELECT finished_at - enqueued_at, finished_at - started_at FROM jobs "
+            "WHERE status = ? AND finished_at >= ? ORDER BY finished_at",
+            (DONE, since)
+        ).fetchall()
+        latencies = sorted(row[0] for row in rows)
+        services = [row[1] for row in rows if row[1] is not None]
+
+        def percentile(q):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+        return {
+            'counts': counts,
+            'depth': counts[PENDING],
+            'throughput': len(rows) * 60.0 / window,
+            'latency': {
+                'mean': sum(latencies) / len(latencies) if latencies else None,
+                'p50': percentile(0.5),
+                'p95': percentile(0.95),
+                'max': latencies[-1] if latencies else None,
+            },
+            'service': sum(services) / len(services) if services else None,
+        }
+
+    def failures(self, limit=10):
+        """Последние окончательно неудачные задания: список (путь, ошибка)"""
+        return self._conn().execute(
+            "SELECT path, error FROM jobs WHERE status = ? ORDER BY finished_at DESC LIMIT ?",
+            (FAILED, limit)
+        ).fetchall()
@@ -0,0 +1,61 @@
+"""
+Отложенный импорт тяжелых модулей (OpenCV, NumPy, PyQt5)
+"""
+
+import importlib
+import types
+
+
+class LazyModule(types.ModuleType):
+    """
+    Модуль-заглушка, который импортирует настоящий модуль
+    при первом обращении к любому его атрибуту
+    """
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__['_lazy_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__['_lazy_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_import(name):
+    """
+    Возвращает модуль, который будет загружен при первом использовании
+
+    Параметры:
+    - name: полное имя модуля
+
+    Возвращает:
+    - module: LazyModule или уже загруженный модуль
+    """
+    import sys
+
+    if name in sys.modules:
+        return sys.modules[name]
+    return LazyModule(name)
+
+
+def is_loaded(module):
+    """Проверяет, был ли отложенный модуль уже загружен"""
+    if isinstance(module, LazyModule):
+        return module.__dict__['_lazy_module'] is not None
+    return True
+
+
+def preload(*modules):
+    """Принудительно загружает переданные отложенные модули"""
+    for module in modules:
+        if isinstance(module, LazyModule):
+            module._load()
@@ -0,0 +1,190 @@
+"""
+Привязка линий keep к границам объекта ("умные ножницы", livewire)
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+
+class LiveWire:
+    """
+    Поиск пути наибольшего градиента между опорной точкой и курсором
+
+    Используется cv2.segmentation.IntelligentScissorsMB. Карта стоимостей
+    (градиенты и границы, applyImage) строится для окна изображения и
+    кешируется, поэтому новые опорные точки и повторные штрихи в той же
+    области ее не пересчитывают. Карта путей строится на опорную точку
+    (около 200 мс для окна 768x768), а обновление пути при движении
+    курсора занимает доли миллисекунды. Работа в окне ограничивает
+    стоимость на больших изображениях.
+
+    Опорные точки ставятся в фоновом потоке (start, advance_anchor): пока
+    карта строится, путь продолжает считаться от прежней опорной точки,
+    а poll() подменяет карту, когда она готова. Карта путей принадлежит
+    экземпляру инструмента, а фоновое построение не должно трогать
+    активную карту, поэтому на окно держится не больше TOOLS_PER_WINDOW
+    инструментов: активный и запасной. Свободные лежат в кеше окна
+    и переиспользуются, так что applyImage выполняется для окна не
+    больше TOOLS_PER_WINDOW раз, сколько бы опорных точек в нем ни было.
+    """
+
+    WINDOW_SIZE = 768
+    MAX_CACHED_WINDOWS = 8
+    TOOLS_PER_WINDOW = 2
+
+    def __init__(self, image):
+        """
+        Параметры:
+        - image: изображение (RGB)
+        """
+        self.image = image
+        self.windows = OrderedDict()
+        self.anchor = None
+        self.tool = None
+        self.origin = (0, 0)
+        self.pending = None
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def reach(self):
+        """Расстояние от опорной точки, в пределах которого путь не упирается в край окна"""
+        return self.WINDOW_SIZE // 4
+
+    def _window_origin(self, x, y):
+        """Левый верхний угол окна, в центральной части которого лежит точка"""
+        h, w = self.image.shape[:2]
+        step = self.WINDOW_SIZE // 2
+
+        def axis(v, size):
+            if size <= self.WINDOW_SIZE:
+                return 0
+            start = round(v / step) * step - step
+            return min(max(start, 0), size - self.WINDOW_SIZE)
+
+        return axis(x, w), axis(y, h)
+
+    def _take_tool(self, origin):
+        """
+        Забирает из кеша инструмент с картой стоимостей окна или строит новый
+
+        Взятый инструмент принадлежит вызывающему, пока не возвращен
+        в кеш через _return_tool.
+        """
+        with self._lock:
+            tools = self.windows.get(origin)
+            if tools:
+                return tools.pop()
+
+        x0, y0 = origin
+        crop = self.image[y0:y0 + self.WINDOW_SIZE, x0:x0 + self.WINDOW_SIZE]
+
+        tool = cv2.segmentation.IntelligentScissorsMB()
+        tool.setEdgeFeatureCannyParameters(32, 100)
+        tool.setGradientMagnitudeMaxLimit(200)
+        tool.applyImage(crop)
+        return tool
+
+    def _return_tool(self, origin, tool):
+        """Возвращает инструмент в кеш окон"""
+        with self._lock:
+            tools = self.windows.setdefault(origin, [])
+            if len(tools) < self.TOOLS_PER_WINDOW:
+                tools.append(tool)
+            self.windows.move_to_end(origin)
+            if len(self.windows) > self.MAX_CACHED_WINDOWS:
+                self.windows.popitem(last=False)
+
+    def _build(self, x, y):
+        """Строит карту путей от (x, y): (origin, anchor, tool)"""
+        origin = self._window_origin(x, y)
+        tool = self._take_tool(origin)
+        x0, y0 = origin
+        tool.buildMap((x - x0, y - y0))
+        return origin, (x, y), tool
+
+    def _activate(self, built):
+        self._deactivate()
+        self.origin, self.anchor, self.tool = built
+
+    def _deactivate(self):
+        """Возвращает активный инструмент в кеш; пути до нового построения нет"""
+        if self.tool is not None:
+            self._return_tool(self.origin, self.tool)
+        self.anchor = None
+        self.tool = None
+
+    def set_anchor(self, x, y):
+        """Устанавливает опорную точку и строит карту путей от нее (синхронно)"""
+        self.cancel_pending()
+        self._activate(self._build(int(x), int(y)))
+
+    def start(self, x, y):
+        """
+        Начинает новый штрих от (x, y), строя карту путей в фоне
+
+        До poll(), вернувшего True, опорной точки нет и path_to возвращает [].
+        """
+        self.cancel_pending()
+        self._deactivate()
+        self.advance_anchor(x, y)
+
+    def advance_anchor(self, x, y):
+        """
+        Начинает строить в фоне карту путей от новой опорной точки
+
+        Текущая карта остается активной до poll(), вернувшего True.
+
+        Возвращает:
+        - False, если предыдущее фоновое построение еще не закончено
+        """
+        if self.pending is not None:
+            return False
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='livewire')
+        self.pending = self._executor.submit(self._build, int(x), int(y))
+        return True
+
+    def poll(self):
+        """Делает активной карту, построенную в фоне; True, если опорная точка сменилась"""
+        if self.pending is None or not self.pending.done():
+            return False
+        future, self.pending = self.pending, None
+        self._activate(future.result())
+        return True
+
+    def cancel_pending(self):
+        """Отменяет фоновое построение; уже начатое доделывается, а инструмент возвращается в кеш"""
+        if self.pending is None:
+            return
+        future, self.pending = self.pending, None
+        if not future.cancel():
+            future.add_done_callback(self._discard)
+
+    def _discard(self, future):
+        if future.exception() is None:
+            origin, _, tool = future.result()
+            self._return_tool(origin, tool)
+
+    def path_to(self, x, y):
+        """
+        Оптимальный путь от опорной точки до (x, y)
+
+        Точка за пределами окна прижимается к его краю.
+
+        Возвращает:
+        - path: список точек (x, y) в координатах изображения, начиная с опорной
+        """
+        if self.tool is None:
+            return []
+
+        x0, y0 = self.origin
+        h, w = self.image.shape[:2]
+        local_x = min(max(int(x), x0), min(w, x0 + self.WINDOW_SIZE) - 1) - x0
+        local_y = min(max(int(y), y0), min(h, y0 + self.WINDOW_SIZE) - 1) - y0
+
+        contour = self.tool.getContour((local_x, local_y))
+        return [(int(px) + x0, int(py) + y0) for px, py in contour.reshape(-1, 2)]
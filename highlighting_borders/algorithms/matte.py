@@ -0,0 +1,36 @@
+"""
+Мягкая альфа-маска (матирование) для экспорта без фона
+
+Жесткая маска 0/255 дает "лесенку" на краях вырезанного объекта.
+Полупрозрачность вычисляется guided filter только в узкой полосе вдоль
+контура, а внутренность и фон копируются из маски как есть, поэтому
+стоимость растет с длиной контура, а не с площадью изображения.
+"""
+
+import numpy as np
+
+from .band import boundary_band_tiles, guided_filter_band
+
+
+def soft_alpha(image, mask, band_width=4, radius=4, eps=1e-3):
+    """
+    Строит альфа-канал с плавным переходом на границе объекта
+
+    Параметры:
+    - image: исходное изображение (RGB) - направляющее для фильтра
+    - mask: бинарная маска объекта (0/255)
+    - band_width: полуширина полосы, в которой альфа делается мягкой
+    - radius, eps: параметры guided filter
+
+    Возвращает:
+    - alpha: альфа-канал uint8 (0..255)
+    """
+    alpha = mask.copy()
+    band, tiles = boundary_band_tiles(mask, band_width)
+
+    for x0, y0, x1, y1, q, band_tile in guided_filter_band(image, mask, band, radius, eps, tiles=tiles):
+        inside = band_tile > 0
+        tile = alpha[y0:y1, x0:x1]
+        tile[inside] = np.clip(q[inside] * 255 + 0.5, 0, 255).astype(np.uint8)
+
+    return alpha
@@ -0,0 +1,95 @@
+"""
+Учет памяти и компактное хранение масок для режима экономии памяти
+"""
+
+import numpy as np
+
+
+class PackedMask:
+    """
+    Бинарная маска, упакованная по 1 биту на пиксель (в 8 раз меньше uint8)
+    """
+
+    def __init__(self, bits, shape):
+        self.bits = bits
+        self.shape = shape
+
+    @classmethod
+    def from_array(cls, mask):
+        """Упаковывает маску 0/255 (любое ненулевое значение - объект)"""
+        return cls(np.packbits(mask > 0, axis=None), mask.shape[:2])
+
+    def unpack(self):
+        """Возвращает маску uint8 со значениями 0/255"""
+        count = self.shape[0] * self.shape[1]
+        flat = np.unpackbits(self.bits, count=count)
+        flat *= 255
+        return flat.reshape(self.shape)
+
+    def any(self):
+        return bool(np.any(self.bits))
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+
+def unpack_mask(mask):
+    """Возвращает маску как массив uint8 независимо от способа хранения"""
+    if isinstance(mask, PackedMask):
+        return mask.unpack()
+    return mask
+
+
+def buffers_nbytes(*buffers):
+    """
+    Суммарный размер буферов в байтах
+
+    Один и тот же объект (например, представление исходного изображения)
+    учитывается один раз, None пропускается.
+    """
+    seen = set()
+    total = 0
+    for buffer in buffers:
+        if buffer is None or id(buffer) in seen:
+            continue
+        seen.add(id(buffer))
+        total += buffer.nbytes
+    return total
+
+
+def process_memory():
+    """
+    Резидентная память текущего процесса в байтах
+
+    Возвращает:
+    - rss: размер в байтах или None, если определить не удалось
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    try:
+        import resource
+        import sys
+    except ImportError:
+        return None
+
+    # Пиковое значение; на macOS ru_maxrss в байтах, на Linux - в килобайтах
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def format_bytes(size):
+    """Форматирует размер в человекочитаемом виде"""
+    if size is None:
+        return "н/д"
+    for unit in ("Б", "КБ", "МБ"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} ГБ"
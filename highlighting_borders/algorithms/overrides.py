@@ -0,0 +1,105 @@
+"""
+Собственные параметры детектора для отдельных областей
+
+Область (прямоугольник или полигон) может нести свой CannyEdgeDetector.
+Canny для нее считается только на обрезке по ограничивающему
+прямоугольнику (с запасом на размытие) из общего изображения в оттенках
+серого, а результат заменяет основную карту границ внутри области до
+морфологии и выбора контуров.
+"""
+
+import cv2
+import numpy as np
+
+
+class RegionOverride:
+    """
+    Область с собственными параметрами детектора
+
+    Атрибуты:
+    - polygon: список точек (x, y) в координатах изображения
+    - detector: CannyEdgeDetector для этой области
+    """
+
+    def __init__(self, polygon, detector):
+        self.polygon = [(int(x), int(y)) for x, y in polygon]
+        self.detector = detector
+
+    @classmethod
+    def from_rect(cls, rect, detector):
+        """Область из прямоугольника (x, y, w, h)"""
+        x, y, w, h = rect
+        return cls([(x, y), (x + w, y), (x + w, y + h), (x, y + h)], detector)
+
+    def bbox(self, shape):
+        """Ограничивающий прямоугольник (x0, y0, x1, y1), обрезанный по изображению"""
+        xs = [p[0] for p in self.polygon]
+        ys = [p[1] for p in self.polygon]
+        h, w = shape[:2]
+        return max(0, min(xs)), max(0, min(ys)), min(w, max(xs) + 1), min(h, max(ys) + 1)
+
+    def halo(self):
+        """Запас обрезки: радиус размытия, оператор Собеля и подавление немаксимумов"""
+        return self.detector.blur_size // 2 + 2
+
+    def key(self):
+        """Описание для ключа кеша"""
+        return {'polygon': self.polygon, 'params': self.detector.params()}
+
+    def __eq__(self, other):
+        if not isinstance(other, RegionOverride):
+            return NotImplemented
+        return self.polygon == other.polygon and self.detector == other.detector
+
+    def __hash__(self):
+        return hash((tuple(self.polygon), self.detector))
+
+
+def apply_overrides(edges, gray, overrides, window=None):
+    """
+    Заменяет границы внутри областей результатом их собственных параметров
+
+    Параметры:
+    - edges: карта границ Canny основных параметров (изменяется на месте)
+    - gray: изображение в оттенках серого (общее для всех областей)
+    - overrides: список RegionOverride; при пересечении побеждает последняя
+    - window: (x0, y0, x1, y1) - обновить только этот прямоугольник
+
+    Возвращает:
+    - edges
+    """
+    shape = gray.shape[:2]
+    h, w = shape
+
+    for override in overrides:
+        if len(override.polygon) < 3:
+            continue
+        x0, y0, x1, y1 = override.bbox(shape)
+        cx0, cy0, cx1, cy1 = x0, y0, x1, y1
+        if window is not None:
+            cx0, cy0 = max(x0, window[0]), max(y0, window[1])
+            cx1, cy1 = min(x1, window[2]), min(y1, window[3])
+        if cx0 >= cx1 or cy0 >= cy1:
+            continue
+
+        # Canny считается по всей области (с запасом), даже если обновляется
+        # только окно: иначе гистерезис у края окна дал бы другой результат
+        halo = override.halo()
+        ex0, ey0 = max(0, x0 - halo), max(0, y0 - halo)
+        ex1, ey1 = min(w, x1 + halo), min(h, y1 + halo)
+        detector = override.detector
+        blurred = cv2.GaussianBlur(gray[ey0:ey1, ex0:ex1], (detector.blur_size, detector.blur_size), 0)
+        local = cv2.Canny(blurred, detector.threshold1, detector.threshold2)
+
+        inside = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+        pts = np.array(override.polygon, dtype=np.int32)
+        cv2.fillPoly(inside, [pts], 255, offset=(-x0, -y0))
+
+        target = edges[cy0:cy1, cx0:cx1]
+        np.copyto(
+            target,
+            local[cy0 - ey0:cy1 - ey0, cx0 - ex0:cx1 - ex0],
+            where=inside[cy0 - y0:cy1 - y0, cx0 - x0:cx1 - x0] > 0
+        )
+
+    return edges
@@ -0,0 +1,242 @@
+"""
+Предзагрузка соседних изображений папки в фоновых потоках
+"""
+
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from .cache import file_digest
+from .incremental import IncrementalEdgeDetector
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+DEFAULT_MEMORY_BUDGET = 1024 ** 3
+
+# Байт на пиксель у PrefetchedImage: RGB (3) и слои детектора после
+# первого обнаружения (6, в режиме low_memory - 2), замерено на примерах
+PIXEL_BYTES = 9
+LOW_MEMORY_PIXEL_BYTES = 5
+
+# Маркеры SOF в JPEG, после которых идут высота и ширина кадра
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def list_images(folder):
+    """Отсортированный список файлов изображений в папке"""
+    return [
+        os.path.join(folder, name)
+        for name in sorted(os.listdir(folder))
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    ]
+
+
+def read_image_size(path):
+    """
+    Читает размер изображения из заголовка файла, не декодируя его
+
+    Поддерживаются PNG, JPEG и BMP.
+
+    Возвращает:
+    - (ширина, высота) или None, если заголовок не распознан
+    """
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(26)
+            if head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+                return struct.unpack('>II', head[16:24])
+            if head.startswith(b'BM') and len(head) >= 26:
+                width, height = struct.unpack('<ii', head[18:26])
+                return width, abs(height)
+            if head.startswith(b'\xff\xd8'):
+                f.seek(2)
+                while True:
+                    marker = f.read(4)
+                    if len(marker) < 4 or marker[0] != 0xFF:
+                        return None
+                    length = struct.unpack('>H', marker[2:])[0]
+                    if marker[1] in JPEG_SOF_MARKERS:
+                        height, width = struct.unpack('>xHH', f.read(5))
+                        return width, height
+                    f.seek(length - 2, os.SEEK_CUR)
+    except (OSError, struct.error):
+        pass
+    return None
+
+
+def estimate_nbytes(path, low_memory=False):
+    """
+    Оценка памяти PrefetchedImage для файла до его загрузки
+
+    Размер берется из заголовка; если он не распознан - из размера файла
+    (сжатое изображение почти всегда не больше несжатого RGB).
+    """
+    per_pixel = LOW_MEMORY_PIXEL_BYTES if low_memory else PIXEL_BYTES
+    size = read_image_size(path)
+    if size is not None:
+        return size[0] * size[1] * per_pixel
+    try:
+        return os.path.getsize(path) * per_pixel // 3
+    except OSError:
+        return 0
+
+
+class PrefetchedImage:
+    """
+    Декодированное изображение с готовым первым результатом обнаружения
+    """
+
+    def __init__(self, path, image, digest, pipeline):
+        self.path = path
+        self.image = image
+        self.digest = digest
+        self.pipeline = pipeline
+
+    @property
+    def nbytes(self):
+        return self.image.nbytes + self.pipeline.nbytes()
+
+
+def load_prefetched(path, detector, low_memory=False):
+    """
+    Декодирует изображение и выполняет обнаружение без аннотаций
+
+    Вызывается в рабочем потоке: OpenCV отпускает GIL на время тяжелых
+    операций, поэтому потоки действительно работают параллельно.
+
+    Возвращает:
+    - PrefetchedImage или None, если файл не удалось прочитать
+    """
+    image = cv2.imread(path)
+    if image is None:
+        return None
+    cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+
+    blurred = detector.blurred_gray(image)
+    pipeline = IncrementalEdgeDetector(image, detector, low_memory=low_memory, blurred=blurred)
+    pipeline.update()
+
+    return PrefetchedImage(path, image, file_digest(path), pipeline)
+
+
+class FolderPrefetcher:
+    """
+    Навигация по папке с фоновой предзагрузкой соседних изображений
+
+    Для следующих ahead изображений (и одного предыдущего) заранее
+    выполняются декодирование, перевод в оттенки серого, размытие и
+    первое обнаружение границ. Все предзагрузки держатся в пределах
+    memory_budget: готовые учитываются по фактическому размеру, еще не
+    готовые - по оценке из заголовка файла (estimate_nbytes), поэтому
+    загрузка, которая не поместится, не запускается вовсе. При превышении
+    выбрасываются (или отменяются) самые дальние от текущего.
+    Все методы вызываются из одного (GUI) потока.
+    """
+
+    def __init__(self, paths, workers=2, ahead=3, memory_budget=DEFAULT_MEMORY_BUDGET):
+        self.paths = paths
+        self.ahead = ahead
+        self.memory_budget = memory_budget
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prefetch')
+        self.futures = {}
+        self.estimates = {}
+        # Отброшенные, но уже начатые загрузки: память занята до их завершения
+        self.draining = {}
+        self.detector = None
+        self.low_memory = False
+
+    def set_detector(self, detector, low_memory=False):
+        """Меняет параметры; предзагруженное с другими параметрами отбрасывается"""
+        params = detector.params()
+        if self.detector is not None and self.detector.params() == params and self.low_memory == low_memory:
+            return
+        self.detector = detector
+        self.low_memory = low_memory
+        for i in list(self.futures):
+            self._drop(i)
+
+    def get(self, index):
+        """
+        Возвращает PrefetchedImage для индекса, дожидаясь или выполняя загрузку
+
+        Возвращает None, если файл не удалось прочитать.
+        """
+        future = self.futures.pop(index, None)
+        self.estimates.pop(index, None)
+        if future is not None and not future.cancelled():
+            try:
+                return future.result()
+            except Exception:
+                pass
+        return load_prefetched(self.paths[index], self.detector, self.low_memory)
+
+    def schedule(self, index):
+        """Планирует предзагрузку соседей index и освобождает лишнее"""
+        wanted = [i for i in range(index + 1, index + 1 + self.ahead) if i < len(self.paths)]
+        if index > 0:
+            wanted.append(index - 1)
+
+        # Выбрасываем ненужное
+        for i in list(self.futures):
+            if i not in wanted:
+                self._drop(i)
+
+        # Ближайшие к текущему в приоритете: готовые учитываются по факту,
+        # незавершенные - по оценке; все, что не помещается, отменяется
+        used = sum(self.draining.values())
+        for i in sorted(self.futures, key=lambda i: abs(i - index)):
+            used += self._charge(i)
+            if used > self.memory_budget:
+                used -= self._charge(i)
+                self._drop(i)
+
+        for i in sorted(wanted, key=lambda i: abs(i - index)):
+            if i in self.futures:
+                continue
+            estimate = estimate_nbytes(self.paths[i], self.low_memory)
+            if used + estimate > self.memory_budget:
+                continue
+            used += estimate
+            self.estimates[i] = estimate
+            self.futures[i] = self.executor.submit(
+                load_prefetched, self.paths[i], self.detector, self.low_memory
+            )
+
+    def _charge(self, index):
+        """Память предзагрузки index: фактическая для готовой, оценка для незавершенной"""
+        future = self.futures[index]
+        if future.cancelled():
+            return 0
+        if not future.done():
+            return self.estimates.get(index, 0)
+        try:
+            item = future.result()
+        except Exception:
+            return 0
+        return item.nbytes if item is not None else 0
+
+    def _drop(self, index):
+        """
+        Отменяет (если еще не начата) и забывает предзагрузку index
+
+        Уже начатую загрузку отменить нельзя: ее оценка остается в draining
+        и учитывается в бюджете, пока загрузка не завершится.
+        """
+        future = self.futures.pop(index)
+        estimate = self.estimates.pop(index, 0)
+        if future.cancel() or future.done():
+            return
+        self.draining[future] = estimate
+        future.add_done_callback(self._release)
+
+    def _release(self, future):
+        """Загрузка отброшенной предзагрузки завершилась (вызывается из рабочего потока)"""
+        self.draining.pop(future, None)
+
+    def shutdown(self):
+        """Останавливает фоновые потоки"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.futures = {}
+        self.estimates = {}
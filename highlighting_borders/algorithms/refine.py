@@ -0,0 +1,117 @@
+"""
+Уточнение маски объекта с помощью GrabCut в узкой полосе вдоль контура
+"""
+
+import math
+
+import cv2
+import numpy as np
+
+from .adaptive import upsample_mask
+from .band import boundary_band_tiles
+
+# Наименьшая полуширина полосы на рабочем разрешении: уже нее GrabCut
+# почти нечего переназначать
+MIN_WORK_BAND = 3
+
+# Размер тайла полосы для GrabCut на рабочем разрешении
+GRABCUT_TILE = 32
+
+
+def refine_mask_grabcut(image, mask, band_width=8, max_side=1024, iterations=3):
+    """
+    Уточняет маску с помощью GrabCut только внутри полосы вокруг контура
+
+    Область, охватывающая полосу, при необходимости уменьшается до max_side.
+    GrabCut запускается по тайлам полосы (с запасом, в котором есть
+    надежные объект и фон), поэтому стоимость растет с длиной контура,
+    а не с площадью объекта. Пиксели внутри маски вне полосы считаются
+    гарантированным объектом, снаружи - гарантированным фоном.
+
+    На рабочем разрешении полоса не уже MIN_WORK_BAND пикселей, а при
+    увеличении результата граница переназначается по цвету полноразмерного
+    изображения (adaptive.upsample_mask), так что уменьшение не дает
+    ступенек размером с коэффициент масштаба. Результат переносится
+    в маску полного разрешения только в пределах полосы.
+
+    Параметры:
+    - image: исходное изображение (RGB)
+    - mask: бинарная маска объекта (0/255), например из detect_edges
+    - band_width: полуширина полосы неопределенности в пикселях полного разрешения
+    - max_side: максимальная сторона области для GrabCut (None - без уменьшения)
+    - iterations: количество итераций GrabCut
+
+    Возвращает:
+    - refined: уточненная маска того же размера (0/255)
+    """
+    if mask is None or not np.any(mask):
+        return mask
+
+    h, w = mask.shape[:2]
+    bx, by, bw, bh = cv2.boundingRect(mask)
+
+    # Область интереса с запасом, чтобы у GrabCut были образцы фона и объекта
+    pad = band_width * 2
+    x0, x1 = max(0, bx - pad), min(w, bx + bw + pad)
+    y0, y1 = max(0, by - pad), min(h, by + bh + pad)
+
+    roi_image = image[y0:y1, x0:x1]
+    roi_mask = mask[y0:y1, x0:x1]
+
+    roi_h, roi_w = roi_mask.shape
+    scale = 1.0
+    if max_side and max(roi_h, roi_w) > max_side:
+        scale = max_side / max(roi_h, roi_w)
+
+    if scale < 1.0:
+        size = (max(1, int(roi_w * scale)), max(1, int(roi_h * scale)))
+        work_image = cv2.resize(roi_image, size, interpolation=cv2.INTER_AREA)
+        work_mask = cv2.resize(roi_mask, size, interpolation=cv2.INTER_NEAREST)
+    else:
+        work_image, work_mask = roi_image, roi_mask
+
+    work_band_width = max(MIN_WORK_BAND, int(math.ceil(band_width * scale)))
+    work_band, tiles = boundary_band_tiles(work_mask, work_band_width, GRABCUT_TILE)
+
+    # Разметка для GrabCut: полоса - "вероятно", остальное - "точно"
+    in_band = work_band > 0
+    gc_mask = np.where(work_mask > 0, cv2.GC_FGD, cv2.GC_BGD).astype(np.uint8)
+    gc_mask[in_band & (work_mask > 0)] = cv2.GC_PR_FGD
+    gc_mask[in_band & (work_mask == 0)] = cv2.GC_PR_BGD
+
+    work_h, work_w = work_mask.shape
+    halo = 2 * work_band_width
+    refined_work = work_mask.copy()
+    for tx0, ty0, tx1, ty1 in tiles:
+        ex0, ey0 = max(0, tx0 - halo), max(0, ty0 - halo)
+        ex1, ey1 = min(work_w, tx1 + halo), min(work_h, ty1 + halo)
+        labels = gc_mask[ey0:ey1, ex0:ex1].copy()
+
+        # Модели цвета строятся по тайлу: нужны образцы обоих классов
+        is_fg = (labels == cv2.GC_FGD) | (labels == cv2.GC_PR_FGD)
+        if is_fg.all() or not is_fg.any():
+            continue
+
+        bgd_model = np.zeros((1, 65), np.float64)
+        fgd_model = np.zeros((1, 65), np.float64)
+        cv2.grabCut(np.ascontiguousarray(work_image[ey0:ey1, ex0:ex1]), labels, None,
+                    bgd_model, fgd_model, iterations, cv2.GC_INIT_WITH_MASK)
+
+        inner = (slice(ty0 - ey0, ty1 - ey0), slice(tx0 - ex0, tx1 - ex0))
+        tile_band = in_band[ty0:ty1, tx0:tx1]
+        result = (labels[inner] == cv2.GC_FGD) | (labels[inner] == cv2.GC_PR_FGD)
+        refined_work[ty0:ty1, tx0:tx1][tile_band] = np.where(result[tile_band], 255, 0)
+
+    if scale < 1.0:
+        refined_roi = upsample_mask(roi_image, refined_work, work_image)
+        roi_band = cv2.resize(work_band, (roi_w, roi_h), interpolation=cv2.INTER_NEAREST)
+    else:
+        refined_roi, roi_band = refined_work, work_band
+
+    # Переносим результат только внутри полосы
+    refined = mask.copy()
+    target = refined[y0:y1, x0:x1]
+    roi_in_band = roi_band > 0
+    target[roi_in_band] = refined_roi[roi_in_band]
+
+    return refined
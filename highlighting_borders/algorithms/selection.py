@@ -0,0 +1,96 @@
+"""
+Выбор объектов щелчком по карте меток контуров
+
+После обнаружения границ внешние контуры замкнутой карты границ один
+раз заливаются в карту меток (метка i + 1 у i-го контура, 0 - фон).
+Щелчок - это чтение одной метки, а изменение маски затрагивает только
+ограничивающий прямоугольник выбранного контура: detect_edges и
+проверки pointPolygonTest не повторяются.
+"""
+
+import cv2
+import numpy as np
+
+
+class ObjectSelection:
+    """
+    Карта меток контуров и маска выбранных объектов
+
+    Атрибуты:
+    - labels: карта меток (uint16 или int32 при большом числе контуров)
+    - count: число контуров
+    - selected: bool-массив длины count + 1, выбран ли объект с меткой
+    - mask: маска выбранных объектов uint8 0/255 (изменяется на месте)
+    """
+
+    def __init__(self, edges, mask=None):
+        """
+        Параметры:
+        - edges: бинарная карта замкнутых границ (результат edges_and_mask)
+        - mask: текущая маска объекта; объекты, покрытые ею больше чем
+          наполовину, считаются выбранными. Маска копируется.
+        """
+        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        self.count = len(contours)
+
+        dtype = np.uint16 if self.count < np.iinfo(np.uint16).max else np.int32
+        self.labels = np.zeros(edges.shape[:2], dtype=dtype)
+        # Ограничивающие прямоугольники (x0, y0, x1, y1); индекс 0 - фон
+        self.bboxes = np.zeros((self.count + 1, 4), dtype=np.int32)
+        for i, contour in enumerate(contours):
+            cv2.drawContours(self.labels, [contour], -1, i + 1, -1)
+            x, y, w, h = cv2.boundingRect(contour)
+            self.bboxes[i + 1] = (x, y, x + w, y + h)
+
+        if mask is None:
+            self.mask = np.zeros(edges.shape[:2], dtype=np.uint8)
+            self.selected = np.zeros(self.count + 1, dtype=bool)
+        else:
+            self.mask = mask.copy()
+            areas = np.bincount(self.labels.ravel(), minlength=self.count + 1)
+            covered = np.bincount(self.labels[mask > 0], minlength=self.count + 1)
+            self.selected = covered * 2 > areas
+            self.selected[0] = False
+
+    def label_at(self, x, y):
+        """Метка объекта в точке (x, y) или 0, если это фон или точка вне изображения"""
+        h, w = self.labels.shape
+        if not (0 <= x < w and 0 <= y < h):
+            return 0
+        return int(self.labels[y, x])
+
+    def set_selected(self, label, selected):
+        """
+        Включает объект в маску или исключает из нее
+
+        Обновляется только ограничивающий прямоугольник объекта.
+        """
+        if label <= 0 or label > self.count:
+            return
+        self.selected[label] = selected
+        x0, y0, x1, y1 = self.bboxes[label]
+        inside = self.labels[y0:y1, x0:x1] == label
+        self.mask[y0:y1, x0:x1][inside] = 255 if selected else 0
+
+    def toggle(self, x, y):
+        """
+        Переключает объект под точкой (x, y)
+
+        Возвращает:
+        - метку переключенного объекта или 0, если под точкой нет объекта
+        """
+        label = self.label_at(x, y)
+        if label:
+            self.set_selected(label, not self.selected[label])
+        return label
+
+    def bbox(self, label):
+        """Ограничивающий прямоугольник объекта (x0, y0, x1, y1)"""
+        return tuple(int(v) for v in self.bboxes[label])
+
+    def selected_count(self):
+        return int(np.count_nonzero(self.selected))
+
+    @property
+    def nbytes(self):
+        return self.labels.nbytes + self.mask.nbytes
@@ -0,0 +1,259 @@
+"""
+Потоковая обработка: итератор путей или массивов -> итератор результатов
+
+Декодирование, обнаружение и кодирование выполняются отдельными пулами
+потоков, поэтому чтение с диска и запись перекрываются с вычислениями.
+Число одновременно находящихся в обработке элементов ограничено
+(max_pending): входной итератор читается не быстрее, чем потребитель
+забирает результаты. Ошибка обработки элемента не прерывает поток,
+а сохраняется в его результате.
+
+Пример:
+    detector = CannyEdgeDetector()
+    for result in detect_stream(paths, detector, encode=encode_png_rgba):
+        if result.ok:
+            save(result.source, result.data)
+"""
+
+import queue
+import threading
+
+import cv2
+
+from .adaptive import detect_edges_adaptive
+from .threads import set_thread_budget, thread_budget
+
+# Признак конца очереди стадии
+_DONE = object()
+
+
+class StreamResult:
+    """
+    Результат обработки одного элемента потока
+
+    Атрибуты:
+    - index: номер элемента во входном потоке
+    - source: исходный элемент (путь или массив)
+    - image: декодированное изображение (RGB); None после кодирования,
+      если keep_images=False
+    - edges: бинарная карта границ
+    - mask: бинарная маска объекта
+    - data: результат encode (например, байты PNG) или None
+    - error: исключение, если обработка не удалась
+    - stage: стадия, на которой произошла ошибка ('decode', 'detect', 'encode')
+    """
+
+    def __init__(self, index, source):
+        self.index = index
+        self.source = source
+        self.image = None
+        self.edges = None
+        self.mask = None
+        self.data = None
+        self.error = None
+        self.stage = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        status = 'ok' if self.ok else f"{self.stage}: {self.error!r}"
+        return f"StreamResult(index={self.index}, {status})"
+
+
+def decode_image(source):
+    """Путь к файлу или массив -> изображение RGB"""
+    if isinstance(source, (str, bytes)) or hasattr(source, '__fspath__'):
+        image = cv2.imread(str(source))
+        if image is None:
+            raise ValueError(f"не удалось прочитать изображение: {source}")
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+    return source
+
+
+def encode_png_rgba(image, mask):
+    """Кодирует изображение без фона (альфа - маска) в байты PNG"""
+    result_bgra = cv2.cvtColor(image, cv2.COLOR_RGB2BGRA)
+    result_bgra[:, :, 3] = mask
+    ok, buffer = cv2.imencode('.png', result_bgra)
+    if not ok:
+        raise ValueError("не удалось закодировать PNG")
+    return buffer.tobytes()
+
+
+def encode_mask_png(image, mask):
+    """Кодирует только маску в байты PNG"""
+    ok, buffer = cv2.imencode('.png', mask)
+    if not ok:
+        raise ValueError("не удалось закодировать PNG")
+    return buffer.tobytes()
+
+
+class _Stage:
+    """Пул потоков, читающий из своей очереди и передающий дальше"""
+
+    def __init__(self, name, func, workers, output, stop):
+        self.name = name
+        self.func = func
+        self.input = queue.Queue()
+        self.output = output
+        self.stop = stop
+        self.remaining = workers
+        self.lock = threading.Lock()
+        self.threads = [
+            threading.Thread(target=self._run, name=f"stream-{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def _run(self):
+        while True:
+            result = self.input.get()
+            if result is _DONE:
+                break
+            # После ошибки или остановки элемент проходит стадию без работы
+            if result.error is None and not self.stop.is_set():
+                try:
+                    self.func(result)
+                except Exception as error:
+                    result.error = error
+                    result.stage = self.name
+            self.output.put(result)
+
+        # Последний завершившийся поток закрывает очередь следующей стадии
+        with self.lock:
+            self.remaining -= 1
+            last = self.remaining == 0
+        if last:
+            self.output.put(_DONE)
+
+    def close(self):
+        for _ in self.threads:
+            self.input.put(_DONE)
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+
+
+class _Fanout:
+    """Очередь-адаптер: передает элементы во вход следующей стадии"""
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def put(self, item):
+        if item is _DONE:
+            self.stage.close()
+        else:
+            self.stage.input.put(item)
+
+
+def detect_stream(items, detector, encode=None, ordered=True, max_pending=16,
+                  decode_workers=2, detect_workers=None, encode_workers=1,
+                  working_pixels=0, keep_images=False):
+    """
+    Обрабатывает поток изображений, выдавая результаты по мере готовности
+
+    Параметры:
+    - items: итерируемое путей к файлам и/или массивов RGB
+    - detector: CannyEdgeDetector (один на все потоки)
+    - encode: функция (image, mask) -> данные, например encode_png_rgba; None - не кодировать
+    - ordered: выдавать результаты в порядке входа (иначе - по готовности)
+    - max_pending: максимум элементов в обработке (включая ожидающие выдачи)
+    - decode_workers, detect_workers, encode_workers: размеры пулов стадий;
+      detect_workers по умолчанию - по политике algorithms.threads (если
+      политика не задана, она применяется здесь, чтобы потоки OpenCV
+      в каждом исполнителе не занимали все ядра)
+    - working_pixels: рабочее разрешение для больших изображений (0 - полное)
+    - keep_images: оставлять декодированное изображение в результате
+
+    Возвращает:
+    - генератор StreamResult
+
+    Ошибки элементов сохраняются в StreamResult.error; исключение при
+    переборе самого items пробрасывается потребителю. Если генератор
+    закрыт раньше времени, он дожидается завершения всех потоков стадий
+    (начатые вызовы OpenCV доделываются, остальные элементы пропускаются).
+    """
+    budget = thread_budget()
+    if budget is None:
+        budget = set_thread_budget(detect_workers)
+    detect_workers = detect_workers or budget.workers
+
+    def decode(result):
+        result.image = decode_image(result.source)
+
+    def detect(result):
+        if working_pixels > 0:
+            result.edges, result.mask = detect_edges_adaptive(
+                detector, result.image, working_pixels=working_pixels
+            )
+        else:
+            result.edges, result.mask = detector.edges_and_mask(result.image)
+
+    def finish(result):
+        if encode is not None:
+            result.data = encode(result.image, result.mask)
+        if not keep_images:
+            result.image = None
+
+    stop = threading.Event()
+    slots = threading.Semaphore(max_pending)
+    output = queue.Queue()
+    feed_error = []
+
+    encode_stage = _Stage('encode', finish, encode_workers, output, stop)
+    detect_stage = _Stage('detect', detect, detect_workers, _Fanout(encode_stage), stop)
+    decode_stage = _Stage('decode', decode, decode_workers, _Fanout(detect_stage), stop)
+
+    def feed():
+        try:
+            for index, source in enumerate(items):
+                # Ожидание свободного места - обратное давление на вход
+                while not slots.acquire(timeout=0.1):
+                    if stop.is_set():
+                        return
+                if stop.is_set():
+                    return
+                decode_stage.input.put(StreamResult(index, source))
+        except Exception as error:
+            feed_error.append(error)
+        finally:
+            decode_stage.close()
+
+    feeder = threading.Thread(target=feed, name='stream-feed', daemon=True)
+    feeder.start()
+
+    pending = {}
+    next_index = 0
+    try:
+        while True:
+            result = output.get()
+            if result is _DONE:
+                break
+            if not ordered:
+                slots.release()
+                yield result
+                continue
+
+            pending[result.index] = result
+            while next_index in pending:
+                slots.release()
+                yield pending.pop(next_index)
+                next_index += 1
+
+        if feed_error:
+            raise feed_error[0]
+    finally:
+        # Потребитель мог прекратить чтение раньше: останавливаем стадии
+        # и ждем их потоки, чтобы при выходе из процесса не осталось
+        # потоков внутри OpenCV. Оставшиеся элементы проходят стадии без работы
+        stop.set()
+        feeder.join()
+        for stage in (decode_stage, detect_stage, encode_stage):
+            stage.join()
+        while not output.empty():
+            output.get_nowait()
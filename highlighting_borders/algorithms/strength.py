@@ -0,0 +1,167 @@
+"""
+Карта силы границ: нижний порог Canny как поиск по таблице
+
+При фиксированных размытии и верхнем пороге результат Canny монотонно
+зависит от нижнего порога: пиксель остается границей, пока существует
+путь из кандидатов (прошедших подавление немаксимумов) к сильному
+пикселю, на котором модуль градиента везде больше порога. Наибольший
+такой порог (узкое место лучшего пути) считается для всех пикселей
+за один проход - заливкой по уровням от верхнего порога вниз. После
+этого граница для любого threshold1 - одно сравнение strength > threshold1.
+
+Градиент, его модуль (норма L1) и подавление немаксимумов повторяют
+cv2.Canny (Собель 3x3, BORDER_REPLICATE, те же правила сравнения
+с соседями), поэтому результат совпадает с cv2.Canny попиксельно.
+"""
+
+import math
+
+import cv2
+import numpy as np
+
+# Тангенс 22.5 градусов в фиксированной точке, как в cv2.Canny
+_CANNY_SHIFT = 15
+_TG22 = int(0.4142135623730950488016887242097 * (1 << _CANNY_SHIFT) + 0.5)
+
+# Сила сильных пикселей: они остаются границей при любом нижнем пороге
+STRONG = np.iinfo(np.uint16).max
+
+
+def gradient_ridges(blurred):
+    """
+    Модуль градиента после подавления немаксимумов
+
+    Параметры:
+    - blurred: размытое изображение в оттенках серого (uint8)
+
+    Возвращает:
+    - ridges: uint16, модуль градиента |dx| + |dy| в пикселях-кандидатах, 0 в остальных
+    """
+    dx = cv2.Sobel(blurred, cv2.CV_16S, 1, 0, ksize=3, borderType=cv2.BORDER_REPLICATE).astype(np.int32)
+    dy = cv2.Sobel(blurred, cv2.CV_16S, 0, 1, ksize=3, borderType=cv2.BORDER_REPLICATE).astype(np.int32)
+    ax = np.abs(dx)
+    ay = np.abs(dy)
+    mag = ax + ay
+
+    # Соседи по направлению градиента (за краем изображения - нули)
+    padded = np.pad(mag, 1)
+    up, down = padded[:-2, 1:-1], padded[2:, 1:-1]
+    left, right = padded[1:-1, :-2], padded[1:-1, 2:]
+
+    ay <<= _CANNY_SHIFT
+    tg22x = ax * _TG22
+    horizontal = ay < tg22x
+    vertical = ay > tg22x + (ax << (_CANNY_SHIFT + 1))
+    diagonal = ~(horizontal | vertical)
+
+    # Диагональ выбирается по знакам dx и dy
+    opposite = (dx ^ dy) < 0
+    before = np.where(opposite, padded[:-2, 2:], padded[:-2, :-2])
+    after = np.where(opposite, padded[2:, :-2], padded[2:, 2:])
+    before = np.where(horizontal, left, np.where(vertical, up, before))
+    after = np.where(horizontal, right, np.where(vertical, down, after))
+
+    # По горизонтали и вертикали второй сосед сравнивается нестрого, по диагонали - строго
+    keep = (mag > before) & (mag >= after + diagonal)
+    return np.where(keep, mag, 0).astype(np.uint16)
+
+
+def hysteresis_strength(ridges, threshold2):
+    """
+    Наибольший нижний порог, при котором пиксель еще остается границей
+
+    Пиксель - граница Canny(threshold1, threshold2) тогда и только тогда,
+    когда strength > threshold1 (для threshold1 <= threshold2).
+
+    Параметры:
+    - ridges: результат gradient_ridges
+    - threshold2: верхний порог
+
+    Возвращает:
+    - strength: uint16 (STRONG у сильных пикселей, 0 - не граница ни при каком пороге)
+    """
+    high = int(math.floor(threshold2))
+    h, w = ridges.shape
+    stride = w + 2
+
+    candidates = ridges > 0
+    strong = ridges > high
+
+    # Кандидаты из компонент без сильных пикселей не станут границей ни при каком пороге
+    count, labels = cv2.connectedComponents(candidates.view(np.uint8), connectivity=8)
+    reachable = np.zeros(count, dtype=bool)
+    reachable[labels[strong]] = True
+    reachable[0] = False
+    weak = reachable[labels] & ~strong
+
+    # Рабочее поле с рамкой: > 0 - еще не достигнутый кандидат (его модуль),
+    # < 0 - граница (минус порог, до которого она сохраняется)
+    work = np.zeros((h + 2, stride), dtype=np.int32)
+    inner = work[1:-1, 1:-1]
+    inner[weak] = ridges[weak]
+    inner[strong] = -STRONG
+    flat = work.ravel()
+
+    pixels = np.flatnonzero(flat > 0)
+    values = flat[pixels]
+    order = np.argsort(-values, kind='stable')
+    pixels, values = pixels[order], -values[order]
+
+    neighbours = np.array([-stride - 1, -stride, -stride + 1, -1, 1, stride - 1, stride, stride + 1])
+    levels = np.arange(high, 0, -1)
+    starts = np.searchsorted(values, -levels, side='left')
+    ends = np.searchsorted(values, -levels, side='right')
+
+    # Уровни идут от верхнего порога вниз: на уровне v добавляются кандидаты
+    # с модулем v, касающиеся уже найденных границ, и от них заливаются все
+    # связанные с ними кандидаты с модулем >= v
+    for level, start, end in zip(levels.tolist(), starts.tolist(), ends.tolist()):
+        if start == end:
+            continue
+        added = pixels[start:end]
+        added = added[flat[added] > 0]
+        front = added[(flat[added[:, None] + neighbours] < 0).any(axis=1)]
+        while front.size:
+            flat[front] = -level
+            around = (front[:, None] + neighbours).ravel()
+            front = np.unique(around[flat[around] >= level])
+
+    return np.negative(inner, where=inner < 0, out=np.zeros((h, w), dtype=np.int32)).astype(np.uint16)
+
+
+class EdgeStrengthMap:
+    """
+    Карта силы границ для фиксированных размытия и верхнего порога
+
+    Атрибуты:
+    - blur_size, threshold2: параметры, для которых построена карта
+    - ridges: модуль градиента после подавления немаксимумов (зависит только от размытия)
+    - strength: наибольший нижний порог, при котором пиксель остается границей
+    """
+
+    def __init__(self, blurred, blur_size, threshold2, ridges=None):
+        """
+        Параметры:
+        - blurred: размытое изображение в оттенках серого
+        - blur_size: размер ядра размытия, с которым получено blurred
+        - threshold2: верхний порог
+        - ridges: готовый gradient_ridges(blurred) (например, от карты с другим threshold2)
+        """
+        self.blur_size = blur_size
+        self.threshold2 = threshold2
+        self.ridges = ridges if ridges is not None else gradient_ridges(blurred)
+        self.strength = hysteresis_strength(self.ridges, threshold2)
+
+    def supports(self, detector):
+        """Можно ли получить границы детектора из этой карты"""
+        return (detector.blur_size == self.blur_size
+                and math.floor(detector.threshold2) == math.floor(self.threshold2)
+                and detector.threshold1 <= detector.threshold2)
+
+    def edges(self, threshold1):
+        """Карта границ Canny(threshold1, threshold2): uint8 0/255"""
+        return cv2.compare(self.strength, float(math.floor(threshold1)), cv2.CMP_GT)
+
+    @property
+    def nbytes(self):
+        return self.ridges.nbytes + self.strength.nbytes
@@ -0,0 +1,93 @@
+"""
+Политика распределения ядер между потоками OpenCV и внешним параллелизмом
+
+По умолчанию OpenCV запускает столько внутренних потоков, сколько ядер,
+в каждом вызове. Если обработка сама идет в пуле из N потоков или
+процессов, получается N x ядер активных потоков и сильная конкуренция
+за процессор. Политика делит ядра: внешний пул получает workers
+исполнителей, а каждый вызов OpenCV - cores // workers потоков.
+"""
+
+import os
+import threading
+
+import cv2
+
+_lock = threading.Lock()
+_budget = None
+
+
+class ThreadBudget:
+    """
+    Распределение ядер
+
+    Атрибуты:
+    - cores: доступные процессу ядра
+    - workers: число внешних исполнителей (потоков или процессов)
+    - opencv_threads: число внутренних потоков OpenCV на исполнителя
+    """
+
+    def __init__(self, cores, workers, opencv_threads):
+        self.cores = cores
+        self.workers = workers
+        self.opencv_threads = opencv_threads
+
+    def __repr__(self):
+        return (f"ThreadBudget(cores={self.cores}, workers={self.workers}, "
+                f"opencv_threads={self.opencv_threads})")
+
+
+def available_cores():
+    """Число ядер, доступных процессу (с учетом привязки к CPU)"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def plan_budget(workers=None, cores=None):
+    """
+    Делит ядра между внешними исполнителями и потоками OpenCV
+
+    Параметры:
+    - workers: число внешних исполнителей (None - по числу ядер)
+    - cores: число ядер (None - available_cores())
+
+    Возвращает:
+    - ThreadBudget
+    """
+    cores = cores or available_cores()
+    workers = max(1, min(workers or cores, cores))
+    return ThreadBudget(cores, workers, max(1, cores // workers))
+
+
+def set_thread_budget(workers=None, cores=None):
+    """
+    Применяет политику к текущему процессу
+
+    cv2.setNumThreads действует на весь процесс, поэтому политика
+    глобальная: ее задают один раз перед запуском пула.
+
+    Возвращает:
+    - ThreadBudget
+    """
+    global _budget
+    budget = plan_budget(workers, cores)
+    with _lock:
+        cv2.setNumThreads(budget.opencv_threads)
+        _budget = budget
+    return budget
+
+
+def thread_budget():
+    """Текущая политика или None, если она не задавалась"""
+    return _budget
+
+
+def init_worker_process(opencv_threads):
+    """
+    Инициализатор для ProcessPoolExecutor(initializer=...)
+
+    В дочерних процессах настройка OpenCV не наследуется при spawn,
+    поэтому число потоков задается заново.
+    """
+    cv2.setNumThreads(opencv_threads)
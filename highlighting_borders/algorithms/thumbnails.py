@@ -0,0 +1,148 @@
+"""
+Миниатюры изображений и масок для галереи с кешем на диске
+
+Миниатюры создаются по запросу: JPEG декодируется сразу в уменьшенном
+виде (масштабирование DCT в libjpeg, флаги IMREAD_REDUCED_*), готовые
+миниатюры сохраняются в каталоге кеша. Ключ включает путь, размер и
+время изменения файла, поэтому измененный файл получает новую миниатюру.
+"""
+
+import hashlib
+import os
+import threading
+
+import cv2
+
+from .cache import default_cache_dir
+
+THUMBNAIL_SIZE = 160
+
+JPEG_EXTENSIONS = ('.jpg', '.jpeg')
+
+# Флаги уменьшенного декодирования от самого сильного к слабому
+_REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+def fit_size(image, size):
+    """Уменьшает изображение так, чтобы большая сторона была не больше size"""
+    h, w = image.shape[:2]
+    scale = size / max(h, w)
+    if scale >= 1.0:
+        return image
+    return cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+
+def read_reduced(path, size):
+    """
+    Читает изображение (BGR) с разрешением не меньше size по большей стороне
+
+    Для JPEG пробуется декодирование в 8, 4 и 2 раза меньшем размере;
+    остальные форматы такого не поддерживают и читаются целиком.
+
+    Возвращает:
+    - image или None, если файл не удалось прочитать
+    """
+    if path.lower().endswith(JPEG_EXTENSIONS):
+        for _, flag in _REDUCED_FLAGS:
+            image = cv2.imread(path, flag)
+            if image is None:
+                return None
+            if max(image.shape[:2]) >= size:
+                return image
+    return cv2.imread(path, cv2.IMREAD_COLOR)
+
+
+def load_mask(path):
+    """
+    Читает сохраненную маску результата
+
+    Поддерживаются PNG без фона (маска - альфа-канал) и одноканальные маски.
+
+    Возвращает:
+    - mask: uint8 0/255 или None
+    """
+    image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        return None
+    if image.ndim == 3:
+        image = image[:, :, 3] if image.shape[2] == 4 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    _, mask = cv2.threshold(image, 127, 255, cv2.THRESH_BINARY)
+    return mask
+
+
+def find_result(path, results_dir):
+    """Путь к PNG-результату пакетной обработки для изображения или None"""
+    if not results_dir:
+        return None
+    stem = os.path.splitext(os.path.basename(path))[0]
+    result = os.path.join(results_dir, stem + '.png')
+    return result if os.path.exists(result) else None
+
+
+class ThumbnailStore:
+    """
+    Дисковый кеш миниатюр
+
+    Методы можно вызывать из нескольких потоков одновременно: запись
+    идет во временный файл и атомарно переименовывается.
+    """
+
+    def __init__(self, directory=None, size=THUMBNAIL_SIZE):
+        self.directory = directory or os.path.join(default_cache_dir(), 'thumbnails')
+        self.size = size
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, path, kind):
+        stat = os.stat(path)
+        key = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}|{kind}|{self.size}"
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        ext = '.jpg' if kind == 'image' else '.png'
+        return os.path.join(self.directory, digest[:2], digest + ext)
+
+    def get(self, path, kind='image'):
+        """
+        Возвращает миниатюру, создавая и сохраняя ее при необходимости
+
+        Параметры:
+        - path: файл изображения или маски
+        - kind: 'image' - миниатюра RGB, 'mask' - миниатюра маски (оттенки серого)
+
+        Возвращает:
+        - миниатюра (numpy array) или None, если файл не удалось прочитать
+        """
+        try:
+            thumb_path = self._path(path, kind)
+        except OSError:
+            return None
+
+        flags = cv2.IMREAD_COLOR if kind == 'image' else cv2.IMREAD_GRAYSCALE
+        thumb = cv2.imread(thumb_path, flags) if os.path.exists(thumb_path) else None
+        if thumb is None:
+            thumb = self._create(path, kind)
+            if thumb is None:
+                return None
+            self._save(thumb_path, thumb)
+
+        if kind == 'image':
+            cv2.cvtColor(thumb, cv2.COLOR_BGR2RGB, dst=thumb)
+        return thumb
+
+    def _create(self, path, kind):
+        if kind == 'image':
+            image = read_reduced(path, self.size)
+        else:
+            image = load_mask(path)
+        if image is None:
+            return None
+        return fit_size(image, self.size)
+
+    def _save(self, thumb_path, thumb):
+        os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+        root, ext = os.path.splitext(thumb_path)
+        tmp_path = f"{root}.{os.getpid()}.{threading.get_ident()}.tmp{ext}"
+        if cv2.imwrite(tmp_path, thumb):
+            os.replace(tmp_path, thumb_path)
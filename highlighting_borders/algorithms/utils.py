@@ -107,6 +107,35 @@ def create_mask_from_contours(image_shape, contours, fill_value=255):
     return mask
 
 
+def create_region_mask(image_shape, rect=None, polygons=(), mode="include"):
+    """
+    Создает маску области обработки из прямоугольника и полигонов
+
+    Параметры:
+    - image_shape: размер изображения (height, width)
+    - rect: прямоугольник (x, y, w, h) или None
+    - polygons: список полигонов (списков точек)
+    - mode: "include" - обрабатывать внутри областей, "exclude" - вне их
+
+    Возвращает:
+    - mask: маска области (255 - обрабатывать) или None, если областей нет
+    """
+    polygons = [p for p in polygons if len(p) > 2]
+    if not rect and not polygons:
+        return None
+
+    mask = np.zeros(image_shape[:2], dtype=np.uint8)
+    if rect:
+        x, y, w, h = rect
+        cv2.rectangle(mask, (x, y), (x + w, y + h), 255, -1)
+    for polygon in polygons:
+        cv2.fillPoly(mask, [np.array(polygon, dtype=np.int32)], 255)
+
+    if mode == "exclude":
+        mask = cv2.bitwise_not(mask)
+    return mask
+
+
 def enhance_edges(edges, kernel_size=3):
     """
     Улучшает качество обнаруженных границ
@@ -239,20 +268,22 @@ def get_bounding_rect(contour):
     return cv2.boundingRect(contour)
 
 
-def extract_roi_from_mask(image, mask):
+def extract_roi_from_mask(image, mask, contours=None):
     """
     Извлекает область интереса из изображения по маске
 
     Параметры:
     - image: исходное изображение
     - mask: бинарная маска
+    - contours: готовые внешние контуры маски (например, DetectionResult.contours)
 
     Возвращает:
     - roi: область интереса
     - bbox: ограничивающий прямоугольник (x, y, w, h)
     """
-    # Находим контуры маски
-    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    # Находим контуры маски, если они еще не известны
+    if contours is None:
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
     if not contours:
         return None, None
@@ -0,0 +1,141 @@
+"""
+Векторный экспорт маски: полигоны с отверстиями в SVG, GeoJSON и компактный JSON
+"""
+
+import json
+
+import cv2
+
+EXPORT_FORMATS = ('svg', 'geojson', 'json')
+
+
+def mask_to_polygons(mask, tolerance=1.0, min_area=0):
+    """
+    Преобразует бинарную маску в упрощенные полигоны с отверстиями
+
+    Контуры ищутся с двухуровневой иерархией (RETR_CCOMP): внешние контуры
+    становятся полигонами, их дочерние контуры - отверстиями. Каждый контур
+    упрощается алгоритмом Douglas-Peucker (как в utils.smooth_contour),
+    но с абсолютным допуском в пикселях.
+
+    Параметры:
+    - mask: бинарная маска (0/255)
+    - tolerance: допуск упрощения в пикселях (0 - без упрощения)
+    - min_area: минимальная площадь внешнего контура
+
+    Возвращает:
+    - polygons: список полигонов, каждый - список колец [внешнее, отверстие, ...],
+      кольцо - список точек (x, y)
+    """
+    contours, hierarchy = cv2.findContours(mask, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)
+    if hierarchy is None:
+        return []
+    hierarchy = hierarchy[0]
+
+    def simplify(contour):
+        if tolerance > 0:
+            contour = cv2.approxPolyDP(contour, tolerance, True)
+        return [(int(x), int(y)) for x, y in contour[:, 0]]
+
+    polygons = []
+    for i, contour in enumerate(contours):
+        # Родитель -1 - внешний контур
+        if hierarchy[i][3] != -1:
+            continue
+        if min_area and cv2.contourArea(contour) < min_area:
+            continue
+
+        exterior = simplify(contour)
+        if len(exterior) < 3:
+            continue
+        rings = [exterior]
+
+        child = hierarchy[i][2]
+        while child != -1:
+            hole = simplify(contours[child])
+            if len(hole) >= 3:
+                rings.append(hole)
+            child = hierarchy[child][0]
+
+        polygons.append(rings)
+
+    return polygons
+
+
+def polygons_to_svg(polygons, width, height):
+    """
+    Формирует SVG-документ: один путь на полигон, отверстия через fill-rule evenodd
+    """
+    paths = []
+    for rings in polygons:
+        data = ' '.join(
+            'M' + ' '.join(f'{x},{y}' for x, y in ring) + 'Z' for ring in rings
+        )
+        paths.append(f'<path d="{data}"/>')
+
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}">'
+        f'<g fill="#000" fill-rule="evenodd">{"".join(paths)}</g></svg>\n'
+    )
+
+
+def polygons_to_geojson(polygons):
+    """
+    Формирует GeoJSON FeatureCollection в пиксельных координатах изображения
+    """
+    features = []
+    for rings in polygons:
+        # В GeoJSON кольца замкнуты: первая точка повторяется в конце
+        coordinates = [[list(p) for p in ring] + [list(ring[0])] for ring in rings]
+        features.append({
+            'type': 'Feature',
+            'properties': {},
+            'geometry': {'type': 'Polygon', 'coordinates': coordinates},
+        })
+
+    return json.dumps({'type': 'FeatureCollection', 'features': features}, separators=(',', ':'))
+
+
+def polygons_to_json(polygons, width, height):
+    """
+    Формирует компактный JSON: кольца как плоские списки [x0, y0, x1, y1, ...]
+    """
+    data = {
+        'width': width,
+        'height': height,
+        'polygons': [[[c for point in ring for c in point] for ring in rings] for rings in polygons],
+    }
+    return json.dumps(data, separators=(',', ':'))
+
+
+def export_format(file_path):
+    """Определяет формат экспорта по расширению файла"""
+    ext = file_path.rsplit('.', 1)[-1].lower()
+    return ext if ext in EXPORT_FORMATS else None
+
+
+def save_polygons(file_path, polygons, shape, fmt=None):
+    """
+    Сохраняет полигоны в файл
+
+    Параметры:
+    - file_path: путь к файлу
+    - polygons: результат mask_to_polygons
+    - shape: размер исходного изображения (height, width)
+    - fmt: 'svg', 'geojson' или 'json' (по умолчанию - по расширению файла)
+    """
+    fmt = fmt or export_format(file_path)
+    height, width = shape[:2]
+
+    if fmt == 'svg':
+        text = polygons_to_svg(polygons, width, height)
+    elif fmt == 'geojson':
+        text = polygons_to_geojson(polygons)
+    elif fmt == 'json':
+        text = polygons_to_json(polygons, width, height)
+    else:
+        raise ValueError(f"Неизвестный формат экспорта: {fmt}")
+
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(text)
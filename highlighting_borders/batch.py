@@ -0,0 +1,228 @@
+"""
+Пакетная обработка изображений без графического интерфейса
+
+Пример:
+    python batch.py photos/ -o results/ --format svg --tolerance 1.5
+    python batch.py photos/ -o results.archive/ --format archive --archive-encoding rle -j 0
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from algorithms.lazy import lazy_import
+
+cv2 = lazy_import('cv2')
+canny = lazy_import('algorithms.canny')
+vector = lazy_import('algorithms.vector')
+cache = lazy_import('algorithms.cache')
+adaptive = lazy_import('algorithms.adaptive')
+matte = lazy_import('algorithms.matte')
+threads = lazy_import('algorithms.threads')
+archive = lazy_import('algorithms.archive')
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+OUTPUT_FORMATS = ('png', 'svg', 'geojson', 'json', 'archive')
+
+
+def iter_images(paths):
+    """
+    Перечисляет файлы изображений из списка файлов и каталогов
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def image_ids(paths, inputs):
+    """
+    Идентификаторы изображений для архива: пути относительно общего корня входов
+
+    Расширение сохраняется, поэтому a/img.jpg, b/img.jpg и img.png получают
+    разные идентификаторы. Разделитель - '/' на любой платформе.
+    """
+    roots = [os.path.abspath(p) if os.path.isdir(p) else os.path.dirname(os.path.abspath(p)) for p in inputs]
+    root = os.path.commonpath(roots) if roots else os.getcwd()
+    return [os.path.relpath(os.path.abspath(path), root).replace(os.sep, '/') for path in paths]
+
+
+def read_image(path):
+    """Читает изображение в RGB; None, если файл не удалось прочитать"""
+    image = cv2.imread(path)
+    if image is None:
+        return None
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+
+
+def write_result(image, mask, out_path, fmt, tolerance=1.0, soft_alpha=False):
+    """
+    Сохраняет результат обработки одного изображения
+
+    Параметры:
+    - image: исходное изображение (RGB)
+    - mask: бинарная маска объекта
+    - out_path: путь к выходному файлу
+    - fmt: 'png' (RGBA без фона) или векторный формат
+    - tolerance: допуск упрощения полигонов в пикселях
+    - soft_alpha: для PNG - мягкая альфа на границе вместо жесткой маски
+    """
+    if fmt == 'png':
+        result_bgra = cv2.cvtColor(image, cv2.COLOR_RGB2BGRA)
+        result_bgra[:, :, 3] = matte.soft_alpha(image, mask) if soft_alpha else mask
+        return cv2.imwrite(out_path, result_bgra)
+
+    polygons = vector.mask_to_polygons(mask, tolerance)
+    vector.save_polygons(out_path, polygons, mask.shape, fmt)
+    return True
+
+
+def process_image(path, detector, out_dir, fmt, tolerance=1.0, result_cache=None, working_pixels=0,
+                  soft_alpha=False, sink=None, image_id=None):
+    """
+    Обрабатывает одно изображение
+
+    Если задан result_cache, маска ищется в кеше по хешу файла и параметрам;
+    для векторных форматов при попадании изображение даже не декодируется.
+    Если working_pixels > 0, изображения большего размера обрабатываются
+    на рабочем разрешении. Если задан sink (archive.ArchiveSink), маска,
+    контуры и метаданные дописываются в архив вместо отдельного файла
+    под идентификатором image_id (см. image_ids; по умолчанию - путь).
+
+    Возвращает:
+    - out_path: путь к результату (для архива - каталог#идентификатор) или None при ошибке
+    """
+    mask = None
+    key = None
+    if result_cache is not None:
+        try:
+            params = dict(detector.params(), working_pixels=working_pixels)
+            key = cache.make_key(cache.file_digest(path), params)
+        except OSError:
+            return None
+        cached = result_cache.get(key)
+        if cached is not None:
+            mask = cached['mask']
+
+    image = None
+    if mask is None or fmt == 'png':
+        image = read_image(path)
+        if image is None:
+            return None
+
+    if mask is None:
+        if working_pixels > 0:
+            _, mask = adaptive.detect_edges_adaptive(detector, image, working_pixels=working_pixels)
+        else:
+            # Нужна только маска: изображение с границами не строится
+            mask = detector.detect(image).mask
+        if result_cache is not None:
+            result_cache.put(key, mask)
+
+    if sink is not None:
+        image_id = image_id or path
+        metadata = {'source': path, 'params': detector.params(), 'area': int(cv2.countNonZero(mask))}
+        sink.write(image_id, mask, metadata)
+        return f"{out_dir}#{image_id}"
+
+    stem = os.path.splitext(os.path.basename(path))[0]
+    out_path = os.path.join(out_dir, f"{stem}.{fmt}")
+    if not write_result(image, mask, out_path, fmt, tolerance, soft_alpha):
+        return None
+    return out_path
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Пакетное выделение объектов на изображениях")
+    parser.add_argument('inputs', nargs='+', help="файлы изображений или каталоги")
+    parser.add_argument('-o', '--output', required=True, help="каталог для результатов")
+    parser.add_argument('--threshold1', type=int, default=50, help="нижний порог Canny")
+    parser.add_argument('--threshold2', type=int, default=150, help="верхний порог Canny")
+    parser.add_argument('--blur', type=int, default=5, help="размер ядра Gaussian blur")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='png',
+                        help="формат результата: PNG без фона, векторные полигоны или архив "
+                             "(маски, контуры и метаданные в шардах с индексом)")
+    parser.add_argument('--archive-encoding', choices=('png', 'rle'), default='png',
+                        help="кодирование масок в архиве")
+    parser.add_argument('--shard-size', type=int, default=256,
+                        help="размер шарда архива в мегабайтах")
+    parser.add_argument('--no-contours', action='store_true',
+                        help="не сохранять контуры в архив")
+    parser.add_argument('--tolerance', type=float, default=1.0,
+                        help="допуск упрощения полигонов в пикселях")
+    parser.add_argument('--soft-alpha', action='store_true',
+                        help="мягкие края в PNG: альфа-матирование в полосе вдоль контура")
+    parser.add_argument('--working-size', type=float, default=0, metavar='MP',
+                        help="рабочее разрешение в мегапикселях для больших изображений (0 - полное)")
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help="число параллельно обрабатываемых изображений (0 - по числу ядер)")
+    parser.add_argument('--cache', metavar='DIR',
+                        help="каталог дискового кеша результатов (по умолчанию кеш не используется)")
+    parser.add_argument('--cache-size', type=int, default=1024,
+                        help="максимальный объем кеша в мегабайтах")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    os.makedirs(args.output, exist_ok=True)
+
+    detector = canny.CannyEdgeDetector(args.threshold1, args.threshold2, args.blur)
+    result_cache = None
+    if args.cache:
+        result_cache = cache.ResultCache(args.cache, args.cache_size * 1024 * 1024)
+
+    paths = list(iter_images(args.inputs))
+    ids = image_ids(paths, args.inputs)
+    sink = None
+    if args.format == 'archive':
+        # Повторная запись под тем же идентификатором заменила бы прежнюю
+        duplicates = sorted(image_id for image_id, count in Counter(ids).items() if count > 1)
+        if duplicates:
+            print(f"Повторяющиеся изображения: {', '.join(duplicates)}", file=sys.stderr)
+            return 2
+        sink = archive.ArchiveSink(
+            args.output, args.shard_size * 1024 * 1024, args.archive_encoding,
+            tolerance=args.tolerance, contours=not args.no_contours
+        )
+
+    # Ядра делятся между изображениями и внутренними потоками OpenCV;
+    # детектор неизменяем и используется всеми потоками совместно
+    budget = threads.set_thread_budget(args.workers or None)
+    process = partial(
+        process_image, detector=detector, out_dir=args.output, fmt=args.format,
+        tolerance=args.tolerance, result_cache=result_cache,
+        working_pixels=int(args.working_size * 1_000_000), soft_alpha=args.soft_alpha, sink=sink
+    )
+
+    processed = failed = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=budget.workers) as executor:
+        results = executor.map(lambda path, image_id: process(path, image_id=image_id), paths, ids)
+        for path, out_path in zip(paths, results):
+            if out_path:
+                processed += 1
+            else:
+                failed += 1
+                print(f"Ошибка: {path}", file=sys.stderr)
+    if sink is not None:
+        sink.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Обработано: {processed}, ошибок: {failed}, время: {elapsed:.2f} с")
+    if result_cache is not None:
+        stats = result_cache.stats()
+        print(f"Кеш: попаданий {stats['hits']}, промахов {stats['misses']}, "
+              f"записей {stats['entries']}, объем {stats['bytes'] / 1024 / 1024:.1f} МБ")
+    return 0 if failed == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
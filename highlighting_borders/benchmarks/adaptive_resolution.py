@@ -0,0 +1,79 @@
+"""
+Бенчмарк обнаружения на рабочем разрешении против полного
+
+Изображение увеличивается до заданного числа мегапикселей (так
+проверяется стоимость больших снимков без больших файлов), затем
+сравниваются время edges_and_mask на полном разрешении и
+detect_edges_adaptive, а также совпадение масок (IoU и доля
+отличающихся пикселей). Печатается и разбивка времени по стадиям
+адаптивного обнаружения.
+
+Запуск из каталога highlighting_borders:
+    python benchmarks/adaptive_resolution.py --image farm.png --megapixels 20 60
+"""
+
+import argparse
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+
+from algorithms import adaptive  # noqa: E402
+from algorithms.canny import CannyEdgeDetector  # noqa: E402
+from thread_scaling import load_image  # noqa: E402
+
+
+def timed(func, *args, repeat=3):
+    """Минимальное время вызова (мс) и результат последнего вызова"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Рабочее разрешение против полного')
+    parser.add_argument('--image', help='файл изображения (по умолчанию синтетическое)')
+    parser.add_argument('--megapixels', type=float, nargs='+', default=[20, 60], help='размеры входа')
+    parser.add_argument('--working-size', type=float, default=2, help='рабочее разрешение, мегапикселей')
+    parser.add_argument('--repeat', type=int, default=3, help='число повторов (берется лучшее время)')
+    args = parser.parse_args()
+
+    source = load_image(args.image, 2048)
+    detector = CannyEdgeDetector()
+    working_pixels = int(args.working_size * 1_000_000)
+
+    for megapixels in args.megapixels:
+        factor = (megapixels * 1_000_000 / (source.shape[0] * source.shape[1])) ** 0.5
+        image = cv2.resize(source, None, fx=factor, fy=factor, interpolation=cv2.INTER_CUBIC)
+
+        full_ms, (_, full_mask) = timed(detector.edges_and_mask, image, repeat=args.repeat)
+        adaptive_ms, (_, mask) = timed(
+            adaptive.detect_edges_adaptive, detector, image, None, None, working_pixels, repeat=args.repeat
+        )
+
+        both = np.count_nonzero(full_mask & mask)
+        either = np.count_nonzero(full_mask | mask)
+        differ = np.count_nonzero(full_mask != mask) / full_mask.size
+        print(f"{image.shape[1]}x{image.shape[0]} ({megapixels:g} МП): полное {full_ms:.0f} мс, "
+              f"рабочее {adaptive_ms:.0f} мс ({full_ms / adaptive_ms:.1f}x), "
+              f"IoU {both / either if either else 1.0:.3f}, отличается {differ:.2%} пикселей")
+
+        scale = adaptive.working_scale(image.shape, working_pixels)
+        down_ms, small = timed(adaptive.downscale, image, scale, repeat=args.repeat)
+        detect_ms, (small_edges, small_mask) = timed(detector.edges_and_mask, small, repeat=args.repeat)
+        edges_ms, _ = timed(adaptive.upsample_edges, small_edges, image.shape, repeat=args.repeat)
+        mask_ms, _ = timed(adaptive.upsample_mask, image, small_mask, small, repeat=args.repeat)
+        print(f"    уменьшение {down_ms:.0f} мс, обнаружение {detect_ms:.0f} мс, "
+              f"границы {edges_ms:.0f} мс, маска с уточнением {mask_ms:.0f} мс")
+
+
+if __name__ == '__main__':
+    main()
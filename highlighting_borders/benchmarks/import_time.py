@@ -0,0 +1,67 @@
+"""
+Бенчмарк холодного старта: время импорта основных модулей
+
+Каждый импорт выполняется в отдельном процессе интерпретатора,
+поэтому измеряется именно холодная загрузка.
+
+Запуск из каталога highlighting_borders:
+    python benchmarks/import_time.py --repeat 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = [
+    ('python (пустой)', 'pass'),
+    ('algorithms', 'import algorithms'),
+    ('algorithms.canny', 'import algorithms.canny'),
+    ('CannyEdgeDetector()', 'from algorithms import CannyEdgeDetector; CannyEdgeDetector()'),
+    ('gui.main_window', 'import gui.main_window'),
+]
+
+
+def measure(code, repeat):
+    """
+    Измеряет время выполнения кода в новом процессе
+
+    Возвращает:
+    - timings: список времен в миллисекундах или None, если импорт не удался
+    """
+    script = (
+        'import time; _t = time.perf_counter(); '
+        f'{code}; '
+        'print((time.perf_counter() - _t) * 1000)'
+    )
+    timings = []
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, '-c', script],
+            cwd=PROJECT_ROOT, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            return None
+        timings.append(float(proc.stdout.strip().splitlines()[-1]))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Время холодного импорта модулей')
+    parser.add_argument('--repeat', type=int, default=5, help='количество запусков на цель')
+    args = parser.parse_args()
+
+    print(f"{'цель':<24}{'медиана, мс':>14}{'мин, мс':>12}")
+    for name, code in TARGETS:
+        timings = measure(code, args.repeat)
+        if timings is None:
+            print(f"{name:<24}{'недоступно':>14}")
+            continue
+        print(f"{name:<24}{statistics.median(timings):>14.1f}{min(timings):>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
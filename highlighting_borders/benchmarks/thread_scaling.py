@@ -0,0 +1,95 @@
+"""
+Бенчмарк масштабирования: пропускная способность в зависимости от числа потоков
+
+Один неизменяемый CannyEdgeDetector используется всеми потоками пула.
+Для каждого числа исполнителей ядра делятся политикой
+algorithms.threads (потоки OpenCV = ядра // исполнители), и измеряется
+число изображений в секунду. При отсутствии переподписки рост должен
+быть близок к линейному вплоть до числа ядер.
+
+Запуск из каталога highlighting_borders:
+    python benchmarks/thread_scaling.py --image farm.png --count 32
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+
+from algorithms.canny import CannyEdgeDetector  # noqa: E402
+from algorithms.threads import available_cores, set_thread_budget  # noqa: E402
+
+
+def load_image(path, size):
+    """Изображение из файла или синтетическое изображение size x size"""
+    if path:
+        image = cv2.imread(path)
+        if image is None:
+            raise SystemExit(f"Не удалось прочитать {path}")
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    rng = np.random.default_rng(0)
+    image = np.full((size, size, 3), 60, dtype=np.uint8)
+    cv2.circle(image, (size // 2, size // 2), size // 3, (190, 170, 150), -1)
+    noise = rng.integers(-20, 20, image.shape, dtype=np.int16)
+    return np.clip(image.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def run(detector, image, workers, count):
+    """
+    Обрабатывает count копий изображения пулом из workers потоков
+
+    Возвращает:
+    - throughput: изображений в секунду
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Прогрев: создание потоков и первые вызовы OpenCV
+        list(executor.map(lambda _: detector.detect_edges(image), range(workers)))
+
+        start = time.perf_counter()
+        list(executor.map(lambda _: detector.detect_edges(image), range(count)))
+        elapsed = time.perf_counter() - start
+    return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Масштабирование по числу потоков')
+    parser.add_argument('--image', help='файл изображения (по умолчанию синтетическое)')
+    parser.add_argument('--size', type=int, default=2048, help='размер синтетического изображения')
+    parser.add_argument('--count', type=int, default=32, help='изображений на замер')
+    parser.add_argument('--max-workers', type=int, default=None, help='по умолчанию число ядер')
+    parser.add_argument('--no-budget', action='store_true',
+                        help='не ограничивать потоки OpenCV (для сравнения с переподпиской)')
+    args = parser.parse_args()
+
+    image = load_image(args.image, args.size)
+    detector = CannyEdgeDetector()
+    cores = available_cores()
+    default_threads = cv2.getNumThreads()
+
+    print(f"ядер: {cores}, изображение: {image.shape[1]}x{image.shape[0]}")
+    print(f"{'потоков':>8}{'OpenCV':>8}{'изобр/с':>10}{'ускорение':>11}{'эффективность':>15}")
+
+    base = None
+    for workers in range(1, (args.max_workers or cores) + 1):
+        if args.no_budget:
+            cv2.setNumThreads(default_threads)
+            opencv_threads = default_threads
+        else:
+            opencv_threads = set_thread_budget(workers, cores).opencv_threads
+
+        throughput = run(detector, image, workers, args.count)
+        base = base or throughput
+        speedup = throughput / base
+        print(f"{workers:>8}{opencv_threads:>8}{throughput:>10.1f}{speedup:>11.2f}{speedup / workers:>15.0%}")
+
+
+if __name__ == '__main__':
+    main()
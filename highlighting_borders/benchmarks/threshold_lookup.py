@@ -0,0 +1,75 @@
+"""
+Бенчмарк карты силы границ: нижний порог Canny поиском вместо пересчета
+
+Для фиксированных размытия и верхнего порога строится EdgeStrengthMap,
+затем для каждого threshold1 из диапазона границы берутся из карты
+и сравниваются с cv2.Canny (должны совпасть попиксельно). Печатается
+стоимость построения карты, среднее время Canny и поиска и число
+движений слайдера, после которого карта окупается.
+
+Запуск из каталога highlighting_borders:
+    python benchmarks/threshold_lookup.py --image farm.png --threshold2 150
+"""
+
+import argparse
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+
+from algorithms.canny import CannyEdgeDetector  # noqa: E402
+from thread_scaling import load_image  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нижний порог Canny через карту силы границ')
+    parser.add_argument('--image', help='файл изображения (по умолчанию синтетическое)')
+    parser.add_argument('--size', type=int, default=2048, help='размер синтетического изображения')
+    parser.add_argument('--threshold2', type=int, default=150, help='верхний порог')
+    parser.add_argument('--blur', type=int, default=5, help='размер ядра размытия')
+    parser.add_argument('--step', type=int, default=1, help='шаг перебора threshold1')
+    args = parser.parse_args()
+
+    image = load_image(args.image, args.size)
+    detector = CannyEdgeDetector(0, args.threshold2, args.blur)
+    blurred = detector.blurred_gray(image)
+
+    start = time.perf_counter()
+    strength = detector.strength_map(image, blurred)
+    build = time.perf_counter() - start
+
+    canny_time = lookup_time = 0.0
+    mismatches = 0
+    thresholds = range(0, args.threshold2 + 1, args.step)
+    for threshold1 in thresholds:
+        current = detector.replace(threshold1=threshold1)
+
+        start = time.perf_counter()
+        expected = current.canny_edges(image, blurred)
+        canny_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        edges = current.canny_edges(image, blurred, strength)
+        lookup_time += time.perf_counter() - start
+
+        mismatches += int(np.count_nonzero(edges != expected))
+
+    count = len(thresholds)
+    canny_ms = canny_time / count * 1000
+    lookup_ms = lookup_time / count * 1000
+    print(f"изображение: {image.shape[1]}x{image.shape[0]}, threshold2={args.threshold2}, blur={detector.blur_size}")
+    print(f"построение карты: {build * 1000:.1f} мс")
+    print(f"Canny: {canny_ms:.2f} мс, поиск: {lookup_ms:.2f} мс ({canny_ms / lookup_ms:.1f}x)")
+    print(f"карта окупается после {build * 1000 / max(canny_ms - lookup_ms, 1e-9):.0f} движений threshold1")
+    print(f"несовпадающих пикселей с cv2.Canny: {mismatches} (порогов проверено: {count})")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""
+Оценка пресетов параметров на размеченном наборе изображений
+
+Каждое изображение обрабатывается всеми пресетами (общие стадии
+считаются один раз), маски сравниваются с эталонными, итог - таблица
+пресетов, упорядоченная по выбранной метрике.
+
+Эталон для photos/item.jpg - маска truth/item.png: одноканальная
+или PNG без фона (маской служит альфа-канал).
+
+Пример:
+    python evaluate.py photos/ --truth truth/ --presets rules.json -j 4
+    python evaluate.py photos/ --truth truth/ --threshold1 20 40 60 --threshold2 100 150 --blur 3 5 \\
+        --csv per_image.csv --json summary.json
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from algorithms.lazy import lazy_import
+from batch import iter_images, read_image
+
+canny = lazy_import('algorithms.canny')
+evaluation = lazy_import('algorithms.evaluation')
+thumbnails = lazy_import('algorithms.thumbnails')
+threads = lazy_import('algorithms.threads')
+
+# Для ошибки площади лучше меньшее значение
+LOWER_IS_BETTER = ('area_error',)
+
+
+def load_presets(path):
+    """
+    Читает пресеты из JSON: {"имя": {"threshold1": .., "threshold2": .., "blur_size": ..}}
+    или файл правил watch.py (пресеты в ключе "presets")
+    """
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return data.get('presets', data)
+
+
+def grid_presets(thresholds1, thresholds2, blurs):
+    """Пресеты - все сочетания перечисленных значений параметров"""
+    return {
+        f"t1={t1} t2={t2} blur={blur}": {'threshold1': t1, 'threshold2': t2, 'blur_size': blur}
+        for t1, t2, blur in itertools.product(thresholds1, thresholds2, blurs)
+    }
+
+
+def evaluate_image(path, truth_dir, detectors, tolerance):
+    """
+    Оценивает все детекторы на одном изображении
+
+    Возвращает:
+    - список словарей метрик в порядке detectors или строку с описанием ошибки
+    """
+    truth_path = thumbnails.find_result(path, truth_dir)
+    if truth_path is None:
+        return "нет эталонной маски"
+    truth_mask = thumbnails.load_mask(truth_path)
+    image = read_image(path)
+    if image is None or truth_mask is None:
+        return "не удалось прочитать изображение или эталон"
+    if image.shape[:2] != truth_mask.shape[:2]:
+        return f"размер эталона {truth_mask.shape[1]}x{truth_mask.shape[0]} не совпадает с изображением"
+
+    truth = evaluation.GroundTruth(truth_mask, tolerance)
+    return evaluation.evaluate_presets(image, truth, detectors)
+
+
+def summarize(names, per_image, sort_by):
+    """
+    Сводка по пресетам, упорядоченная по метрике sort_by (лучшие первыми)
+
+    Параметры:
+    - names: имена пресетов
+    - per_image: список результатов evaluate_image (только успешные)
+    - sort_by: метрика из evaluation.METRICS
+
+    Возвращает:
+    - список словарей: preset, mean_iou, median_iou, min_iou, mean_boundary_f,
+      mean_area_error, empty (число пустых масок)
+    """
+    summary = []
+    for index, name in enumerate(names):
+        rows = [results[index] for results in per_image]
+        iou = [row['iou'] for row in rows]
+        summary.append({
+            'preset': name,
+            'mean_iou': statistics.fmean(iou),
+            'median_iou': statistics.median(iou),
+            'min_iou': min(iou),
+            'mean_boundary_f': statistics.fmean(row['boundary_f'] for row in rows),
+            'mean_area_error': statistics.fmean(row['area_error'] for row in rows),
+            'empty': sum(row['empty'] for row in rows),
+        })
+
+    key = f"mean_{sort_by}"
+    summary.sort(key=lambda row: row[key], reverse=sort_by not in LOWER_IS_BETTER)
+    return summary
+
+
+def print_report(summary, limit=None):
+    print(f"{'#':>3}  {'IoU':>6} {'медиана':>8} {'мин':>6} {'F гран.':>8} {'ош. площ.':>10} {'пусто':>6}  пресет")
+    for rank, row in enumerate(summary[:limit] if limit else summary, 1):
+        print(f"{rank:>3}  {row['mean_iou']:>6.3f} {row['median_iou']:>8.3f} {row['min_iou']:>6.3f} "
+              f"{row['mean_boundary_f']:>8.3f} {row['mean_area_error']:>10.3f} {row['empty']:>6}  {row['preset']}")
+
+
+def write_csv(path, names, paths, per_image):
+    """Метрики каждого пресета на каждом изображении"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['image', 'preset', 'iou', 'boundary_f', 'boundary_precision', 'boundary_recall',
+                         'area_error', 'empty'])
+        for image_path, results in zip(paths, per_image):
+            for name, row in zip(names, results):
+                writer.writerow([image_path, name, f"{row['iou']:.6f}", f"{row['boundary_f']:.6f}",
+                                 f"{row['boundary_precision']:.6f}", f"{row['boundary_recall']:.6f}",
+                                 f"{row['area_error']:.6f}", int(row['empty'])])
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Оценка пресетов параметров по эталонным маскам")
+    parser.add_argument('inputs', nargs='+', help="файлы изображений или каталоги")
+    parser.add_argument('--truth', required=True, help="каталог эталонных масок (имя изображения + .png)")
+    parser.add_argument('--presets', help="JSON с пресетами (как в файле правил watch.py)")
+    parser.add_argument('--threshold1', type=int, nargs='+', default=[50], help="значения нижнего порога для сетки")
+    parser.add_argument('--threshold2', type=int, nargs='+', default=[150], help="значения верхнего порога для сетки")
+    parser.add_argument('--blur', type=int, nargs='+', default=[5], help="значения размера ядра размытия для сетки")
+    parser.add_argument('--tolerance', type=int, default=2,
+                        help="допуск F-меры по границе в пикселях")
+    parser.add_argument('--sort', choices=('iou', 'boundary_f', 'area_error'), default='iou',
+                        help="метрика для упорядочивания пресетов")
+    parser.add_argument('--top', type=int, default=0, help="показать только лучшие N пресетов")
+    parser.add_argument('-j', '--workers', type=int, default=0,
+                        help="число параллельно обрабатываемых изображений (0 - по числу ядер)")
+    parser.add_argument('--csv', help="сохранить метрики по изображениям в CSV")
+    parser.add_argument('--json', help="сохранить сводку по пресетам в JSON")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.presets:
+        presets = load_presets(args.presets)
+    else:
+        presets = grid_presets(args.threshold1, args.threshold2, args.blur)
+    names = list(presets)
+    detectors = [
+        canny.CannyEdgeDetector(p['threshold1'], p['threshold2'], p['blur_size']) for p in presets.values()
+    ]
+
+    budget = threads.set_thread_budget(args.workers or None)
+    process = partial(evaluate_image, truth_dir=args.truth, detectors=detectors, tolerance=args.tolerance)
+
+    paths = list(iter_images(args.inputs))
+    evaluated = []
+    per_image = []
+    skipped = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=budget.workers) as executor:
+        for path, results in zip(paths, executor.map(process, paths)):
+            if isinstance(results, str):
+                skipped += 1
+                print(f"Пропущено: {path}: {results}", file=sys.stderr)
+                continue
+            evaluated.append(path)
+            per_image.append(results)
+    elapsed = time.perf_counter() - start
+
+    print(f"Изображений: {len(evaluated)}, пропущено: {skipped}, пресетов: {len(names)}, "
+          f"время: {elapsed:.1f} с ({len(evaluated) * len(names) / max(elapsed, 1e-9):.1f} масок/с)")
+    if not per_image:
+        return 1
+
+    summary = summarize(names, per_image, args.sort)
+    print_report(summary, args.top)
+
+    if args.csv:
+        write_csv(args.csv, names, evaluated, per_image)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'presets': presets, 'sort': args.sort, 'images': len(evaluated), 'ranking': summary},
+                      f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
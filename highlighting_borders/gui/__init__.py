@@ -2,7 +2,20 @@
 Модуль графического интерфейса пользователя
 """
 
-from .main_window import MainWindow
-from .canvas import ImageCanvas
+import importlib
 
-__all__ = ['MainWindow', 'ImageCanvas']
\ No newline at end of file
+_EXPORTS = {
+    'MainWindow': '.main_window',
+    'ImageCanvas': '.canvas',
+    'GalleryView': '.gallery',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
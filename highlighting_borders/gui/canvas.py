@@ -1,7 +1,9 @@
 from PyQt5.QtWidgets import QLabel
 from PyQt5.QtCore import Qt, QPoint, QRect
-from PyQt5.QtGui import QImage, QPixmap, QPainter, QPen, QColor, QPolygon, QBrush
-import numpy as np
+from PyQt5.QtGui import QPixmap, QPainter, QPen, QColor, QPolygon, QBrush
+
+from gui.pyramid import TilePyramid
+from gui.tracing import tracer
 
 
 class ImageCanvas(QLabel):
@@ -13,7 +15,9 @@ class ImageCanvas(QLabel):
         self.setMinimumSize(800, 600)
 
         self.image = None
-        self.pixmap = None
+        self.pyramid = None
+        self.overlay_pyramid = None
+        self.selection_pyramid = None
         self.mode = "view"
         self.mask = None
         self.region_mode = "include"  # include или exclude
@@ -32,17 +36,107 @@ class ImageCanvas(QLabel):
         self.current_line = []
         self.drawing_line = False
 
+        # Привязка линий к границам (LiveWire), еще не зафиксированный участок пути
+        # и участок до опорной точки, карта которой строится в фоне
+        self.livewire = None
+        self.livewire_path = []
+        self.livewire_handoff = []
+
         # Параметры масштабирования
         self.scale_x = 1.0
         self.scale_y = 1.0
         self.offset_x = 0
         self.offset_y = 0
 
+        # Область просмотра: зум относительно вписывания и центр в координатах изображения
+        self.zoom = 1.0
+        self.view_center = None
+        self.panning = False
+        self.pan_anchor = None
+
         self.setMouseTracking(True)
 
-    def set_image(self, image):
-        """Устанавливает изображение (numpy array RGB)"""
+    MIN_ZOOM = 1.0
+    MAX_ZOOM = 64.0
+    ZOOM_STEP = 1.25
+
+    SELECTION_COLOR = (0, 160, 255)
+    SELECTION_OPACITY = 0.35
+
+    def set_image(self, image, overlay=None):
+        """
+        Устанавливает изображение (numpy array RGB)
+
+        overlay - необязательная одноканальная карта (например, границ),
+        которая рисуется зеленым поверх изображения без создания его копии.
+        Изображение под наложением считается неизменным, поэтому его
+        пирамида переиспользуется между вызовами.
+        """
+        if self.image is None or self.image.shape[:2] != image.shape[:2]:
+            self.zoom = 1.0
+            self.view_center = None
+        if overlay is None or self.pyramid is None or self.pyramid.levels[0] is not image:
+            self.pyramid = TilePyramid(image)
         self.image = image
+        self.overlay_pyramid = TilePyramid(overlay) if overlay is not None else None
+        self.update_display()
+
+    def reset_view(self):
+        """Возвращает масштаб по размеру окна"""
+        self.zoom = 1.0
+        self.view_center = None
+        self.update_display()
+
+    def display_scale(self):
+        """Масштаб отображения: пикселей виджета на пиксель изображения"""
+        h, w = self.image.shape[:2]
+        fit = min(self.width() / w, self.height() / h)
+        return fit * self.zoom
+
+    def update_viewport(self):
+        """Пересчитывает преобразование изображение <-> виджет для текущих зума и панорамы"""
+        h, w = self.image.shape[:2]
+        scale = self.display_scale()
+
+        if self.view_center is None:
+            self.view_center = (w / 2, h / 2)
+
+        # Не даем увести изображение за пределы окна
+        cx, cy = self.view_center
+        half_w = self.width() / (2 * scale)
+        half_h = self.height() / (2 * scale)
+        cx = w / 2 if half_w * 2 >= w else min(max(cx, half_w), w - half_w)
+        cy = h / 2 if half_h * 2 >= h else min(max(cy, half_h), h - half_h)
+        self.view_center = (cx, cy)
+
+        self.offset_x = self.width() / 2 - cx * scale
+        self.offset_y = self.height() / 2 - cy * scale
+        self.scale_x = 1.0 / scale
+        self.scale_y = 1.0 / scale
+
+    def zoom_at(self, widget_pos, factor):
+        """Меняет зум, оставляя точку изображения под widget_pos на месте"""
+        if self.image is None:
+            return
+
+        self.update_viewport()
+        img_x = (widget_pos.x() - self.offset_x) * self.scale_x
+        img_y = (widget_pos.y() - self.offset_y) * self.scale_y
+
+        self.zoom = min(max(self.zoom * factor, self.MIN_ZOOM), self.MAX_ZOOM)
+        scale = self.display_scale()
+        self.view_center = (
+            img_x - (widget_pos.x() - self.width() / 2) / scale,
+            img_y - (widget_pos.y() - self.height() / 2) / scale
+        )
+        self.update_display()
+
+    def pan_by(self, dx, dy):
+        """Сдвигает область просмотра на (dx, dy) пикселей виджета"""
+        if self.view_center is None:
+            return
+        cx, cy = self.view_center
+        self.view_center = (cx - dx * self.scale_x, cy - dy * self.scale_y)
         self.update_display()
 
     def set_mode(self, mode):
@@ -57,6 +151,16 @@ class ImageCanvas(QLabel):
         """Устанавливает маску"""
         self.mask = mask
 
+    def set_selection(self, mask):
+        """
+        Показывает выбранные объекты полупрозрачной заливкой (None - скрыть)
+
+        Маска может меняться на месте, поэтому пирамида создается заново:
+        уровни и тайлы строятся лениво, только для видимой части.
+        """
+        self.selection_pyramid = TilePyramid(mask, color=self.SELECTION_COLOR) if mask is not None else None
+        self.update_display()
+
     def clear_annotations(self):
         """Очищает аннотации"""
         self.start_point = None
@@ -65,6 +169,8 @@ class ImageCanvas(QLabel):
         self.current_polygon = []
         self.keep_lines = []
         self.current_line = []
+        self.livewire_path = []
+        self.livewire_handoff = []
         self.parent.rect = None
         self.parent.freeform_polygons = []
         self.parent.keep_points = []
@@ -75,38 +181,48 @@ class ImageCanvas(QLabel):
         if self.image is None:
             return
 
-        h, w = self.image.shape[:2]
-        bytes_per_line = 3 * w
-        q_image = QImage(self.image.data, w, h, bytes_per_line, QImage.Format_RGB888)
-
-        self.pixmap = QPixmap.fromImage(q_image)
-
-        # Вычисляем параметры масштабирования
         widget_width = self.width()
         widget_height = self.height()
-        pixmap_width = self.pixmap.width()
-        pixmap_height = self.pixmap.height()
-
-        scale = min(widget_width / pixmap_width, widget_height / pixmap_height)
-        scaled_width = int(pixmap_width * scale)
-        scaled_height = int(pixmap_height * scale)
-
-        self.offset_x = (widget_width - scaled_width) // 2
-        self.offset_y = (widget_height - scaled_height) // 2
-
-        self.scale_x = pixmap_width / scaled_width
-        self.scale_y = pixmap_height / scaled_height
-
-        scaled_pixmap = self.pixmap.scaled(
-            scaled_width, scaled_height, Qt.KeepAspectRatio, Qt.SmoothTransformation
-        )
+        self.update_viewport()
 
         result_pixmap = QPixmap(widget_width, widget_height)
         result_pixmap.fill(QColor(43, 43, 43))
 
         painter = QPainter(result_pixmap)
-        painter.drawPixmap(self.offset_x, self.offset_y, scaled_pixmap)
+        painter.setRenderHint(QPainter.SmoothPixmapTransform)
+        with tracer.span('tiles'):
+            self.draw_tiles(painter)
+        with tracer.span('annotations'):
+            self.draw_annotations(painter)
+        painter.end()
 
+        with tracer.span('set_pixmap'):
+            self.setPixmap(result_pixmap)
+
+    def paintEvent(self, event):
+        """Отрисовка кадра; при включенной трассировке поверх выводится сводка задержек"""
+        with tracer.span('paint'):
+            super().paintEvent(event)
+
+        if tracer.enabled:
+            self.draw_trace_overlay()
+            tracer.frame_painted()
+
+    def draw_trace_overlay(self):
+        """Рисует сводку задержек в левом верхнем углу виджета"""
+        lines = tracer.summary_lines()
+        painter = QPainter(self)
+        metrics = painter.fontMetrics()
+        line_height = metrics.height()
+        width = max(metrics.horizontalAdvance(line) for line in lines) + 12
+        painter.fillRect(QRect(4, 4, width, line_height * len(lines) + 8), QColor(0, 0, 0, 160))
+        painter.setPen(QColor(255, 255, 255))
+        for i, line in enumerate(lines):
+            painter.drawText(10, 8 + metrics.ascent() + i * line_height, line)
+        painter.end()
+
+    def draw_annotations(self, painter):
+        """Рисует области и линии аннотаций поверх изображения"""
         # Определяем цвет в зависимости от режима
         region_color = QColor(0, 128, 255) if self.region_mode == "include" else QColor(255, 128, 0)
         region_fill_color = QColor(0, 128, 255, 25) if self.region_mode == "include" else QColor(255, 128, 0, 25)
@@ -164,22 +280,53 @@ class ImageCanvas(QLabel):
                     p2 = self.image_to_widget(QPoint(int(line[i + 1][0]), int(line[i + 1][1])))
                     painter.drawLine(p1, p2)
 
-        # Рисуем текущую рисуемую линию
-        if self.current_line and len(self.current_line) > 1:
+        # Рисуем текущую рисуемую линию (вместе с незафиксированным путем livewire)
+        current_line = self.current_line + self.livewire_path[1:]
+        if current_line and len(current_line) > 1:
             pen = QPen(QColor(255, 100, 100), 3)
             painter.setPen(pen)
-            for i in range(len(self.current_line) - 1):
-                p1 = self.image_to_widget(QPoint(int(self.current_line[i][0]), int(self.current_line[i][1])))
-                p2 = self.image_to_widget(QPoint(int(self.current_line[i + 1][0]), int(self.current_line[i + 1][1])))
+            for i in range(len(current_line) - 1):
+                p1 = self.image_to_widget(QPoint(int(current_line[i][0]), int(current_line[i][1])))
+                p2 = self.image_to_widget(QPoint(int(current_line[i + 1][0]), int(current_line[i + 1][1])))
                 painter.drawLine(p1, p2)
 
-        painter.end()
-
-        self.setPixmap(result_pixmap)
+    def draw_tiles(self, painter):
+        """
+        Рисует видимые тайлы пирамиды
+
+        Стоимость зависит от размера области просмотра, а не от разрешения
+        исходного изображения: уровень пирамиды выбирается по масштабу.
+        """
+        scale = self.display_scale()
+        level = self.pyramid.level_for_scale(scale)
+
+        # Видимая часть в координатах изображения
+        x0 = -self.offset_x * self.scale_x
+        y0 = -self.offset_y * self.scale_y
+        x1 = x0 + self.width() * self.scale_x
+        y1 = y0 + self.height() * self.scale_y
+
+        for pyramid in (self.pyramid, self.overlay_pyramid, self.selection_pyramid):
+            if pyramid is None:
+                continue
+            painter.setOpacity(self.SELECTION_OPACITY if pyramid is self.selection_pyramid else 1.0)
+
+            for tx, ty, (rx0, ry0, rx1, ry1) in pyramid.visible_tiles(level, x0, y0, x1, y1):
+                # Края соседних тайлов округляются одинаково - без щелей
+                left = round(self.offset_x + rx0 * scale)
+                top = round(self.offset_y + ry0 * scale)
+                right = round(self.offset_x + rx1 * scale)
+                bottom = round(self.offset_y + ry1 * scale)
+                if right <= left or bottom <= top:
+                    continue
+
+                pixmap = pyramid.tile_pixmap(level, tx, ty)
+                painter.drawPixmap(QRect(left, top, right - left, bottom - top), pixmap)
+        painter.setOpacity(1.0)
 
     def widget_to_image(self, pos):
-        """Преобразует координаты виджета в координаты изображения"""
-        if self.pixmap is None or self.image is None:
+        """Преобразует координаты виджета в координаты изображения с учетом зума и панорамы"""
+        if self.pyramid is None or self.image is None:
             return QPoint(0, 0)
 
         x = pos.x() - self.offset_x
@@ -193,21 +340,41 @@ class ImageCanvas(QLabel):
         return QPoint(x, y)
 
     def image_to_widget(self, pos):
-        """Преобразует координаты изображения в координаты виджета"""
-        if self.pixmap is None:
+        """Преобразует координаты изображения в координаты виджета с учетом зума и панорамы"""
+        if self.pyramid is None:
             return pos
 
-        x = int(pos.x() / self.scale_x)
-        y = int(pos.y() / self.scale_y)
-
-        x += self.offset_x
-        y += self.offset_y
+        x = round(pos.x() / self.scale_x + self.offset_x)
+        y = round(pos.y() / self.scale_y + self.offset_y)
 
         return QPoint(x, y)
 
+    def wheelEvent(self, event):
+        """Зум колесом мыши относительно курсора"""
+        if self.image is None:
+            return
+
+        steps = event.angleDelta().y() / 120
+        if steps:
+            tracer.begin('wheel')
+            self.zoom_at(event.pos(), self.ZOOM_STEP ** steps)
+
+    def start_pan(self, event):
+        """Панорама: средняя кнопка в любом режиме или левая в режиме просмотра"""
+        if event.button() == Qt.MiddleButton or (self.mode == "view" and event.button() == Qt.LeftButton):
+            self.panning = True
+            self.pan_anchor = event.pos()
+            self.setCursor(Qt.ClosedHandCursor)
+            return True
+        return False
+
     def mousePressEvent(self, event):
         if self.image is None:
             return
+        tracer.begin('mouse')
+
+        if self.start_pan(event):
+            return
 
         pos = self.widget_to_image(event.pos())
 
@@ -223,19 +390,82 @@ class ImageCanvas(QLabel):
             # Начинаем НОВУЮ линию
             self.drawing_line = True
             self.current_line = [(pos.x(), pos.y())]
+            if self.livewire is not None:
+                # Карта путей строится в фоне, путь появится после poll()
+                self.livewire.start(pos.x(), pos.y())
+                self.livewire_path = []
+                self.livewire_handoff = []
+        elif self.mode == "select":
+            # Щелчок включает объект под курсором в маску или исключает его
+            self.parent.toggle_object(pos.x(), pos.y())
 
     def mouseMoveEvent(self, event):
+        if self.panning or self.drawing or self.drawing_line:
+            # Движение без нажатой кнопки кадр не перерисовывает
+            tracer.begin('mouse')
+
+        if self.panning:
+            delta = event.pos() - self.pan_anchor
+            self.pan_anchor = event.pos()
+            self.pan_by(delta.x(), delta.y())
+            return
+
         pos = self.widget_to_image(event.pos())
 
         if self.drawing and self.mode == "rect":
             self.end_point = pos
             self.update_display()
         elif self.drawing_line and self.mode == "keep":
-            self.current_line.append((pos.x(), pos.y()))
-            self.parent.keep_points.append((pos.x(), pos.y()))
+            if self.livewire is not None:
+                self.update_livewire(pos)
+            else:
+                self.current_line.append((pos.x(), pos.y()))
+                self.parent.keep_points.append((pos.x(), pos.y()))
             self.update_display()
 
+    def update_livewire(self, pos):
+        """
+        Обновляет путь livewire до курсора
+
+        Когда курсор уходит от опорной точки дальше livewire.reach, конец
+        текущего пути становится следующей опорной точкой: ее карта строится
+        в фоне, а путь до нее фиксируется, когда карта готова. До этого путь
+        считается по прежней карте, так что движение мыши не блокируется.
+        Пока строится карта первой опорной точки, пути нет.
+        """
+        if self.livewire.poll():
+            self.commit_livewire_path(self.livewire_handoff)
+            self.livewire_handoff = []
+
+        if self.livewire.anchor is None:
+            # Карта первой опорной точки штриха еще строится
+            return
+
+        self.livewire_path = self.livewire.path_to(pos.x(), pos.y())
+
+        ax, ay = self.livewire.anchor
+        far = max(abs(pos.x() - ax), abs(pos.y() - ay)) >= self.livewire.reach
+        if far and self.livewire.pending is None and len(self.livewire_path) > 1:
+            self.livewire_handoff = self.livewire_path
+            self.livewire.advance_anchor(*self.livewire_path[-1])
+
+    def commit_livewire_path(self, path=None):
+        """Переносит путь livewire (по умолчанию текущий) в текущую линию"""
+        if path is None:
+            path = self.livewire_path
+            self.livewire_path = []
+        path = path[1:]
+        self.current_line.extend(path)
+        self.parent.keep_points.extend(path)
+
     def mouseReleaseEvent(self, event):
+        tracer.begin('mouse')
+        if self.panning:
+            self.panning = False
+            self.pan_anchor = None
+            self.set_mode(self.mode)
+            return
+
         if self.drawing and self.mode == "rect":
             self.drawing = False
             self.end_point = self.widget_to_image(event.pos())
@@ -246,6 +476,15 @@ class ImageCanvas(QLabel):
             self.update_display()
         elif self.drawing_line and self.mode == "keep":
             self.drawing_line = False
+            if self.livewire is not None:
+                # Путь до курсора считан по активной карте; фоновая больше не нужна
+                self.livewire.cancel_pending()
+                self.livewire_handoff = []
+                if self.livewire.anchor is None:
+                    # Карта так и не построилась: концы штриха соединяем отрезком
+                    pos = self.widget_to_image(event.pos())
+                    self.livewire_path = [self.current_line[-1], (pos.x(), pos.y())]
+                self.commit_livewire_path()
 
             if len(self.current_line) > 1:
                 # Сохраняем завершенную линию КАК ОТДЕЛЬНУЮ ЛИНИЮ
@@ -0,0 +1,240 @@
+"""
+Галерея для просмотра результатов пакетной обработки
+"""
+
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtWidgets import QAbstractScrollArea
+from PyQt5.QtCore import Qt, QObject, QRect, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap, QPainter, QColor
+
+from algorithms.lazy import lazy_import
+
+np = lazy_import('numpy')
+thumbnails = lazy_import('algorithms.thumbnails')
+
+
+def array_to_pixmap(array):
+    """Миниатюра (RGB или оттенки серого) -> QPixmap"""
+    array = np.ascontiguousarray(array)
+    h, w = array.shape[:2]
+    if array.ndim == 2:
+        q_image = QImage(array.data, w, h, w, QImage.Format_Grayscale8)
+    else:
+        q_image = QImage(array.data, w, h, 3 * w, QImage.Format_RGB888)
+    return QPixmap.fromImage(q_image)
+
+
+class ThumbnailLoader(QObject):
+    """
+    Загрузка миниатюр в фоновых потоках
+
+    Готовая миниатюра передается в GUI-поток сигналом loaded; сигнал из
+    рабочего потока доставляется через очередь событий автоматически.
+    """
+
+    loaded = pyqtSignal(object, object)
+
+    def __init__(self, store, workers=4):
+        super().__init__()
+        self.store = store
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='thumbnails')
+        self.pending = {}
+
+    def request(self, key, path, kind):
+        """Ставит миниатюру в очередь, если она еще не запрошена"""
+        if key in self.pending:
+            return
+        future = self.executor.submit(self.store.get, path, kind)
+        self.pending[key] = future
+        future.add_done_callback(lambda f, key=key: self._done(key, f))
+
+    def _done(self, key, future):
+        if future.cancelled():
+            return
+        try:
+            thumb = future.result()
+        except Exception:
+            thumb = None
+        self.loaded.emit(key, thumb)
+
+    def finished(self, key):
+        self.pending.pop(key, None)
+
+    def cancel_except(self, keys):
+        """Отменяет запросы, не попавшие в keys (ячейки ушли из видимой области)"""
+        for key in list(self.pending):
+            if key not in keys and self.pending[key].cancel():
+                del self.pending[key]
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.pending = {}
+
+
+class GalleryView(QAbstractScrollArea):
+    """
+    Виртуализированная сетка миниатюр: исходное изображение и маска
+
+    Рисуются и загружаются только видимые ячейки, поэтому прокрутка
+    остается плавной и на десятках тысяч элементов. Готовые QPixmap
+    держатся в ограниченном LRU-кеше, файлы миниатюр - в ThumbnailStore.
+    Щелчок по ячейке испускает activated(index).
+    """
+
+    activated = pyqtSignal(int)
+
+    PADDING = 8
+    LABEL_HEIGHT = 18
+    MAX_CACHED_PIXMAPS = 1024
+
+    def __init__(self, parent=None, store=None):
+        super().__init__(parent)
+        self.setWindowTitle("Галерея результатов")
+        self.resize(1100, 750)
+        self.viewport().setStyleSheet("background-color: #2b2b2b;")
+
+        self.store = store or thumbnails.ThumbnailStore()
+        self.thumb_size = self.store.size
+        self.loader = ThumbnailLoader(self.store)
+        self.loader.loaded.connect(self.on_loaded)
+
+        self.sources = []
+        self.masks = []
+        self.pixmaps = OrderedDict()
+        self.missing = set()
+
+        self.verticalScrollBar().valueChanged.connect(self.viewport().update)
+
+    def set_items(self, sources, results_dir=None):
+        """
+        Задает элементы галереи
+
+        Параметры:
+        - sources: пути к исходным изображениям
+        - results_dir: каталог с PNG-результатами пакетной обработки (или None)
+        """
+        self.sources = list(sources)
+        self.masks = [thumbnails.find_result(path, results_dir) for path in self.sources]
+        self.pixmaps.clear()
+        self.missing.clear()
+        self.loader.cancel_except(set())
+        self.verticalScrollBar().setValue(0)
+        self.update_scrollbar()
+        self.viewport().update()
+
+    def cell_size(self):
+        width = 2 * self.thumb_size + 3 * self.PADDING
+        height = self.thumb_size + self.LABEL_HEIGHT + 2 * self.PADDING
+        return width, height
+
+    def columns(self):
+        return max(1, self.viewport().width() // self.cell_size()[0])
+
+    def update_scrollbar(self):
+        _, cell_h = self.cell_size()
+        rows = (len(self.sources) + self.columns() - 1) // self.columns()
+        bar = self.verticalScrollBar()
+        bar.setRange(0, max(0, rows * cell_h - self.viewport().height()))
+        bar.setPageStep(self.viewport().height())
+        bar.setSingleStep(cell_h // 4)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.update_scrollbar()
+
+    def visible_range(self):
+        """Индексы элементов, видимых в окне: range"""
+        _, cell_h = self.cell_size()
+        top = self.verticalScrollBar().value()
+        first_row = top // cell_h
+        last_row = (top + self.viewport().height()) // cell_h
+        cols = self.columns()
+        return range(first_row * cols, min(len(self.sources), (last_row + 1) * cols))
+
+    def cell_rect(self, index):
+        cell_w, cell_h = self.cell_size()
+        cols = self.columns()
+        row, col = divmod(index, cols)
+        return QRect(col * cell_w, row * cell_h - self.verticalScrollBar().value(), cell_w, cell_h)
+
+    def thumbnail(self, index, kind):
+        """QPixmap миниатюры из кеша или None (тогда она запрашивается в фоне)"""
+        path = self.sources[index] if kind == 'image' else self.masks[index]
+        if path is None:
+            return None
+        key = (path, kind)
+        pixmap = self.pixmaps.get(key)
+        if pixmap is not None:
+            self.pixmaps.move_to_end(key)
+            return pixmap
+        if key not in self.missing:
+            self.loader.request(key, path, kind)
+        return None
+
+    def on_loaded(self, key, thumb):
+        """Миниатюра готова (вызывается в GUI-потоке)"""
+        self.loader.finished(key)
+        if thumb is None:
+            self.missing.add(key)
+            return
+        self.pixmaps[key] = array_to_pixmap(thumb)
+        if len(self.pixmaps) > self.MAX_CACHED_PIXMAPS:
+            self.pixmaps.popitem(last=False)
+        self.viewport().update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self.viewport())
+        size = self.thumb_size
+        visible = self.visible_range()
+        wanted = set()
+
+        for index in visible:
+            rect = self.cell_rect(index)
+            x, y = rect.x() + self.PADDING, rect.y() + self.PADDING
+
+            for slot, kind in enumerate(('image', 'mask')):
+                box = QRect(x + slot * (size + self.PADDING), y, size, size)
+                painter.fillRect(box, QColor('#3a3a3a'))
+                if kind == 'mask' and self.masks[index] is None:
+                    continue
+                path = self.sources[index] if kind == 'image' else self.masks[index]
+                wanted.add((path, kind))
+                pixmap = self.thumbnail(index, kind)
+                if pixmap is not None:
+                    # Миниатюра центрируется в квадрате ячейки
+                    px = box.x() + (size - pixmap.width()) // 2
+                    py = box.y() + (size - pixmap.height()) // 2
+                    painter.drawPixmap(px, py, pixmap)
+
+            painter.setPen(QColor('#bbbbbb'))
+            label = QRect(x, y + size + 2, rect.width() - 2 * self.PADDING, self.LABEL_HEIGHT)
+            name = painter.fontMetrics().elidedText(os.path.basename(self.sources[index]), Qt.ElideMiddle, label.width())
+            painter.drawText(label, Qt.AlignLeft | Qt.AlignVCenter, name)
+
+        painter.end()
+
+        # Запросы для ячеек, ушедших из видимой области, больше не нужны
+        self.loader.cancel_except(wanted)
+
+    def index_at(self, pos):
+        """Индекс элемента под точкой виджета или -1"""
+        cell_w, cell_h = self.cell_size()
+        col = pos.x() // cell_w
+        if col >= self.columns():
+            return -1
+        row = (pos.y() + self.verticalScrollBar().value()) // cell_h
+        index = row * self.columns() + col
+        return index if 0 <= index < len(self.sources) else -1
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            index = self.index_at(event.pos())
+            if index >= 0:
+                self.activated.emit(index)
+
+    def closeEvent(self, event):
+        self.loader.cancel_except(set())
+        super().closeEvent(event)
@@ -1,6 +1,3 @@
-import cv2
-import numpy as np
-import sys
 import os
 
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
@@ -9,19 +6,35 @@ from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QRadioButton, QButtonGroup)
 from PyQt5.QtCore import Qt
 
-current_dir = os.path.dirname(os.path.abspath(__file__))
-project_root = os.path.dirname(current_dir)
-if project_root not in sys.path:
-    sys.path.insert(0, project_root)
-
 from gui.canvas import ImageCanvas
-from algorithms.canny import CannyEdgeDetector
+from gui.tracing import tracer
+from algorithms.lazy import lazy_import, preload
+
+# OpenCV и NumPy загружаются при первом обращении, чтобы окно
+# появлялось до инициализации тяжелых подсистем
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+canny = lazy_import('algorithms.canny')
+refine = lazy_import('algorithms.refine')
+incremental = lazy_import('algorithms.incremental')
+memory = lazy_import('algorithms.memory')
+vector = lazy_import('algorithms.vector')
+livewire = lazy_import('algorithms.livewire')
+cache = lazy_import('algorithms.cache')
+prefetch = lazy_import('algorithms.prefetch')
+adaptive = lazy_import('algorithms.adaptive')
+matte = lazy_import('algorithms.matte')
+thumbnails = lazy_import('algorithms.thumbnails')
+overrides = lazy_import('algorithms.overrides')
+selection = lazy_import('algorithms.selection')
+detection = lazy_import('algorithms.detection')
 
 
 class MainWindow(QMainWindow):
     DEFAULT_THRESHOLD1 = 50
     DEFAULT_THRESHOLD2 = 150
     DEFAULT_BLUR_SIZE = 5
+    VECTOR_TOLERANCE = 1.0
 
     def __init__(self):
         super().__init__()
@@ -31,8 +44,20 @@ class MainWindow(QMainWindow):
         self.original_image = None
         self.current_image = None
         self.mask = None
+        self.edges = None
+        self.selection = None
+        self.result = None
+        self.pipeline = None
+        self.pipeline_scale = 1.0
+        self.scratch = None
+        self.image_digest = None
+        self.result_cache = None
+        self.prefetcher = None
+        self.folder_index = 0
+        self.gallery = None
         self.rect = None
         self.freeform_polygons = []
+        self.region_params = {}
         self.keep_points = []
         self.mode = "view"
         self.region_mode = "include"
@@ -42,9 +67,20 @@ class MainWindow(QMainWindow):
         self.blur_size = self.DEFAULT_BLUR_SIZE
 
         self.auto_update = False
+        self.refine_enabled = False
+        self.adaptive_enabled = False
+        self.soft_alpha = False
+        self.low_memory = False
+        self.snap_enabled = False
+        self.cache_enabled = True
 
         self.init_ui()
 
+    def warm_up(self):
+        """Загружает отложенные модули после показа окна"""
+        preload(cv2, np, canny, refine, incremental, memory, vector, livewire, cache, prefetch, adaptive, matte,
+                thumbnails, overrides, selection, detection)
+
     def init_ui(self):
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
@@ -71,6 +107,45 @@ class MainWindow(QMainWindow):
         load_btn.clicked.connect(self.load_image)
         file_layout.addWidget(load_btn)
 
+        open_folder_btn = QPushButton("Открыть папку")
+        open_folder_btn.clicked.connect(self.open_folder)
+        file_layout.addWidget(open_folder_btn)
+
+        gallery_btn = QPushButton("Галерея результатов")
+        gallery_btn.clicked.connect(self.open_gallery)
+        file_layout.addWidget(gallery_btn)
+
+        nav_layout = QHBoxLayout()
+        self.prev_btn = QPushButton("◀ Предыдущее")
+        self.prev_btn.clicked.connect(lambda: self.show_folder_image(self.folder_index - 1))
+        self.prev_btn.setEnabled(False)
+        nav_layout.addWidget(self.prev_btn)
+
+        self.next_btn = QPushButton("Следующее ▶")
+        self.next_btn.clicked.connect(lambda: self.show_folder_image(self.folder_index + 1))
+        self.next_btn.setEnabled(False)
+        nav_layout.addWidget(self.next_btn)
+        file_layout.addLayout(nav_layout)
+
+        self.folder_label = QLabel("")
+        self.folder_label.setWordWrap(True)
+        self.folder_label.setStyleSheet("color: #888; font-size: 10px;")
+        file_layout.addWidget(self.folder_label)
+
+        self.low_memory_checkbox = QCheckBox("Режим экономии памяти")
+        self.low_memory_checkbox.setChecked(False)
+        self.low_memory_checkbox.stateChanged.connect(self.toggle_low_memory)
+        file_layout.addWidget(self.low_memory_checkbox)
+
+        self.cache_checkbox = QCheckBox("Кешировать результаты на диске")
+        self.cache_checkbox.setChecked(self.cache_enabled)
+        self.cache_checkbox.stateChanged.connect(self.toggle_cache)
+        file_layout.addWidget(self.cache_checkbox)
+
+        self.memory_label = QLabel("Память: -")
+        self.memory_label.setStyleSheet("color: #888; font-size: 10px;")
+        file_layout.addWidget(self.memory_label)
+
         file_group.setLayout(file_layout)
         layout.addWidget(file_group)
 
@@ -79,7 +154,9 @@ class MainWindow(QMainWindow):
         mode_layout = QVBoxLayout()
 
         self.mode_combo = QComboBox()
-        self.mode_combo.addItems(["Просмотр", "Прямоугольная область", "Произвольная область", "Отметить границы"])
+        self.mode_combo.addItems([
+            "Просмотр", "Прямоугольная область", "Произвольная область", "Отметить границы", "Выбор объектов"
+        ])
         self.mode_combo.currentTextChanged.connect(self.change_mode)
         mode_layout.addWidget(self.mode_combo)
 
@@ -101,6 +178,19 @@ class MainWindow(QMainWindow):
         self.region_button_group.addButton(self.exclude_radio)
         mode_layout.addWidget(self.exclude_radio)
 
+        self.snap_checkbox = QCheckBox("Привязывать линии к границам")
+        self.snap_checkbox.setChecked(False)
+        self.snap_checkbox.stateChanged.connect(self.toggle_snap)
+        mode_layout.addWidget(self.snap_checkbox)
+
+        region_params_btn = QPushButton("Текущие параметры Canny - последней области")
+        region_params_btn.clicked.connect(self.assign_region_params)
+        mode_layout.addWidget(region_params_btn)
+
+        self.region_params_label = QLabel("")
+        self.region_params_label.setStyleSheet("color: #888; font-size: 10px;")
+        mode_layout.addWidget(self.region_params_label)
+
         clear_annotations_btn = QPushButton("Очистить аннотации")
         clear_annotations_btn.clicked.connect(self.clear_current_annotations)
         mode_layout.addWidget(clear_annotations_btn)
@@ -158,6 +248,17 @@ class MainWindow(QMainWindow):
         self.blur_slider.valueChanged.connect(self.update_blur)
         canny_layout.addWidget(self.blur_slider)
 
+        # Уточнение границы
+        self.refine_checkbox = QCheckBox("Уточнить границу (GrabCut)")
+        self.refine_checkbox.setChecked(False)
+        self.refine_checkbox.stateChanged.connect(self.toggle_refine)
+        canny_layout.addWidget(self.refine_checkbox)
+
+        self.adaptive_checkbox = QCheckBox("Рабочее разрешение для больших изображений")
+        self.adaptive_checkbox.setChecked(False)
+        self.adaptive_checkbox.stateChanged.connect(self.toggle_adaptive)
+        canny_layout.addWidget(self.adaptive_checkbox)
+
         # Кнопка применения
         self.apply_btn = QPushButton("Найти границы")
         self.apply_btn.clicked.connect(self.apply_edge_detection)
@@ -178,10 +279,19 @@ class MainWindow(QMainWindow):
         save_no_bg_btn.clicked.connect(self.save_without_background)
         actions_layout.addWidget(save_no_bg_btn)
 
+        self.soft_alpha_checkbox = QCheckBox("Мягкие края при сохранении без фона")
+        self.soft_alpha_checkbox.setChecked(False)
+        self.soft_alpha_checkbox.stateChanged.connect(self.toggle_soft_alpha)
+        actions_layout.addWidget(self.soft_alpha_checkbox)
+
         save_with_border_btn = QPushButton("Сохранить с границей")
         save_with_border_btn.clicked.connect(self.save_with_border)
         actions_layout.addWidget(save_with_border_btn)
 
+        export_vector_btn = QPushButton("Экспорт контуров (SVG/GeoJSON)")
+        export_vector_btn.clicked.connect(self.export_vector)
+        actions_layout.addWidget(export_vector_btn)
+
         reset_btn = QPushButton("Сбросить")
         reset_btn.clicked.connect(self.reset)
         actions_layout.addWidget(reset_btn)
@@ -189,6 +299,22 @@ class MainWindow(QMainWindow):
         actions_group.setLayout(actions_layout)
         layout.addWidget(actions_group)
 
+        # Диагностика задержек интерфейса
+        trace_group = QGroupBox("Диагностика")
+        trace_layout = QVBoxLayout()
+
+        self.trace_checkbox = QCheckBox("Трассировка задержек")
+        self.trace_checkbox.setChecked(tracer.enabled)
+        self.trace_checkbox.stateChanged.connect(self.toggle_tracing)
+        trace_layout.addWidget(self.trace_checkbox)
+
+        save_trace_btn = QPushButton("Сохранить трассу")
+        save_trace_btn.clicked.connect(self.save_trace)
+        trace_layout.addWidget(save_trace_btn)
+
+        trace_group.setLayout(trace_layout)
+        layout.addWidget(trace_group)
+
         layout.addStretch()
 
         return panel
@@ -202,6 +328,52 @@ class MainWindow(QMainWindow):
         if self.auto_update and self.original_image is not None and (self.rect or self.freeform_polygons):
             self.apply_edge_detection()
 
+    def assign_region_params(self):
+        """
+        Закрепляет текущие значения слайдеров за последней областью
+
+        В режиме произвольной области это последний полигон, иначе -
+        прямоугольник (если он есть). Внутри области границы ищутся с ее
+        параметрами, в остальной части изображения - с общими.
+        """
+        if self.mode == "freeform" and self.freeform_polygons:
+            key = len(self.freeform_polygons) - 1
+        elif self.rect:
+            key = 'rect'
+        elif self.freeform_polygons:
+            key = len(self.freeform_polygons) - 1
+        else:
+            QMessageBox.warning(self, "Ошибка", "Сначала нарисуйте область!")
+            return
+
+        self.region_params[key] = canny.CannyEdgeDetector(self.threshold1, self.threshold2, self.blur_size)
+        self.update_region_params_label()
+
+        if self.auto_update and self.original_image is not None:
+            self.apply_edge_detection()
+
+    def region_overrides(self):
+        """Список RegionOverride для областей с собственными параметрами"""
+        result = []
+        if self.rect and 'rect' in self.region_params:
+            result.append(overrides.RegionOverride.from_rect(self.rect, self.region_params['rect']))
+        for i, polygon in enumerate(self.freeform_polygons):
+            if i in self.region_params and len(polygon) > 2:
+                result.append(overrides.RegionOverride(polygon, self.region_params[i]))
+        return result
+
+    def clear_region_params(self, rect=True, polygons=True):
+        """Удаляет собственные параметры прямоугольника и/или полигонов"""
+        self.region_params = {
+            key: detector for key, detector in self.region_params.items()
+            if (key == 'rect' and not rect) or (key != 'rect' and not polygons)
+        }
+        self.update_region_params_label()
+
+    def update_region_params_label(self):
+        count = len(self.region_params)
+        self.region_params_label.setText(f"Областей со своими параметрами: {count}" if count else "")
+
     def toggle_auto_update(self, state):
         """Включает/выключает автообновление"""
         self.auto_update = (state == Qt.Checked)
@@ -215,6 +387,134 @@ class MainWindow(QMainWindow):
             self.apply_btn.setEnabled(True)
             self.apply_btn.setText("Найти границы")
 
+    def toggle_refine(self, state):
+        """Включает/выключает уточнение маски через GrabCut"""
+        self.refine_enabled = (state == Qt.Checked)
+
+        if self.auto_update and self.original_image is not None:
+            self.apply_edge_detection()
+
+    def toggle_adaptive(self, state):
+        """
+        Включает/выключает обнаружение на рабочем разрешении
+
+        Большие изображения обрабатываются уменьшенными, маска
+        возвращается к полному размеру с уточнением у границы.
+        """
+        self.adaptive_enabled = (state == Qt.Checked)
+        self.pipeline = None
+
+        if self.auto_update and self.original_image is not None:
+            self.apply_edge_detection()
+
+    def toggle_soft_alpha(self, state):
+        """Включает/выключает мягкие края при сохранении без фона"""
+        self.soft_alpha = (state == Qt.Checked)
+
+    def toggle_snap(self, state):
+        """Включает/выключает привязку линий keep к границам (livewire)"""
+        self.snap_enabled = (state == Qt.Checked)
+        self.update_livewire()
+
+    def update_livewire(self):
+        """Создает инструмент livewire для текущего изображения"""
+        if self.snap_enabled and self.original_image is not None:
+            self.canvas.livewire = livewire.LiveWire(self.original_image)
+        else:
+            self.canvas.livewire = None
+
+    def toggle_tracing(self, state):
+        """Включает/выключает трассировку задержек и ее сводку поверх изображения"""
+        tracer.set_enabled(state == Qt.Checked)
+        self.canvas.update()
+
+    def save_trace(self):
+        """Сохраняет трассу (Chrome trace JSON) и показывает отчет с гистограммами"""
+        if not tracer.events:
+            QMessageBox.warning(self, "Ошибка", "Трасса пуста: включите трассировку и поработайте с изображением")
+            return
+
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Сохранить трассу", "trace.json", "Chrome trace (*.json)"
+        )
+        if not file_path:
+            return
+
+        try:
+            count = tracer.dump(file_path)
+        except OSError as e:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось сохранить трассу: {e}")
+            return
+        QMessageBox.information(
+            self, "Трасса сохранена",
+            f"Событий: {count}\nПуть: {file_path}\n"
+            f"Откройте в ui.perfetto.dev или chrome://tracing\n\n{tracer.report()}"
+        )
+
+    def toggle_cache(self, state):
+        """Включает/выключает дисковый кеш результатов"""
+        self.cache_enabled = (state == Qt.Checked)
+
+    def cache_key(self):
+        """Ключ кеша для текущего изображения, параметров и аннотаций"""
+        params = {
+            'threshold1': self.threshold1,
+            'threshold2': self.threshold2,
+            'blur_size': self.blur_size,
+            'refine': self.refine_enabled,
+            'adaptive': self.adaptive_enabled,
+        }
+        annotations = {
+            'rect': self.rect,
+            'freeform_polygons': self.freeform_polygons,
+            'overrides': [o.key() for o in self.region_overrides()],
+            'region_mode': self.region_mode,
+            'keep_lines': self.canvas.keep_lines,
+        }
+        return cache.make_key(self.image_digest, params, annotations)
+
+    def toggle_low_memory(self, state):
+        """
+        Включает/выключает режим экономии памяти
+
+        В этом режиме хранится только исходное изображение: границы
+        рисуются поверх него при отображении, маска хранится упакованной
+        по биту на пиксель, предпросмотр пишется в общий рабочий буфер.
+        """
+        self.low_memory = (state == Qt.Checked)
+        self.pipeline = None
+        self.scratch = None
+
+        if self.original_image is None:
+            return
+
+        if self.mask is not None:
+            self.apply_edge_detection()
+        else:
+            self.current_image = self.original_image if self.low_memory else self.original_image.copy()
+            self.canvas.set_image(self.current_image)
+            self.update_memory_label()
+
+    def update_memory_label(self):
+        """Показывает память, занятую изображениями, масками и процессом"""
+        buffers = [self.original_image, self.current_image, self.scratch]
+        mask = self.mask
+        if mask is not None:
+            buffers.append(mask.bits if isinstance(mask, memory.PackedMask) else mask)
+
+        total = memory.buffers_nbytes(*buffers)
+        if self.pipeline is not None:
+            total += self.pipeline.nbytes()
+        if self.canvas.pyramid is not None:
+            total += self.canvas.pyramid.nbytes()
+        if self.canvas.overlay_pyramid is not None:
+            total += self.canvas.overlay_pyramid.nbytes()
+
+        self.memory_label.setText(
+            f"Память: буферы {memory.format_bytes(total)}, "
+            f"процесс {memory.format_bytes(memory.process_memory())}"
+        )
+
     def load_image(self):
         file_path, _ = QFileDialog.getOpenFileName(
             self, "Выберите изображение", "",
@@ -222,43 +522,188 @@ class MainWindow(QMainWindow):
         )
 
         if file_path:
-            self.original_image = cv2.imread(file_path)
-            self.original_image = cv2.cvtColor(self.original_image, cv2.COLOR_BGR2RGB)
-            self.current_image = self.original_image.copy()
-            self.canvas.set_image(self.current_image)
-            self.rect = None
-            self.freeform_polygons = []
-            self.keep_points = []
-            self.mask = None
+            self.close_folder()
+            image = cv2.imread(file_path)
+            # Конвертация на месте - без второй полноразмерной копии
+            cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+            self.set_original_image(image, cache.file_digest(file_path))
             self.auto_update_checkbox.setChecked(False)
 
+    def set_original_image(self, image, digest, pipeline=None):
+        """
+        Делает изображение текущим
+
+        Параметры:
+        - image: изображение (RGB)
+        - digest: хеш файла для дискового кеша
+        - pipeline: уже подготовленный IncrementalEdgeDetector для этого изображения
+        """
+        self.image_digest = digest
+        self.original_image = image
+        self.current_image = self.original_image if self.low_memory else self.original_image.copy()
+        self.canvas.selection_pyramid = None
+        self.canvas.set_image(self.current_image)
+        self.rect = None
+        self.freeform_polygons = []
+        self.clear_region_params()
+        self.keep_points = []
+        self.mask = None
+        self.edges = None
+        self.selection = None
+        self.result = None
+        self.pipeline = pipeline
+        self.pipeline_scale = 1.0
+        self.scratch = None
+        self.update_livewire()
+        self.update_memory_label()
+
+    def open_folder(self):
+        """Открывает папку для последовательного просмотра изображений"""
+        folder = QFileDialog.getExistingDirectory(self, "Выберите папку с изображениями")
+        if not folder:
+            return
+
+        paths = prefetch.list_images(folder)
+        if not paths:
+            QMessageBox.warning(self, "Ошибка", "В папке нет изображений!")
+            return
+
+        self.close_folder()
+        self.prefetcher = prefetch.FolderPrefetcher(paths)
+        self.show_folder_image(0)
+
+    def close_folder(self):
+        """Завершает режим просмотра папки"""
+        if self.prefetcher is not None:
+            self.prefetcher.shutdown()
+            self.prefetcher = None
+        self.prev_btn.setEnabled(False)
+        self.next_btn.setEnabled(False)
+        self.folder_label.setText("")
+
+    def show_folder_image(self, index):
+        """
+        Показывает изображение папки с первым результатом обнаружения
+
+        Соседние изображения к этому моменту обычно уже декодированы и
+        обработаны в фоне, поэтому переход происходит без ожидания.
+        """
+        if self.prefetcher is None or not 0 <= index < len(self.prefetcher.paths):
+            return
+
+        detector = canny.CannyEdgeDetector(self.threshold1, self.threshold2, self.blur_size)
+        self.prefetcher.set_detector(detector, self.low_memory)
+        item = self.prefetcher.get(index)
+        self.folder_index = index
+        path = self.prefetcher.paths[index]
+
+        self.prev_btn.setEnabled(index > 0)
+        self.next_btn.setEnabled(index + 1 < len(self.prefetcher.paths))
+        self.folder_label.setText(f"{index + 1} / {len(self.prefetcher.paths)}: {os.path.basename(path)}")
+
+        # Пока пользователь смотрит на изображение, готовим соседние
+        self.prefetcher.schedule(index)
+
+        if item is None:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось прочитать файл:\n{path}")
+            return
+
+        self.canvas.clear_annotations()
+        self.set_original_image(item.image, item.digest, item.pipeline)
+        self.apply_edge_detection()
+
+    def open_gallery(self):
+        """Открывает галерею исходных изображений и результатов пакетной обработки"""
+        folder = QFileDialog.getExistingDirectory(self, "Папка с исходными изображениями")
+        if not folder:
+            return
+        results_dir = QFileDialog.getExistingDirectory(
+            self, "Папка с результатами (отмена - без масок)", folder
+        )
+
+        paths = prefetch.list_images(folder)
+        if not paths:
+            QMessageBox.warning(self, "Ошибка", "В папке нет изображений!")
+            return
+
+        if self.gallery is None:
+            from gui.gallery import GalleryView
+            self.gallery = GalleryView()
+            self.gallery.activated.connect(self.open_gallery_item)
+        self.gallery.set_items(paths, results_dir or None)
+        self.gallery.show()
+        self.gallery.raise_()
+
+    def open_gallery_item(self, index):
+        """Открывает изображение галереи вместе с сохраненной маской"""
+        path = self.gallery.sources[index]
+        image = cv2.imread(path)
+        if image is None:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось прочитать файл:\n{path}")
+            return
+        cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+
+        self.close_folder()
+        self.canvas.clear_annotations()
+        self.set_original_image(image, cache.file_digest(path))
+
+        mask_path = self.gallery.masks[index]
+        mask = thumbnails.load_mask(mask_path) if mask_path else None
+        if mask is not None and mask.shape == image.shape[:2]:
+            # Границей считается контур сохраненной маски
+            kernel = np.ones((3, 3), np.uint8)
+            self.edges = cv2.morphologyEx(mask, cv2.MORPH_GRADIENT, kernel)
+            self.show_result(None, mask)
+
+        self.raise_()
+        self.activateWindow()
+
+    def closeEvent(self, event):
+        if self.gallery is not None:
+            self.gallery.close()
+            self.gallery.loader.shutdown()
+        self.close_folder()
+        super().closeEvent(event)
+
     def change_mode(self, mode_text):
         mode_map = {
             "Просмотр": "view",
             "Прямоугольная область": "rect",
             "Произвольная область": "freeform",
-            "Отметить границы": "keep"
+            "Отметить границы": "keep",
+            "Выбор объектов": "select"
         }
         self.mode = mode_map[mode_text]
         self.canvas.set_mode(self.mode)
 
         # Обновляем информационную метку
         info_texts = {
-            "view": "Режим просмотра",
+            "view": "Режим просмотра.\nКолесо мыши - масштаб,\nперетаскивание - перемещение",
             "rect": "Нарисуйте прямоугольник,\nзажав ЛКМ",
             "freeform": "Кликайте для создания точек.\nДвойной клик - завершить область",
-            "keep": "Зажмите ЛКМ и рисуйте\nлинию вдоль границы объекта"
+            "keep": "Зажмите ЛКМ и рисуйте\nлинию вдоль границы объекта",
+            "select": "Щелчок по объекту включает\nили исключает его из маски"
         }
         self.info_label.setText(info_texts.get(self.mode, ""))
 
+        # Выбранные объекты подсвечиваются только в режиме выбора
+        if self.mode == "select":
+            if self.selection is None:
+                self.update_selection()
+            self.canvas.set_selection(self.selection.mask if self.selection is not None else None)
+        elif self.canvas.selection_pyramid is not None:
+            self.canvas.set_selection(None)
+
     def clear_current_annotations(self):
         """Очищает текущие аннотации"""
         if self.mode == "rect":
             self.rect = None
+            self.clear_region_params(polygons=False)
             self.canvas.start_point = None
             self.canvas.end_point = None
         elif self.mode == "freeform":
             self.freeform_polygons = []
+            self.clear_region_params(rect=False)
             self.canvas.freeform_polygons = []
             self.canvas.current_polygon = []
         elif self.mode == "keep":
@@ -270,6 +715,7 @@ class MainWindow(QMainWindow):
         self.canvas.update_display()
 
     def update_threshold1(self, value):
+        tracer.begin('slider')
         self.threshold1 = value
         self.threshold1_label.setText(f"Нижний порог: {value}")
 
@@ -277,6 +723,7 @@ class MainWindow(QMainWindow):
             self.apply_edge_detection()
 
     def update_threshold2(self, value):
+        tracer.begin('slider')
         self.threshold2 = value
         self.threshold2_label.setText(f"Верхний порог: {value}")
 
@@ -284,6 +731,7 @@ class MainWindow(QMainWindow):
             self.apply_edge_detection()
 
     def update_blur(self, value):
+        tracer.begin('slider')
         if value % 2 == 0:
             value += 1
         self.blur_size = value
@@ -297,51 +745,174 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Ошибка", "Загрузите изображение!")
             return
 
-        # Создаем маску области для обработки
-        region_mask = None
+        # Сначала ищем готовый результат в дисковом кеше
+        key = None
+        cached = None
+        if self.cache_enabled and self.image_digest is not None:
+            if self.result_cache is None:
+                self.result_cache = cache.ResultCache()
+            key = self.cache_key()
+            with tracer.span('cache'):
+                cached = self.result_cache.get(key)
+
+        if cached is not None:
+            self.edges = cached['edges']
+            mask = cached['mask']
+            edges = None
+            # Контуры восстановит show_result по маске при первом обращении
+            contours = None
+        else:
+            with tracer.span('detect'):
+                edges, mask, contours = self.detect()
 
-        if self.rect or self.freeform_polygons:
-            region_mask = np.zeros(self.original_image.shape[:2], dtype=np.uint8)
+            # В режиме автообновления каждое движение слайдера не сохраняем
+            if key is not None and not self.auto_update:
+                self.result_cache.put(key, mask, edges=self.edges)
 
-            # Добавляем прямоугольник
-            if self.rect:
-                x, y, w, h = self.rect
-                cv2.rectangle(region_mask, (x, y), (x + w, y + h), 255, -1)
+        with tracer.span('display'):
+            self.show_result(edges, mask, contours)
 
-            # Добавляем произвольные области
-            for polygon in self.freeform_polygons:
-                if len(polygon) > 2:
-                    pts = np.array(polygon, dtype=np.int32)
-                    cv2.fillPoly(region_mask, [pts], 255)
+        if not self.auto_update:
+            self.auto_update_checkbox.setEnabled(True)
 
-            # Инвертируем маску если режим "исключить"
-            if self.region_mode == "exclude":
-                region_mask = cv2.bitwise_not(region_mask)
+    def show_result(self, edges, mask, contours=None):
+        """
+        Показывает результат: границы self.edges и маску
+
+        Параметры:
+        - edges: готовое изображение с границами или None (нарисовать по self.edges)
+        - mask: бинарная маска объекта
+        - contours: внешние контуры маски, если уже известны
+        """
+        if self.low_memory:
+            # Границы рисуются поверх исходного изображения при отображении
+            self.current_image = self.original_image
+            self.mask = memory.PackedMask.from_array(mask)
+            self.canvas.set_image(self.current_image, overlay=self.edges)
+        else:
+            if edges is None:
+                edges = canny.CannyEdgeDetector.draw_edges(self.original_image, self.edges)
+            self.current_image = edges
+            self.mask = mask
+            self.canvas.set_image(self.current_image)
+        self.canvas.set_mask(self.mask)
+
+        # Производные маски (контуры, рамка) считаются при первом обращении;
+        # в режиме экономии памяти распакованная маска не удерживается
+        self.result = None
+        if not self.low_memory:
+            self.result = detection.DetectionResult(self.original_image, edges=self.edges, mask=mask,
+                                                    contours=contours)
+
+        # Карта меток строится сразу после обнаружения, если выбор объектов активен
+        self.selection = None
+        if self.mode == "select":
+            self.update_selection()
+            self.canvas.set_selection(self.selection.mask if self.selection is not None else None)
+
+        self.update_memory_label()
+
+    def detection_result(self):
+        """Результат для текущей маски: контуры и рамка считаются один раз на маску"""
+        if self.result is not None:
+            return self.result
+        result = detection.DetectionResult(self.original_image, edges=self.edges,
+                                           mask=memory.unpack_mask(self.mask))
+        if not self.low_memory:
+            self.result = result
+        return result
+
+    def update_selection(self):
+        """Строит карту меток контуров для выбора объектов щелчком"""
+        if self.edges is None or self.mask is None:
+            self.selection = None
+            return
+        self.selection = selection.ObjectSelection(self.edges, memory.unpack_mask(self.mask))
+
+    def toggle_object(self, x, y):
+        """Включает объект под точкой (x, y) в маску или исключает из нее"""
+        if self.selection is None:
+            self.update_selection()
+            if self.selection is None:
+                QMessageBox.warning(self, "Ошибка", "Сначала найдите границы!")
+                return
+
+        if not self.selection.toggle(x, y):
+            return
 
+        mask = self.selection.mask
+        self.mask = memory.PackedMask.from_array(mask) if self.low_memory else mask
+        self.result = None
+        self.canvas.set_mask(self.mask)
+        self.canvas.set_selection(mask)
+        self.info_label.setText(f"Выбрано объектов: {self.selection.selected_count()} из {self.selection.count}")
+
+    def detect(self):
+        """
+        Выполняет обнаружение границ для текущих параметров и аннотаций
+
+        Возвращает:
+        - edges: изображение с границами (None в режиме экономии памяти)
+        - mask: бинарная маска объекта
+        - contours: контуры маски или None, если маска изменена после выбора контуров
+        """
         # Применяем Canny с ОТДЕЛЬНЫМИ ЛИНИЯМИ
-        detector = CannyEdgeDetector(
+        detector = canny.CannyEdgeDetector(
             self.threshold1,
             self.threshold2,
             self.blur_size
         )
 
-        # Передаем линии как список отдельных линий
-        edges, mask = detector.detect_edges(
-            self.original_image,
-            self.keep_points,  # Это все точки из всех линий
-            0,
-            0,
-            region_mask,
-            self.canvas.keep_lines  # Добавляем отдельные линии
-        )
-
-        self.current_image = edges
-        self.mask = mask
-        self.canvas.set_image(self.current_image)
-        self.canvas.set_mask(mask)
-
-        if not self.auto_update:
-            self.auto_update_checkbox.setEnabled(True)
+        scale = 1.0
+        if self.adaptive_enabled:
+            scale = adaptive.working_scale(self.original_image.shape)
+
+        # Пересчитываются только области, затронутые изменением аннотаций
+        if self.pipeline is None or self.pipeline_scale != scale:
+            image = self.original_image if scale >= 1.0 else adaptive.downscale(self.original_image, scale)
+            self.pipeline = incremental.IncrementalEdgeDetector(
+                image, detector, low_memory=self.low_memory
+            )
+            self.pipeline_scale = scale
+
+        rect = self.rect
+        polygons = self.freeform_polygons
+        keep_lines = self.canvas.keep_lines
+        region_overrides = self.region_overrides()
+        if scale < 1.0:
+            # Аннотации переводятся в координаты рабочего разрешения
+            h, w = self.original_image.shape[:2]
+            sh, sw = self.pipeline.shape
+            sx, sy = sw / w, sh / h
+            if rect is not None:
+                x, y, rw, rh = rect
+                rect = (int(x * sx), int(y * sy), max(1, int(rw * sx)), max(1, int(rh * sy)))
+            polygons = [adaptive.scale_points(polygon, sx, sy) for polygon in polygons]
+            keep_lines = [adaptive.scale_points(line, sx, sy) for line in keep_lines]
+            region_overrides = [
+                overrides.RegionOverride(adaptive.scale_points(o.polygon, sx, sy), o.detector)
+                for o in region_overrides
+            ]
+
+        self.pipeline.set_detector(detector)
+        self.pipeline.set_regions(rect, polygons, self.region_mode)
+        self.pipeline.set_keep_lines(keep_lines)
+        self.pipeline.set_overrides(region_overrides)
+        edges, mask = self.pipeline.update()
+        self.edges = self.pipeline.edges
+        contours = self.pipeline.selected
+
+        if scale < 1.0:
+            mask = adaptive.upsample_mask(self.original_image, mask, self.pipeline.image)
+            self.edges = adaptive.upsample_edges(self.edges, self.original_image.shape)
+            edges = None if self.low_memory else canny.CannyEdgeDetector.draw_edges(self.original_image, self.edges)
+            contours = None
+
+        if self.refine_enabled:
+            mask = refine.refine_mask_grabcut(self.original_image, mask)
+            contours = None
+
+        return edges, mask, contours
 
     def preview_mask(self):
         """Показывает предварительный просмотр маски"""
@@ -349,24 +920,32 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Ошибка", "Сначала найдите границы!")
             return
 
-        preview = self.original_image.copy().astype(float)
-        overlay = np.zeros_like(preview)
-        overlay[:, :, 1] = 255
+        result = self.detection_result()
+        mask = result.mask
+
+        # В режиме экономии памяти предпросмотр пишется в общий рабочий буфер
+        if self.low_memory:
+            if self.scratch is None:
+                self.scratch = np.empty_like(self.original_image)
+            preview = self.scratch
+        else:
+            preview = np.empty_like(self.original_image)
 
-        alpha = (self.mask / 255.0).astype(float)
-        alpha = np.stack([alpha] * 3, axis=-1)
+        # Вне маски - затемнение, внутри - 70% исходного + 30% зеленого.
+        # Считается в uint8 и только в пределах рамки маски
+        cv2.convertScaleAbs(self.original_image, preview, alpha=0.3)
 
-        preview = np.where(
-            self.mask[:, :, np.newaxis] > 0,
-            preview * 0.7 + overlay * 0.3,
-            preview * 0.3
-        ).astype(np.uint8)
+        x, y, w, h = result.bbox
+        if w and h:
+            inside = cv2.convertScaleAbs(self.original_image[y:y + h, x:x + w], alpha=0.7)
+            inside[:, :, 1] = cv2.add(inside[:, :, 1], 77)
+            np.copyto(preview[y:y + h, x:x + w], inside, where=mask[y:y + h, x:x + w, np.newaxis] > 0)
 
-        contours, _ = cv2.findContours(self.mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        cv2.drawContours(preview, contours, -1, (255, 0, 0), 3)
+        cv2.drawContours(preview, result.contours, -1, (255, 0, 0), 3)
 
         self.current_image = preview
         self.canvas.set_image(self.current_image)
+        self.update_memory_label()
 
         QMessageBox.information(
             self,
@@ -379,20 +958,24 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Ошибка", "Сначала найдите границы!")
             return
 
-        if not np.any(self.mask):
+        mask = memory.unpack_mask(self.mask)
+
+        if not np.any(mask):
             QMessageBox.warning(self, "Ошибка", "Маска пуста! Попробуйте изменить параметры.")
             return
 
-        result = np.zeros((*self.original_image.shape[:2], 4), dtype=np.uint8)
-        result[:, :, :3] = self.original_image
-        result[:, :, 3] = self.mask
+        result_bgra = cv2.cvtColor(self.original_image, cv2.COLOR_RGB2BGRA)
+        if self.soft_alpha:
+            # Полупрозрачность считается только в полосе вдоль контура
+            result_bgra[:, :, 3] = matte.soft_alpha(self.original_image, mask)
+        else:
+            result_bgra[:, :, 3] = mask
 
         file_path, _ = QFileDialog.getSaveFileName(
             self, "Сохранить изображение", "", "PNG (*.png)"
         )
 
         if file_path:
-            result_bgra = cv2.cvtColor(result, cv2.COLOR_RGBA2BGRA)
             success = cv2.imwrite(file_path, result_bgra)
 
             if success:
@@ -411,9 +994,29 @@ class MainWindow(QMainWindow):
 
         if file_path:
             result_bgr = cv2.cvtColor(self.current_image, cv2.COLOR_RGB2BGR)
+            if self.current_image is self.original_image and self.edges is not None:
+                # Режим экономии памяти: границы накладываются только при сохранении
+                result_bgr[self.edges > 0] = [0, 255, 0]
             cv2.imwrite(file_path, result_bgr)
             QMessageBox.information(self, "Успех", "Изображение сохранено!")
 
+    def export_vector(self):
+        """Сохраняет маску как упрощенные полигоны с отверстиями"""
+        if self.mask is None:
+            QMessageBox.warning(self, "Ошибка", "Сначала найдите границы!")
+            return
+
+        file_path, selected_filter = QFileDialog.getSaveFileName(
+            self, "Экспорт контуров", "", "SVG (*.svg);;GeoJSON (*.geojson);;JSON (*.json)"
+        )
+
+        if file_path:
+            fmt = vector.export_format(file_path) or selected_filter.split()[0].lower()
+            mask = memory.unpack_mask(self.mask)
+            polygons = vector.mask_to_polygons(mask, self.VECTOR_TOLERANCE)
+            vector.save_polygons(file_path, polygons, mask.shape, fmt)
+            QMessageBox.information(self, "Успех", f"Сохранено полигонов: {len(polygons)}")
+
     def reset(self):
         """Полный сброс всех параметров и аннотаций"""
         if self.original_image is None:
@@ -435,16 +1038,24 @@ class MainWindow(QMainWindow):
         if reply == QMessageBox.No:
             return
 
-        self.current_image = self.original_image.copy()
+        self.current_image = self.original_image if self.low_memory else self.original_image.copy()
+        self.canvas.selection_pyramid = None
         self.canvas.set_image(self.current_image)
 
         self.rect = None
         self.freeform_polygons = []
+        self.clear_region_params()
         self.keep_points = []
         self.mask = None
+        self.edges = None
+        self.selection = None
+        self.result = None
+        self.pipeline = None
         self.canvas.clear_annotations()
+        self.update_memory_label()
 
         self.auto_update_checkbox.setChecked(False)
+        self.refine_checkbox.setChecked(False)
         self.mode_combo.setCurrentIndex(0)
         self.include_radio.setChecked(True)
 
@@ -0,0 +1,140 @@
+"""
+Тайловая многоуровневая пирамида изображения для отображения в ImageCanvas
+"""
+
+from collections import OrderedDict
+
+from PyQt5.QtGui import QImage, QPixmap
+
+from algorithms.lazy import lazy_import
+from gui.tracing import tracer
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+
+class TilePyramid:
+    """
+    Пирамида уровней детализации, разбитых на тайлы
+
+    Уровень 0 - исходное изображение, каждый следующий уменьшен вдвое.
+    Уровни строятся лениво при первом обращении, тайлы конвертируются
+    в QPixmap только когда попадают в область просмотра и кешируются.
+
+    Одноканальное изображение считается слоем-наложением (например, картой
+    границ): его ненулевые пиксели рисуются цветом color поверх основы,
+    а RGBA-тайлы собираются на лету без полноразмерной цветной копии.
+    """
+
+    TILE_SIZE = 256
+    MAX_CACHED_TILES = 256
+
+    def __init__(self, image, color=(0, 255, 0)):
+        """
+        Параметры:
+        - image: изображение (numpy array RGB) или одноканальный слой-наложение
+        - color: цвет ненулевых пикселей слоя-наложения (RGB)
+        """
+        self.levels = [image]
+        self.color = color
+        self.tiles = OrderedDict()
+
+        # Количество уровней: до тех пор, пока изображение не влезет в один тайл
+        h, w = image.shape[:2]
+        self.level_count = 1
+        while max(h, w) > self.TILE_SIZE:
+            h, w = (h + 1) // 2, (w + 1) // 2
+            self.level_count += 1
+
+    @property
+    def width(self):
+        return self.levels[0].shape[1]
+
+    @property
+    def height(self):
+        return self.levels[0].shape[0]
+
+    def level_for_scale(self, scale):
+        """
+        Выбирает уровень для отображения в масштабе scale (пикселей виджета на пиксель изображения)
+
+        Берется самый грубый уровень, разрешение которого не ниже экранного.
+        """
+        level = 0
+        while level + 1 < self.level_count and scale * (2 ** (level + 1)) <= 1.0:
+            level += 1
+        return level
+
+    def nbytes(self):
+        """Память, занятая построенными уменьшенными уровнями"""
+        return sum(level.nbytes for level in self.levels[1:])
+
+    def get_level(self, level):
+        """Возвращает массив уровня, достраивая недостающие уровни"""
+        while len(self.levels) <= level:
+            prev = self.levels[-1]
+            h, w = prev.shape[:2]
+            size = ((w + 1) // 2, (h + 1) // 2)
+            self.levels.append(cv2.resize(prev, size, interpolation=cv2.INTER_AREA))
+        return self.levels[level]
+
+    def visible_tiles(self, level, x0, y0, x1, y1):
+        """
+        Перечисляет тайлы уровня, пересекающие прямоугольник в координатах уровня 0
+
+        Возвращает:
+        - список (tx, ty, rect), где rect = (x0, y0, x1, y1) тайла в координатах уровня 0
+        """
+        factor = 2 ** level
+        data = self.get_level(level)
+        h, w = data.shape[:2]
+        tile = self.TILE_SIZE
+
+        tx0 = max(0, int(x0 // factor) // tile)
+        ty0 = max(0, int(y0 // factor) // tile)
+        tx1 = min((w - 1) // tile, int(x1 // factor) // tile)
+        ty1 = min((h - 1) // tile, int(y1 // factor) // tile)
+
+        result = []
+        for ty in range(ty0, ty1 + 1):
+            for tx in range(tx0, tx1 + 1):
+                lx0, ly0 = tx * tile, ty * tile
+                lx1, ly1 = min(w, lx0 + tile), min(h, ly0 + tile)
+                rect = (
+                    lx0 * factor, ly0 * factor,
+                    min(self.width, lx1 * factor), min(self.height, ly1 * factor)
+                )
+                result.append((tx, ty, rect))
+        return result
+
+    def tile_pixmap(self, level, tx, ty):
+        """Возвращает QPixmap тайла, конвертируя его при первом обращении"""
+        key = (level, tx, ty)
+        pixmap = self.tiles.get(key)
+        if pixmap is not None:
+            self.tiles.move_to_end(key)
+            return pixmap
+
+        with tracer.span('convert'):
+            pixmap = self._convert_tile(level, tx, ty)
+
+        self.tiles[key] = pixmap
+        if len(self.tiles) > self.MAX_CACHED_TILES:
+            self.tiles.popitem(last=False)
+        return pixmap
+
+    def _convert_tile(self, level, tx, ty):
+        """Конвертирует тайл уровня в QPixmap"""
+        data = self.get_level(level)
+        tile = self.TILE_SIZE
+        block = data[ty * tile:(ty + 1) * tile, tx * tile:(tx + 1) * tile]
+        h, w = block.shape[:2]
+        if block.ndim == 2:
+            rgba = np.zeros((h, w, 4), dtype=np.uint8)
+            rgba[block > 0] = (*self.color, 255)
+            block = rgba
+            q_image = QImage(block.data, w, h, 4 * w, QImage.Format_RGBA8888)
+        else:
+            block = np.ascontiguousarray(block)
+            q_image = QImage(block.data, w, h, 3 * w, QImage.Format_RGB888)
+        return QPixmap.fromImage(q_image)
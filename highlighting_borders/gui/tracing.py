@@ -0,0 +1,224 @@
+"""
+Трассировка задержек интерфейса: от события ввода до отрисованного кадра
+
+Трассировка включается явно (флажок в окне или переменная окружения
+HIGHLIGHTING_BORDERS_TRACE=1); в выключенном состоянии span() возвращает
+общий пустой контекстный менеджер и почти ничего не стоит.
+
+Событие ввода (движение слайдера, мышь, колесо) открывает взаимодействие
+begin(); стадии его обработки (обработчик, обнаружение, построение
+кадра, конвертация тайлов, отрисовка) отмечаются span(); отрисовка кадра
+frame_painted() закрывает все открытые взаимодействия. Если к моменту
+кадра открыто несколько взаимодействий, все кроме последнего считаются
+слитыми (coalesced) - их результат пользователь так и не увидел.
+Обнаружение границ выполняется синхронно в GUI-потоке, поэтому событие
+ввода не может быть вытеснено, пока пересчет ждет своей очереди:
+отдельного счетчика отброшенных взаимодействий нет, потерянные для
+пользователя промежуточные результаты измеряет только счетчик слитых.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Границы корзин гистограммы, мс
+HISTOGRAM_BOUNDS = (1, 2, 4, 8, 16, 33, 50, 100, 200, 500, 1000)
+
+MAX_TRACE_EVENTS = 200_000
+MAX_SAMPLES = 1000
+
+
+def _now_us():
+    return time.perf_counter_ns() // 1000
+
+
+class Histogram:
+    """Гистограмма длительностей с фиксированными корзинами и последними значениями"""
+
+    def __init__(self):
+        self.counts = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+        self.samples = deque(maxlen=MAX_SAMPLES)
+        self.total = 0
+
+    def add(self, ms):
+        index = 0
+        while index < len(HISTOGRAM_BOUNDS) and ms >= HISTOGRAM_BOUNDS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.samples.append(ms)
+        self.total += 1
+
+    def percentile(self, q):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def rows(self):
+        """Корзины в виде [(подпись, количество)]"""
+        labels = []
+        low = 0
+        for bound in HISTOGRAM_BOUNDS:
+            labels.append(f"{low}-{bound} мс")
+            low = bound
+        labels.append(f">{low} мс")
+        return list(zip(labels, self.counts))
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'start')
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.start = _now_us()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer._record(self.name, self.start, _now_us() - self.start)
+        return False
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class LatencyTracer:
+    """
+    Сборщик задержек и событий трассы (формат Chrome trace / Perfetto)
+
+    Вызывается из GUI-потока; span() можно использовать и из рабочих
+    потоков - события пишутся под блокировкой.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.events = deque(maxlen=MAX_TRACE_EVENTS)
+            self.latency = {}
+            self.stages = {}
+            self.open = []
+            self.last_frame = {}
+            self.frame_breakdown = {}
+            self.coalesced = 0
+            self.frames = 0
+            self._next_id = 0
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        if enabled:
+            self.reset()
+
+    def begin(self, kind):
+        """Событие ввода: открывает взаимодействие kind ('slider', 'mouse', 'wheel', ...)"""
+        if not self.enabled:
+            return
+        now = _now_us()
+        with self.lock:
+            self._next_id += 1
+            self.open.append({'id': self._next_id, 'kind': kind, 'start': now})
+            self.events.append({
+                'name': kind, 'cat': 'input', 'ph': 'i', 's': 't', 'ts': now,
+                'pid': os.getpid(), 'tid': threading.get_ident(), 'args': {'interaction': self._next_id},
+            })
+
+    def span(self, name):
+        """Контекстный менеджер стадии обработки"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def _record(self, name, start, duration):
+        with self.lock:
+            interaction = self.open[-1]['id'] if self.open else None
+            self.events.append({
+                'name': name, 'cat': 'stage', 'ph': 'X', 'ts': start, 'dur': duration,
+                'pid': os.getpid(), 'tid': threading.get_ident(), 'args': {'interaction': interaction},
+            })
+            self.stages.setdefault(name, Histogram()).add(duration / 1000)
+            if self.open:
+                self.last_frame[name] = self.last_frame.get(name, 0) + duration / 1000
+
+    def frame_painted(self):
+        """Кадр отрисован: закрывает открытые взаимодействия"""
+        if not self.enabled:
+            return
+        now = _now_us()
+        with self.lock:
+            self.frames += 1
+            if not self.open:
+                return
+            last = self.open[-1]
+            for interaction in self.open:
+                if interaction is not last:
+                    self.coalesced += 1
+                ms = (now - interaction['start']) / 1000
+                self.latency.setdefault(interaction['kind'], Histogram()).add(ms)
+                self.events.append({
+                    'name': f"{interaction['kind']} -> frame", 'cat': 'latency', 'ph': 'X',
+                    'ts': interaction['start'], 'dur': now - interaction['start'],
+                    'pid': os.getpid(), 'tid': 0, 'args': {'interaction': interaction['id']},
+                })
+            self.open = []
+            self.frame_breakdown = self.last_frame
+            self.last_frame = {}
+
+    def summary_lines(self):
+        """Краткая сводка для наложения поверх изображения"""
+        with self.lock:
+            lines = []
+            for kind, hist in sorted(self.latency.items()):
+                lines.append(
+                    f"{kind}: p50 {hist.percentile(0.5):.1f} мс, p95 {hist.percentile(0.95):.1f} мс, "
+                    f"n={hist.total}"
+                )
+            lines.append(f"кадров {self.frames}, слито {self.coalesced}")
+            breakdown = self.frame_breakdown
+            if breakdown:
+                parts = ', '.join(f"{name} {ms:.1f}" for name, ms in
+                                  sorted(breakdown.items(), key=lambda item: -item[1]))
+                lines.append(f"последний кадр, мс: {parts}")
+            return lines
+
+    def report(self):
+        """Подробный текстовый отчет с гистограммами"""
+        with self.lock:
+            latency = dict(self.latency)
+            stages = dict(self.stages)
+        lines = ["Задержка от события до кадра:"]
+        for kind, hist in sorted(latency.items()):
+            lines.append(f"  {kind} (n={hist.total})")
+            lines.extend(f"    {label:>14}: {count}" for label, count in hist.rows() if count)
+        lines.append("Стадии (p50 / p95, мс):")
+        for name, hist in sorted(stages.items()):
+            lines.append(f"  {name:<14} {hist.percentile(0.5):8.2f} / {hist.percentile(0.95):8.2f}  n={hist.total}")
+        lines.append(f"Слито событий: {self.coalesced}")
+        return "\n".join(lines)
+
+    def dump(self, path):
+        """Сохраняет трассу в формате Chrome trace (chrome://tracing, ui.perfetto.dev)"""
+        with self.lock:
+            events = list(self.events)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        return len(events)
+
+
+# Общий трассировщик приложения
+tracer = LatencyTracer()
+tracer.enabled = os.environ.get('HIGHLIGHTING_BORDERS_TRACE') == '1'
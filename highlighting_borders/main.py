@@ -1,5 +1,6 @@
 import sys
 from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import QTimer
 from gui.main_window import MainWindow
 
 
@@ -7,8 +8,10 @@ def main():
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
+    # Тяжелые модули догружаем уже после первого кадра
+    QTimer.singleShot(0, window.warm_up)
     sys.exit(app.exec_())
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
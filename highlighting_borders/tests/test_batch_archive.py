@@ -0,0 +1,37 @@
+import cv2
+import numpy as np
+
+import batch
+from algorithms.archive import ArchiveReader
+
+
+def write_image(path, radius):
+    image = np.full((120, 160, 3), 30, np.uint8)
+    cv2.circle(image, (80, 60), radius, (200, 200, 200), -1)
+    assert cv2.imwrite(str(path), image)
+
+
+def test_inputs_with_same_stem_get_separate_entries(tmp_path):
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'b').mkdir()
+    write_image(tmp_path / 'a' / 'img.png', 20)
+    write_image(tmp_path / 'b' / 'img.png', 40)
+    write_image(tmp_path / 'b' / 'img.bmp', 50)
+    out = tmp_path / 'out'
+
+    code = batch.main([str(tmp_path / 'a'), str(tmp_path / 'b'), '-o', str(out), '--format', 'archive'])
+    assert code == 0
+
+    reader = ArchiveReader(str(out))
+    try:
+        assert reader.ids() == ['a/img.png', 'b/img.bmp', 'b/img.png']
+        areas = [reader.get(image_id).metadata['area'] for image_id in reader.ids()]
+        assert len(set(areas)) == 3
+    finally:
+        reader.close()
+
+
+def test_duplicate_inputs_fail(tmp_path):
+    write_image(tmp_path / 'img.png', 20)
+    path = str(tmp_path / 'img.png')
+    assert batch.main([path, path, '-o', str(tmp_path / 'out'), '--format', 'archive']) == 2
@@ -0,0 +1,61 @@
+import cv2
+import numpy as np
+
+from algorithms import livewire
+
+IntelligentScissorsMB = cv2.segmentation.IntelligentScissorsMB
+
+
+class CountingScissors:
+    """IntelligentScissorsMB, считающий вызовы applyImage"""
+
+    calls = 0
+
+    def __init__(self):
+        self.tool = IntelligentScissorsMB()
+
+    def applyImage(self, image):
+        CountingScissors.calls += 1
+        return self.tool.applyImage(image)
+
+    def __getattr__(self, name):
+        return getattr(self.tool, name)
+
+
+def make_image():
+    image = np.full((600, 600, 3), 40, np.uint8)
+    cv2.circle(image, (300, 300), 180, (220, 200, 180), -1)
+    return image
+
+
+def test_cost_map_reused_for_anchors_in_one_window(monkeypatch):
+    monkeypatch.setattr(livewire.cv2.segmentation, 'IntelligentScissorsMB', CountingScissors)
+    CountingScissors.calls = 0
+    wire = livewire.LiveWire(make_image())
+
+    wire.start(120, 300)
+    wire.pending.result()
+    assert wire.poll()
+    for x, y in [(300, 120), (480, 300), (300, 480), (120, 300), (300, 120)]:
+        assert wire.advance_anchor(x, y)
+        wire.pending.result()
+        assert wire.poll()
+        assert wire.anchor == (x, y)
+        assert len(wire.path_to(300, 300)) > 1
+
+    # Новый штрих в том же окне тоже берет инструменты из кеша
+    wire.start(480, 300)
+    wire.pending.result()
+    assert wire.poll()
+
+    assert CountingScissors.calls <= livewire.LiveWire.TOOLS_PER_WINDOW
+
+
+def test_start_has_no_path_until_poll():
+    wire = livewire.LiveWire(make_image())
+    wire.start(120, 300)
+    assert wire.anchor is None
+    assert wire.path_to(300, 300) == []
+    wire.pending.result()
+    assert wire.poll()
+    assert wire.anchor == (120, 300)
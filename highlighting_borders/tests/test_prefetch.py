@@ -0,0 +1,44 @@
+import threading
+
+import cv2
+import numpy as np
+
+from algorithms import prefetch
+
+
+def test_running_load_stays_charged_after_drop(tmp_path, monkeypatch):
+    paths = []
+    for i in range(6):
+        path = str(tmp_path / f"{i}.png")
+        assert cv2.imwrite(path, np.zeros((100, 100, 3), np.uint8))
+        paths.append(path)
+    estimate = prefetch.estimate_nbytes(paths[0])
+
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_load(path, detector, low_memory=False):
+        started.set()
+        release.wait(5)
+        return None
+
+    monkeypatch.setattr(prefetch, 'load_prefetched', slow_load)
+    prefetcher = prefetch.FolderPrefetcher(paths, workers=1, ahead=1, memory_budget=estimate)
+    prefetcher.detector = object()
+    try:
+        prefetcher.schedule(0)
+        assert started.wait(5)
+
+        # Загрузка 1 уже идет: ее память занята, на новую бюджета нет
+        prefetcher.schedule(3)
+        assert sum(prefetcher.draining.values()) == estimate
+        assert prefetcher.futures == {}
+
+        release.set()
+        prefetcher.executor.submit(lambda: None).result(5)
+        assert prefetcher.draining == {}
+        prefetcher.schedule(3)
+        assert list(prefetcher.futures) == [4]
+    finally:
+        release.set()
+        prefetcher.shutdown()
@@ -0,0 +1,365 @@
+"""
+Наблюдение за папкой: автоматическая обработка новых и измененных изображений
+
+Новые и измененные файлы ставятся в постоянную очередь (SQLite) и
+обрабатываются пулом рабочих потоков с параметрами из набора правил.
+После перезапуска выполненные задания не повторяются.
+
+С --once обрабатываются все файлы, найденные в папке: файлы, которые
+еще не устоялись (менялись меньше --settle секунд назад), дожидаются
+устаивания и тоже обрабатываются, после чего программа завершается.
+
+Пример:
+    python watch.py run incoming/ -o results/ --config rules.json -j 4
+    python watch.py status -o results/
+
+Файл правил (JSON):
+    {
+      "presets": {"default": {"threshold1": 50, "threshold2": 150, "blur_size": 5},
+                  "studio": {"threshold1": 20, "threshold2": 80, "blur_size": 7}},
+      "rules": [
+        {"pattern": "catalog/*.jpg", "preset": "studio",
+         "rect": [100, 50, 1800, 1400], "region_mode": "include",
+         "overrides": [{"rect": [100, 1200, 1800, 250], "preset": "default"}]}
+      ],
+      "format": "png", "tolerance": 1.0, "soft_alpha": false, "working_size": 0
+    }
+Правило выбирается по первому совпадению шаблона с путем относительно
+наблюдаемой папки; файлы без правила обрабатываются пресетом default.
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import sys
+import threading
+import time
+
+from algorithms.lazy import lazy_import
+from batch import IMAGE_EXTENSIONS, read_image, write_result
+
+try:
+    import inotify_simple
+except ImportError:  # пакет не установлен или не Linux - опрашиваем папку
+    inotify_simple = None
+
+canny = lazy_import('algorithms.canny')
+adaptive = lazy_import('algorithms.adaptive')
+overrides = lazy_import('algorithms.overrides')
+utils = lazy_import('algorithms.utils')
+jobqueue = lazy_import('algorithms.jobqueue')
+threads = lazy_import('algorithms.threads')
+
+DEFAULT_CONFIG = {
+    'presets': {'default': {'threshold1': 50, 'threshold2': 150, 'blur_size': 5}},
+    'rules': [],
+    'format': 'png',
+    'tolerance': 1.0,
+    'soft_alpha': False,
+    'working_size': 0,
+}
+
+QUEUE_FILE = 'jobs.sqlite3'
+
+
+class Rules:
+    """
+    Пресеты параметров и правила выбора пресета и областей по пути файла
+    """
+
+    def __init__(self, config=None):
+        self.config = dict(DEFAULT_CONFIG, **(config or {}))
+        presets = dict(DEFAULT_CONFIG['presets'], **self.config['presets'])
+
+        # Детекторы неизменяемы и используются всеми рабочими потоками
+        self.detectors = {
+            name: canny.CannyEdgeDetector(p['threshold1'], p['threshold2'], p['blur_size'])
+            for name, p in presets.items()
+        }
+        for rule in self.config['rules']:
+            for name in [rule.get('preset', 'default')] + [o['preset'] for o in rule.get('overrides', [])]:
+                if name not in self.detectors:
+                    raise ValueError(f"неизвестный пресет в правиле {rule.get('pattern')!r}: {name}")
+
+    @classmethod
+    def load(cls, path):
+        """Читает правила из JSON-файла (None - правила по умолчанию)"""
+        if path is None:
+            return cls()
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def match(self, rel_path):
+        """Правило для пути относительно наблюдаемой папки"""
+        rel_path = rel_path.replace(os.sep, '/')
+        for rule in self.config['rules']:
+            if fnmatch.fnmatch(rel_path, rule['pattern']):
+                return rule
+        return {'pattern': '*', 'preset': 'default'}
+
+    def region_overrides(self, rule):
+        """RegionOverride для областей правила со своими пресетами"""
+        result = []
+        for item in rule.get('overrides', []):
+            detector = self.detectors[item['preset']]
+            if 'rect' in item:
+                result.append(overrides.RegionOverride.from_rect(item['rect'], detector))
+            else:
+                result.append(overrides.RegionOverride(item['polygon'], detector))
+        return result
+
+
+def process_file(path, input_dir, output_dir, rules):
+    """
+    Обрабатывает один файл по подходящему правилу
+
+    Возвращает:
+    - out_path: путь к результату
+
+    Исключение - если файл не удалось прочитать или сохранить.
+    """
+    rel_path = os.path.relpath(path, input_dir)
+    rule = rules.match(rel_path)
+    config = rules.config
+    detector = rules.detectors[rule.get('preset', 'default')]
+
+    image = read_image(path)
+    if image is None:
+        raise ValueError("не удалось прочитать изображение")
+
+    region_mask = utils.create_region_mask(
+        image.shape, rule.get('rect'), rule.get('polygons', []), rule.get('region_mode', 'include')
+    )
+    working_pixels = int(config['working_size'] * 1_000_000)
+    if working_pixels > 0 and not rule.get('overrides'):
+        _, mask = adaptive.detect_edges_adaptive(detector, image, region_mask, working_pixels=working_pixels)
+    else:
+        _, mask = detector.edges_and_mask(image, 0, 0, region_mask, None, rules.region_overrides(rule))
+
+    fmt = config['format']
+    out_path = os.path.join(output_dir, os.path.splitext(rel_path)[0] + '.' + fmt)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    if not write_result(image, mask, out_path, fmt, config['tolerance'], config['soft_alpha']):
+        raise OSError(f"не удалось сохранить {out_path}")
+    return out_path
+
+
+class FolderWatcher:
+    """
+    Поиск новых и измененных изображений в дереве папок
+
+    Файл ставится в очередь, когда его размер и время изменения не
+    меняются settle секунд - так не обрабатываются недокопированные файлы.
+    Между проходами ожидание прерывается событиями inotify, если модуль
+    inotify_simple доступен; иначе папка просто опрашивается с интервалом.
+    """
+
+    def __init__(self, root, queue, interval=2.0, settle=2.0, exclude=None):
+        self.root = os.path.abspath(root)
+        self.queue = queue
+        self.interval = interval
+        self.settle = settle
+        self.exclude = os.path.abspath(exclude) if exclude else None
+        # Файлы, пропущенные последним проходом, потому что еще меняются
+        self.unsettled = 0
+        # Уже поставленные в очередь версии файлов (в том числе до перезапуска)
+        self.seen = queue.known()
+
+        self.inotify = None
+        self.watched = set()
+        if inotify_simple is not None:
+            self.inotify = inotify_simple.INotify()
+
+    def scan(self):
+        """
+        Один проход по дереву
+
+        Возвращает:
+        - число поставленных в очередь файлов
+        """
+        added = 0
+        unsettled = 0
+        now = time.time()
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if self.exclude:
+                dirnames[:] = [d for d in dirnames if os.path.join(dirpath, d) != self.exclude]
+            self._watch(dirpath)
+
+            for name in filenames:
+                if not name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                stamp = (stat.st_mtime_ns, stat.st_size)
+                if self.seen.get(path) == stamp:
+                    continue
+                if now - stat.st_mtime < self.settle:
+                    unsettled += 1
+                    continue
+                if self.queue.enqueue(path, *stamp):
+                    added += 1
+                self.seen[path] = stamp
+        self.unsettled = unsettled
+        return added
+
+    def _watch(self, dirpath):
+        if self.inotify is None or dirpath in self.watched:
+            return
+        flags = inotify_simple.flags
+        mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE
+        try:
+            self.inotify.add_watch(dirpath, mask)
+            self.watched.add(dirpath)
+        except OSError:
+            pass
+
+    def wait(self, stop):
+        """Ждет следующего прохода: события файловой системы или интервала"""
+        if self.inotify is None:
+            stop.wait(self.interval)
+            return
+        if self.inotify.read(timeout=int(self.interval * 1000)):
+            # Файл мог еще дописываться: даем ему устояться
+            stop.wait(self.settle)
+
+
+def worker_loop(queue, input_dir, output_dir, rules, stop, idle_wait=0.5):
+    """Рабочий поток: берет задания из очереди, пока не установлен stop"""
+    try:
+        while not stop.is_set():
+            job = queue.claim()
+            if job is None:
+                stop.wait(idle_wait)
+                continue
+            try:
+                out_path = process_file(job.path, input_dir, output_dir, rules)
+            except Exception as error:
+                queue.fail(job, error)
+                print(f"Ошибка: {job.path}: {error}", file=sys.stderr)
+            else:
+                queue.finish(job, out_path)
+    finally:
+        queue.close()
+
+
+def format_seconds(value):
+    return '-' if value is None else f"{value:.2f} с"
+
+
+def print_status(queue, window):
+    stats = queue.stats(window)
+    counts = stats['counts']
+    latency = stats['latency']
+    print(f"Очередь: ожидают {counts['pending']}, в работе {counts['running']}, "
+          f"выполнено {counts['done']}, ошибок {counts['failed']}")
+    print(f"За последние {window:.0f} с: {stats['throughput']:.1f} файлов/мин, "
+          f"обработка в среднем {format_seconds(stats['service'])}")
+    print(f"Задержка от появления до результата: среднее {format_seconds(latency['mean'])}, "
+          f"p50 {format_seconds(latency['p50'])}, p95 {format_seconds(latency['p95'])}, "
+          f"макс {format_seconds(latency['max'])}")
+    for path, error in queue.failures(5):
+        print(f"  {path}: {error}")
+
+
+def run(args):
+    rules = Rules.load(args.config)
+    os.makedirs(args.output, exist_ok=True)
+    queue = jobqueue.JobQueue(args.db or os.path.join(args.output, QUEUE_FILE))
+
+    # Результаты могут лежать внутри наблюдаемой папки - их не обрабатываем
+    watcher = FolderWatcher(args.input, queue, args.interval, args.settle, exclude=args.output)
+    budget = threads.set_thread_budget(args.workers or None)
+
+    stop = threading.Event()
+    workers = [
+        threading.Thread(
+            target=worker_loop, name=f"watch-worker-{i}",
+            args=(queue, watcher.root, args.output, rules, stop)
+        )
+        for i in range(budget.workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    mode = 'inotify' if watcher.inotify is not None else f"опрос каждые {args.interval:g} с"
+    print(f"Наблюдение за {watcher.root} ({mode}), потоков: {budget.workers}")
+    last_status = time.time()
+    try:
+        while not stop.is_set():
+            watcher.scan()
+            if args.once and watcher.unsettled == 0:
+                # Еще не устоявшиеся файлы дожидаемся и обрабатываем
+                counts = queue.stats()['counts']
+                if counts['pending'] == 0 and counts['running'] == 0:
+                    break
+            if args.status_interval and time.time() - last_status >= args.status_interval:
+                print_status(queue, args.status_interval)
+                last_status = time.time()
+            if args.once:
+                stop.wait(0.2)
+            else:
+                watcher.wait(stop)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join()
+
+    print_status(queue, args.window)
+    return 0
+
+
+def status(args):
+    if not args.db and not args.output:
+        print("Укажите --db или -o", file=sys.stderr)
+        return 2
+    path = args.db or os.path.join(args.output, QUEUE_FILE)
+    if not os.path.exists(path):
+        print(f"Очередь не найдена: {path}", file=sys.stderr)
+        return 1
+    print_status(jobqueue.JobQueue(path), args.window)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Автоматическая обработка изображений из папки")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="наблюдать за папкой и обрабатывать файлы")
+    run_parser.add_argument('input', help="наблюдаемая папка")
+    run_parser.add_argument('-o', '--output', required=True, help="каталог для результатов")
+    run_parser.add_argument('--config', help="файл правил (JSON)")
+    run_parser.add_argument('--db', help=f"файл очереди (по умолчанию OUTPUT/{QUEUE_FILE})")
+    run_parser.add_argument('-j', '--workers', type=int, default=0,
+                            help="число рабочих потоков (0 - по числу ядер)")
+    run_parser.add_argument('--interval', type=float, default=2.0, help="интервал опроса, с")
+    run_parser.add_argument('--settle', type=float, default=2.0,
+                            help="сколько секунд файл не должен меняться перед обработкой")
+    run_parser.add_argument('--status-interval', type=float, default=0,
+                            help="печатать статистику каждые N секунд (0 - не печатать)")
+    run_parser.add_argument('--window', type=float, default=300.0, help="окно статистики, с")
+    run_parser.add_argument('--once', action='store_true',
+                            help="обработать все файлы папки (не устоявшиеся - после "
+                                 "ожидания --settle) и завершиться")
+    run_parser.set_defaults(func=run)
+
+    status_parser = commands.add_parser('status', help="состояние очереди и статистика")
+    status_parser.add_argument('-o', '--output', help="каталог результатов")
+    status_parser.add_argument('--db', help="файл очереди")
+    status_parser.add_argument('--window', type=float, default=300.0, help="окно статистики, с")
+    status_parser.set_defaults(func=status)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())